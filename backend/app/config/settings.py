@@ -25,3 +25,61 @@ TOPK_NORMAL_SINGLE_METHOD = _get_int("TOPK_NORMAL_SINGLE_METHOD", 168)
 TOPK_TEMPORAL = _get_int("TOPK_TEMPORAL", 100)
 TOPK_PREV = _get_int("TOPK_PREV", 250)
 TOPK_IS = _get_int("TOPK_IS", 200)
+
+# ----- Adaptive ANN search parameters (ef / nprobe) -----
+SEARCH_INDEX_TYPE = os.getenv("SEARCH_INDEX_TYPE", "HNSW")  # index type of the deployed collections
+SEARCH_OVERLOAD_INFLIGHT = _get_int("SEARCH_OVERLOAD_INFLIGHT", 16)  # concurrent ANN calls treated as overload
+
+# ----- Vector fetch by id ("find similar") -----
+VECTOR_CACHE_SIZE = _get_int("VECTOR_CACHE_SIZE", 8192)  # LRU of recently fetched vectors
+VECTOR_FETCH_MMAP = os.getenv("VECTOR_FETCH_MMAP", "1").lower() not in ("0", "false", "no")  # read data/index/dense/*.bin before Milvus
+
+# ----- Uploaded query images -----
+UPLOAD_TTL_S = _get_int("UPLOAD_TTL_S", 3600)  # uploads and their embeddings expire after this
+UPLOAD_MAX_SIDE = _get_int("UPLOAD_MAX_SIDE", 1024)  # longer side is downscaled to this before storing / encoding
+UPLOAD_MAX_BYTES = _get_int("UPLOAD_MAX_BYTES", 20 * 1024 * 1024)
+
+# ----- Query embedding cache (composite queries) -----
+EMBEDDING_CACHE_SIZE = _get_int("EMBEDDING_CACHE_SIZE", 4096)  # LRU of text / image query embeddings per model
+
+# ----- Cascade text search (recall with one model, exact rerank with all) -----
+CASCADE_POOL = _get_int("CASCADE_POOL", 1000)  # candidates taken from the recall model(s) per query
+
+# ----- Coarse-to-fine search (video / shot side collections) -----
+COARSE_GROUPS = _get_int("COARSE_GROUPS", 30)  # videos / shots whose keyframes get scored
+COARSE_SHOT_SIZE = _get_int("COARSE_SHOT_SIZE", 8)  # consecutive keyframes per shot when building
+
+# ----- Reduced-dimension first stage (PCA / truncated companion collections) -----
+REDUCED_INDEX = os.getenv("REDUCED_INDEX", "")  # e.g. "siglip2:256,bigg14_datacomp:256"; empty = off
+REDUCED_RERANK_FACTOR = _get_int("REDUCED_RERANK_FACTOR", 4)  # candidates per result rescored at full dimension
+
+# ----- Elasticsearch text search (OCR / ASR / captions) -----
+ES_CONNECTIONS_PER_NODE = _get_int("ES_CONNECTIONS_PER_NODE", 16)  # pooled HTTP connections per ES node, sync and async clients
+ES_REQUEST_CACHE = os.getenv("ES_REQUEST_CACHE", "1").lower() not in ("0", "false", "no")  # shard request cache for repeat queries
+TEXT_BACKEND = os.getenv("TEXT_BACKEND", "es").lower()  # "es" or "local" (in-process BM25 over data/index/sparse)
+
+# ----- Second-stage rerank of the fused top-N -----
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "")  # "cohere", "cross_encoder" or "stub"; empty = unavailable
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")  # backend model name (default per backend)
+RERANK_DOCS = os.getenv("RERANK_DOCS", "data/index/rerank/ic.json")  # keyframe id -> text scored by the reranker
+RERANK_TOP_N = _get_int("RERANK_TOP_N", 50)  # fused hits reranked per request
+RERANK_BATCH_SIZE = _get_int("RERANK_BATCH_SIZE", 25)  # documents per backend call
+RERANK_TIMEOUT_MS = _get_int("RERANK_TIMEOUT_MS", 800)  # past this (or the request deadline) the fused order is kept
+RERANK_CACHE_SIZE = _get_int("RERANK_CACHE_SIZE", 20000)  # LRU of (query, id) scores
+
+# ----- Object / color filters (bitmap index over keyframe ids) -----
+OBJECT_EXACT_MAX = _get_int("OBJECT_EXACT_MAX", 20000)  # filtered sets up to this size are scored exactly, no ANN
+OBJECT_OVERFETCH = _get_int("OBJECT_OVERFETCH", 4)  # larger sets: ANN fetches topk * this, then filters
+
+# ----- Query planner (per-method top-K / skip learned from ensemble contributions) -----
+QUERY_PLAN = os.getenv("QUERY_PLAN", "full").lower()  # "full" = every method at topk_each, "auto" = planned top-K per method (opt-in)
+PLANNER_MIN_SAMPLES = _get_int("PLANNER_MIN_SAMPLES", 30)  # requests of a method combination before planning it
+PLANNER_MIN_TOPK = _get_int("PLANNER_MIN_TOPK", 50)  # planned top-K never goes below this
+PLANNER_SKIP_PERCENT = _get_int("PLANNER_SKIP_PERCENT", 2)  # skip methods finding (and uniquely finding) less of the final top-N
+PLANNER_EXPLORE_EVERY = _get_int("PLANNER_EXPLORE_EVERY", 20)  # one request in this many runs in full to keep stats fresh
+PLANNER_STATS_PATH = os.getenv("PLANNER_STATS_PATH", "data/planner/stats.json")
+
+# ----- Paginated result sessions -----
+RESULT_PAGE_SIZE = _get_int("RESULT_PAGE_SIZE", 0)  # default first-page size of /api/search-new; 0 = whole result, no session
+RESULT_SESSION_TTL_S = _get_int("RESULT_SESSION_TTL_S", 600)  # stored results expire after this
+RESULT_SESSION_MAX = _get_int("RESULT_SESSION_MAX", 200)  # least recently used sessions dropped beyond this
@@ -11,8 +11,9 @@ from app.retrieve.clip import CLIPSearcher
 from app.retrieve.beit3 import BEiT3Searcher
 from app.retrieve.siglip2 import SigLIP2Searcher
 from app.retrieve.ocr_asr_ic import ElasticSearcher
+from app.retrieve.bm25 import LocalTextSearcher
 from app.retrieve.google import GoogleSearcher
-from app.config.settings import MILVUS_URI, MILVUS_TOKEN
+from app.config.settings import MILVUS_URI, MILVUS_TOKEN, TEXT_BACKEND
 
 
 # All searchers now use Milvus Cloud
@@ -27,7 +28,8 @@ siglip2 = SigLIP2Searcher(milvus_uri=MILVUS_URI, milvus_token=MILVUS_TOKEN)
 # siglip2.load_path_id_map()
 # siglip2.load_model(device="cuda")
 
-es = ElasticSearcher(host="http://elasticsearch:9200")
+# OCR / ASR / captions: Elasticsearch, or the in-process BM25 indexes over the same sparse files
+es = LocalTextSearcher() if TEXT_BACKEND == "local" else ElasticSearcher(host="http://elasticsearch:9200")
 
 google_searcher = GoogleSearcher(clip_searcher=clip)
 
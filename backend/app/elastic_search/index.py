@@ -1,11 +1,19 @@
 import os
+import sys
 import json
+import time
 import requests
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import streaming_bulk
+from elasticsearch.helpers import parallel_bulk
 import glob
 
+try:
+    import ijson  # incremental parser: big .json dicts are streamed instead of json.load'ed
+except ImportError:
+    ijson = None
+
 def get_es_host():
     fallback_hosts = [
         "http://elasticsearch:9200",
@@ -25,9 +33,18 @@ def get_es_host():
 HERE = Path(__file__).resolve()
 REPO_ROOT = HERE.parents[2]  # app/elastic_search/index.py -> up 2 = repo root AIC2025
 DATA_FOLDER = REPO_ROOT / "data" / "index" / "sparse"  # AIC2025/data/index/sparse
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+# === Bulk load tuning ===
+BULK_THREADS = int(os.getenv("ES_BULK_THREADS", "4"))          # parallel_bulk threads per file
+BULK_CHUNK_SIZE = int(os.getenv("ES_BULK_CHUNK_SIZE", "2000"))  # docs per bulk request
+FILE_WORKERS = int(os.getenv("ES_FILE_WORKERS", "3"))           # files indexed concurrently
+INDEX_SHARDS = int(os.getenv("ES_INDEX_SHARDS", "1"))           # primary shards of new indices
+INDEX_REPLICAS = int(os.getenv("ES_INDEX_REPLICAS", "0"))       # replicas restored after the load
 
 ES_HOST = get_es_host()
-es = Elasticsearch(ES_HOST)
+es = Elasticsearch(ES_HOST, request_timeout=120)
 
 print("Ping:", es.ping())
 print("Info:", es.info())
@@ -55,11 +72,33 @@ def create_index_with_mapping(index_name):
                 }
             }
         }
+    mapping["settings"] = {"number_of_shards": INDEX_SHARDS, "number_of_replicas": 0, "refresh_interval": "-1"}
     es.indices.create(index=index_name, body=mapping, ignore=400)
 
+def begin_bulk_load(index_name):
+    """Turn refresh and replicas off for the load; returns the settings to restore."""
+    current = es.indices.get_settings(index=index_name).get(index_name, {}).get("settings", {}).get("index", {})
+    previous = {
+        "refresh_interval": current.get("refresh_interval", "1s"),
+        "number_of_replicas": int(current.get("number_of_replicas", INDEX_REPLICAS)),
+    }
+    if previous["refresh_interval"] == "-1":
+        previous["refresh_interval"] = "1s"  # created by us for the load
+        previous["number_of_replicas"] = INDEX_REPLICAS
+    es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}})
+    return previous
+
+def end_bulk_load(index_name, previous):
+    es.indices.put_settings(index=index_name, body={"index": previous})
+    es.indices.refresh(index=index_name)
+
 def _iter_json_records(path: Path):
     # Hỗ trợ: .json (dict key->value) hoặc .jsonl/.ndjson (mỗi dòng 1 doc)
     if path.suffix.lower() == ".json":
+        if ijson is not None:
+            with path.open("rb") as f:
+                yield from ijson.kvitems(f, "", use_float=True)
+            return
         with path.open("r", encoding="utf-8") as f:
             data = json.load(f)
         for key, value in data.items():
@@ -74,13 +113,8 @@ def _iter_json_records(path: Path):
                 _id = obj.get("_id") or obj.get("id") or str(i)
                 yield _id, obj
 
-def index_file(path: Path):
-    index_name = path.stem
-    print(f"\n-- Processing `{path}` → index `{index_name}`")
-
-    create_index_with_mapping(index_name)
-
-    actions = []
+def _iter_actions(path: Path, index_name: str):
+    """Bulk actions generated one record at a time, so memory stays flat whatever the file size."""
     for key, value in _iter_json_records(path):
         if index_name.lower().startswith("object"):
             # Expect value = list of [name, color]
@@ -93,29 +127,52 @@ def index_file(path: Path):
             # Lưu toàn bộ value vào text (chuẩn hóa sang str)
             doc = {"text": json.dumps(value, ensure_ascii=False) if not isinstance(value, str) else value}
 
-        actions.append({"_index": index_name, "_id": key, "_source": doc})
+        yield {"_index": index_name, "_id": key, "_source": doc}
 
-    if not actions:
-        print("  ⚠ No records parsed from file.")
-        return
+def index_file(path: Path):
+    index_name = path.stem
+    print(f"\n-- Processing `{path}` → index `{index_name}`")
 
-    success = failures = 0
-    for ok, result in streaming_bulk(
-        client=es,
-        actions=actions,
-        raise_on_error=False,
-        max_retries=3
-    ):
-        if ok:
-            success += 1
-        else:
-            failures += 1
-            res = list(result.values())[0]
-            err = res.get("error", {})
-            doc_id = res.get("_id")
-            print(f"  ✗ Failed to index _id={doc_id}: {err}")
+    create_index_with_mapping(index_name)
+    previous = begin_bulk_load(index_name)
 
-    print(f" → Indexed: {success}/{len(actions)} successful, {failures} failed")
+    success = failures = 0
+    start = time.perf_counter()
+    try:
+        for ok, result in parallel_bulk(
+            client=es,
+            actions=_iter_actions(path, index_name),
+            thread_count=BULK_THREADS,
+            chunk_size=BULK_CHUNK_SIZE,
+            raise_on_error=False,
+            raise_on_exception=False
+        ):
+            if ok:
+                success += 1
+            else:
+                failures += 1
+                res = list(result.values())[0]
+                err = res.get("error", {})
+                doc_id = res.get("_id")
+                print(f"  ✗ Failed to index _id={doc_id}: {err}")
+    finally:
+        end_bulk_load(index_name, previous)
+    elapsed = time.perf_counter() - start
+
+    total = success + failures
+    if not total:
+        print(f"  ⚠ No records parsed from `{path.name}`.")
+        return {"index": index_name, "docs": 0, "failed": 0, "seconds": elapsed}
+    print(f" → `{index_name}`: {success}/{total} successful, {failures} failed "
+          f"in {elapsed:.1f}s ({success / max(elapsed, 1e-9):,.0f} docs/s)")
+    if index_name.lower().startswith("ocr"):
+        # Trigram index for fuzzy OCR substring search (ocr_fuzzy method), from the same file
+        from app.retrieve.ocr_fuzzy import build_trigram_index
+        try:
+            build_trigram_index(str(path))
+        except Exception as e:
+            print(f"  ⚠ Trigram index for `{index_name}` failed: {e}")
+    return {"index": index_name, "docs": success, "failed": failures, "seconds": elapsed}
 
 def main():
     print(f"Resolved DATA_FOLDER: {DATA_FOLDER}")
@@ -130,12 +187,30 @@ def main():
         return
 
     print(f"Found {len(files)} file(s).")
-    for path_str in files:
+
+    def _run(path_str):
         path = Path(path_str)
         try:
-            index_file(path)
+            return index_file(path)
         except Exception as e:
             print(f" !!! Error processing `{path}`: {e}")
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, FILE_WORKERS)) as pool:
+        stats = [s for s in pool.map(_run, files) if s]
+    elapsed = time.perf_counter() - start
+    object_files = [f for f in files if Path(f).stem.lower().startswith("object")]
+    if object_files:
+        # Object / color bitmaps for filtered search, from every object file at once
+        from app.vector_database.object_index import build_object_index
+        try:
+            build_object_index(object_files)
+        except Exception as e:
+            print(f" !!! Object bitmap index failed: {e}")
+    docs = sum(s["docs"] for s in stats)
+    print(f"\nIndexed {docs} docs from {len(stats)}/{len(files)} file(s) in {elapsed:.1f}s "
+          f"({docs / max(elapsed, 1e-9):,.0f} docs/s overall)")
 
     print("\nCurrent indices:")
     print(es.cat.indices(format="table"))
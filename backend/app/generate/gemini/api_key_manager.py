@@ -1,10 +1,17 @@
+import threading
+
+
 class APIKeyManager:
     def __init__(self, keys):
         self.keys = {key: 0 for key in keys}
         self.index = 0
         self.key_list = list(self.keys.keys())
         self.exhausted = set()
+        self._lock = threading.Lock()  # shared by concurrent generation / rerank calls
     def get_next_key(self):
+        with self._lock:
+            return self._next_key()
+    def _next_key(self):
         available_keys = [k for k in self.key_list if k not in self.exhausted]
         if not available_keys:
             raise RuntimeError("No available API keys: all keys are exhausted")
@@ -23,11 +30,13 @@ class APIKeyManager:
     def mark_exhausted(self, key):
         if key not in self.keys:
             raise KeyError(f"Unknown API key: {key}")
-        self.exhausted.add(key)
+        with self._lock:
+            self.exhausted.add(key)
     def mark_active(self, key):
         if key not in self.keys:
             raise KeyError(f"Unknown API key: {key}")
-        self.exhausted.discard(key)
+        with self._lock:
+            self.exhausted.discard(key)
     def is_exhausted(self, key):
         if key not in self.keys:
             raise KeyError(f"Unknown API key: {key}")
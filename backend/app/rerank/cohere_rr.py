@@ -1,6 +1,7 @@
 import cohere
 import json
-from typing import List, Dict
+import math
+from typing import List, Dict, Optional
 import numpy as np
 
 class CohereReranker:
@@ -13,6 +14,23 @@ class CohereReranker:
         with open(path, "r", encoding="utf-8") as f:
             self.meta = json.load(f)
 
+    def score(self, query: str, documents: List[str], timeout: Optional[float] = None) -> List[float]:
+        """Relevance of each document to the query, in input order (one rerank call, no retries past `timeout` seconds)."""
+        if not documents:
+            return []
+        request_options = {"timeout_in_seconds": max(1, math.ceil(timeout)), "max_retries": 0} if timeout is not None else None
+        response = self.client.rerank(
+            model=self.model,
+            query=query,
+            documents=documents,
+            top_n=len(documents),
+            request_options=request_options,
+        )
+        scores = [0.0] * len(documents)
+        for r in response.results:
+            scores[r.index] = float(r.relevance_score)
+        return scores
+
     def search(
         self,
         query: str,
@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from app.config.settings import (
+        RERANK_BACKEND, RERANK_MODEL, RERANK_DOCS, RERANK_TOP_N, RERANK_BATCH_SIZE,
+        RERANK_TIMEOUT_MS, RERANK_CACHE_SIZE,
+    )
+except ImportError:
+    RERANK_BACKEND, RERANK_MODEL, RERANK_DOCS = "", "", "data/index/rerank/ic.json"
+    RERANK_TOP_N, RERANK_BATCH_SIZE, RERANK_TIMEOUT_MS, RERANK_CACHE_SIZE = 50, 25, 800, 20000
+
+# Second-stage rerank of the fused top RERANK_TOP_N against keyframe text, in concurrent batches
+# under a deadline. Scores are cached per (backend, query, id) and mapped onto the head's fused score
+# range; on timeout or backend failure the fused order is kept.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+# ----- Backends: score(query, documents) -> relevance per document, in input order ----- #
+class CohereBackend:
+    name = "cohere"
+
+    def __init__(self, model: Optional[str] = None):
+        from app.config.settings import COHERE_KEYS
+        from app.generate.gemini.api_key_manager import APIKeyManager
+        from app.rerank.cohere_rr import CohereReranker
+
+        self.keys = APIKeyManager([k for k in COHERE_KEYS if k])
+        self.model = model or "rerank-english-v3.0"
+        self._clients: Dict[str, CohereReranker] = {}
+        self._reranker_cls = CohereReranker
+        self._lock = threading.Lock()
+
+    def score(self, query: str, documents: List[str], timeout: Optional[float] = None) -> List[float]:
+        key = self.keys.get_next_key()
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self._reranker_cls(key, model=self.model)
+        return client.score(query, documents, timeout=timeout)
+
+
+class CrossEncoderBackend:
+    name = "cross_encoder"
+
+    def __init__(self, model: Optional[str] = None, device: Optional[str] = None):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model or "cross-encoder/ms-marco-MiniLM-L-6-v2", device=device)
+        self._lock = threading.Lock()  # one forward pass at a time on the shared model
+
+    def score(self, query: str, documents: List[str], timeout: Optional[float] = None) -> List[float]:
+        # A forward pass cannot be interrupted, but a batch that cannot start in time is not run at all
+        if not self._lock.acquire(timeout=-1 if timeout is None else max(0.0, timeout)):
+            raise TimeoutError("cross-encoder busy past the rerank deadline")
+        try:
+            return [float(s) for s in self.model.predict([(query, d) for d in documents])]
+        finally:
+            self._lock.release()
+
+
+class StubBackend:
+    """Token overlap between query and document: no network, no model."""
+    name = "stub"
+    _token = re.compile(r"\w+", re.UNICODE)
+
+    def score(self, query: str, documents: List[str], timeout: Optional[float] = None) -> List[float]:
+        q = set(self._token.findall(query.lower()))
+        out = []
+        for d in documents:
+            t = set(self._token.findall(d.lower()))
+            out.append(len(q & t) / max(len(q | t), 1))
+        return out
+
+
+BACKENDS = {"cohere": CohereBackend, "cross_encoder": CrossEncoderBackend, "stub": StubBackend}
+
+
+def create_backend(name: str, model: Optional[str] = None):
+    cls = BACKENDS.get((name or "").lower())
+    if cls is None:
+        return None
+    return cls() if cls is StubBackend else cls(model or None)
+
+
+class RerankStage:
+    def __init__(
+        self,
+        backend=None,
+        docs_path: str = RERANK_DOCS,
+        top_n: int = RERANK_TOP_N,
+        batch_size: int = RERANK_BATCH_SIZE,
+        timeout_ms: int = RERANK_TIMEOUT_MS,
+        cache_size: int = RERANK_CACHE_SIZE,
+        max_workers: int = 4,
+    ):
+        self.backend = backend
+        self.docs_path = docs_path if os.path.isabs(docs_path) else os.path.join(PROJECT_ROOT, docs_path)
+        self.top_n = int(top_n)
+        self.batch_size = max(1, int(batch_size))
+        self.timeout_ms = int(timeout_ms)
+        self.cache_size = int(cache_size)
+        self._docs: Optional[Dict[str, str]] = None
+        self._cache: "OrderedDict[Tuple[str, str, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rerank")
+        self._stats = {"requests": 0, "reranked": 0, "fallbacks": 0, "cache_hits": 0, "scored": 0}
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, n in deltas.items():
+                self._stats[name] += n
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def documents(self) -> Dict[str, str]:
+        if self._docs is None:
+            with self._lock:
+                if self._docs is None:
+                    try:
+                        with open(self.docs_path, "r", encoding="utf-8") as f:
+                            raw = json.load(f)
+                        self._docs = {str(k): v if isinstance(v, str) else json.dumps(v, ensure_ascii=False) for k, v in raw.items()}
+                    except Exception as e:
+                        print(f"[Rerank] No rerank documents at {self.docs_path}: {e}")
+                        self._docs = {}
+        return self._docs
+
+    def _cached(self, query: str, ids: List[int]) -> Dict[int, float]:
+        name = self.backend.name
+        out = {}
+        with self._lock:
+            for i in ids:
+                key = (name, query, i)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    out[i] = self._cache[key]
+        return out
+
+    def _store(self, query: str, scores: Dict[int, float]) -> None:
+        name = self.backend.name
+        with self._lock:
+            for i, s in scores.items():
+                self._cache[(name, query, i)] = s
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _score_batch(self, query: str, documents: List[str], until: float) -> List[float]:
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("rerank deadline exceeded before the batch started")
+        return self.backend.score(query, documents, timeout=remaining)
+
+    def rerank(self, query: Optional[str], hits: List[Dict], deadline: Optional[float] = None) -> List[Dict]:
+        """Fused hits with the top_n reordered by the backend; unchanged on timeout or error."""
+        if not self.enabled or not query or len(hits) < 2:
+            return hits
+        self._count(requests=1)
+        head, tail = hits[:self.top_n], hits[self.top_n:]
+        docs = self.documents()
+        ids = [int(h["id"]) for h in head if h.get("id") is not None and str(h["id"]) in docs]
+        if len(ids) < 2:
+            return hits
+
+        scores = self._cached(query, ids)
+        self._count(cache_hits=len(scores))
+        missing = [i for i in ids if i not in scores]
+        if missing:
+            budget = self.timeout_ms / 1000.0
+            if deadline is not None:
+                budget = min(budget, deadline - time.monotonic())
+            if budget <= 0:
+                self._count(fallbacks=1)
+                return hits
+            batches = [missing[s:s + self.batch_size] for s in range(0, len(missing), self.batch_size)]
+            # The budget also bounds each backend call, so a late batch frees its worker instead of running on
+            start = time.monotonic()
+            futures = [
+                self._pool.submit(self._score_batch, query, [docs[str(i)] for i in batch], start + budget)
+                for batch in batches
+            ]
+            done, not_done = wait(futures, timeout=budget)
+            if not_done or any(f.exception() is not None for f in done):
+                for f in not_done:
+                    f.cancel()  # drops batches still queued; running ones end at their own timeout
+                err = next((f.exception() for f in done if f.exception() is not None), None)
+                print(f"[Rerank] Falling back to fused order: {err or 'deadline exceeded'}")
+                self._count(fallbacks=1)
+                return hits
+            fresh = {i: float(s) for batch, f in zip(batches, futures) for i, s in zip(batch, f.result())}
+            self._store(query, fresh)
+            self._count(scored=len(fresh))
+            scores.update(fresh)
+
+        # Reorder the scored part of the head; map rerank scores onto the head's fused score range
+        fused = np.asarray([float(h.get("score", 0.0)) for h in head], dtype=np.float32)
+        lo, hi = float(fused.min()), float(fused.max())
+        rr = np.asarray([scores[int(h["id"])] if h.get("id") is not None and int(h["id"]) in scores else np.nan for h in head], dtype=np.float32)
+        known = ~np.isnan(rr)
+        span = float(rr[known].max() - rr[known].min())
+        norm = (rr - np.nanmin(rr)) / span if span > 0 else np.where(known, 1.0, np.nan)
+        new_head = []
+        for h, f, n, k in zip(head, fused, norm, known):
+            new_head.append({**h, "score": float(lo + n * (hi - lo)) if k else float(f)})
+        new_head.sort(key=lambda h: h["score"], reverse=True)
+        self._count(reranked=1)
+        return new_head + tail
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "backend": self.backend.name if self.backend else None, "cached": len(self._cache)}
+
+
+def _create_default() -> RerankStage:
+    backend = None
+    if RERANK_BACKEND:
+        try:
+            backend = create_backend(RERANK_BACKEND, RERANK_MODEL)
+        except Exception as e:
+            print(f"[Rerank] Backend '{RERANK_BACKEND}' unavailable, rerank disabled: {e}")
+    return RerankStage(backend)
+
+
+# Global instance for easy access
+rerank_stage = _create_default()
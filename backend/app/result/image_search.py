@@ -1,10 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any, Tuple, Union
+import numpy as np
 from app.retrieve.clip import CLIPSearcher
 from app.retrieve.siglip2 import SigLIP2Searcher
 from app.vector_database.vector_db_manager import DatabaseManager
 from app.utils.dataset import Dataset
 from app.utils.create_id_group import create_id_group
+from app.utils.weight_manager import weight_manager
+from app.vector_database.vector_fetch import fetch_vectors
+from app.utils.embedding_cache import embedding_cache
+from app.utils.upload_store import upload_store
+
+# Image model -> method name used by the ensemble weight configs
+MODEL_METHODS = {"h14_quickgelu": "clip_h14", "bigg14_datacomp": "clip_bigg14", "siglip2": "siglip2"}
 
 
 class ImageSearch:    
@@ -14,12 +23,14 @@ class ImageSearch:
         siglip2_searcher: Optional[SigLIP2Searcher] = None,
         db_url: Optional[str] = None,
         db_token: Optional[str] = None,
-        topk_each: int = 100
+        topk_each: int = 100,
+        default_model: Union[str, List[str]] = "h14_quickgelu"
     ):
         self.clip_searcher = clip_searcher
         self.siglip2_searcher = siglip2_searcher
         self.db_manager = DatabaseManager(db_url, db_token)
         self.topk_each = topk_each
+        self.default_model = default_model
         
         # Store db credentials for searches
         if db_url is None:
@@ -46,13 +57,45 @@ class ImageSearch:
             "siglip2": "siglip2"
         }
     
+    def encoders(self) -> Dict[str, Callable[[Image.Image], np.ndarray]]:
+        """Image encoder per configured model, used to embed uploads ahead of search."""
+        out: Dict[str, Callable[[Image.Image], np.ndarray]] = {}
+        if self.siglip2_searcher is not None and getattr(self.siglip2_searcher, "model", None) is not None:
+            out["siglip2"] = lambda img: self.siglip2_searcher._encode_image(img)[0]
+        if self.clip_searcher is not None:
+            for name, model_info in getattr(self.clip_searcher, "models", {}).items():
+                out[name] = lambda img, info=model_info: self.clip_searcher._encode_image(info, img)
+        return out
+
     def search(
         self,
         image: Optional[Image.Image] = None,
-        model_name: str = "h14_quickgelu",
+        model_name: Optional[Union[str, List[str]]] = None,
         collection_name: Optional[str] = None,
         image_path: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        image_id: Optional[int] = None,
+        image_vector: Optional[np.ndarray] = None,
     ) -> Dict:
+        """
+        Search by an uploaded image (image / image_path) or by an indexed keyframe id.
+        With image_id the stored vector goes straight to ANN; no path or file is touched.
+        image_vector (e.g. an upload embedded at upload time) skips encoding altogether.
+        model_name may list several models ("siglip2,h14_quickgelu" or a list) for fused search;
+        image_vector is then a {model: vector} dict.
+        """
+        model_name = model_name or self.default_model
+        models = self._parse_models(model_name)
+        if len(models) > 1:
+            return self.fused_search(
+                models, image=image, image_path=image_path, image_id=image_id,
+                image_vectors=image_vector if isinstance(image_vector, dict) else None,
+                partitions=partitions, deadline=deadline,
+            )
+        model_name = models[0]
+        if isinstance(image_vector, dict):
+            image_vector = image_vector.get(model_name)
         if collection_name is None:
             collection_name = self.collections.get(model_name, model_name)
         
@@ -64,32 +107,58 @@ class ImageSearch:
                 if self.siglip2_searcher is None:
                     raise ValueError("SigLIP2 searcher not initialized")
                 
-                results = self.siglip2_searcher.img_search(
-                    image=image,
-                    image_path=image_path,
-                    topk=self.topk_each,
-                    collection_name=collection_name,
-                    milvus_uri=self.db_url,
-                    milvus_token=self.db_token
-                )
+                if image_vector is not None:
+                    results = self.siglip2_searcher.vector_search(
+                        image_vector,
+                        topk=self.topk_each,
+                        collection_name=collection_name,
+                        milvus_uri=self.db_url,
+                        milvus_token=self.db_token,
+                        partitions=partitions,
+                        deadline=deadline
+                    )
+                else:
+                    results = self.siglip2_searcher.img_search(
+                        image=image,
+                        image_path=image_path,
+                        topk=self.topk_each,
+                        collection_name=collection_name,
+                        milvus_uri=self.db_url,
+                        milvus_token=self.db_token,
+                        partitions=partitions,
+                        deadline=deadline,
+                        image_id=image_id
+                    )
             else:
                 # Handle CLIP search
                 if self.clip_searcher is None:
                     raise ValueError("CLIP searcher not initialized")
 
-                local_image = image
-                if local_image is None:
-                    if image_path is None:
-                        raise ValueError("Image object or image_path must be provided for CLIP search")
-                    with Image.open(image_path) as pil_image:
-                        local_image = pil_image.convert("RGB")
-                
-                results = self.clip_searcher.img_search(
-                    model_name=model_name,
-                    topk=self.topk_each,
-                    image=local_image,
-                    collection_name=collection_name,
-                )
+                if image_vector is not None:
+                    results = self.clip_searcher.vector_search(
+                        image_vector,
+                        self.topk_each,
+                        collection_name,
+                        partitions=partitions,
+                        deadline=deadline,
+                    )
+                else:
+                    local_image = image
+                    if local_image is None and image_id is None:
+                        if image_path is None:
+                            raise ValueError("Image object, image_path or image_id must be provided for CLIP search")
+                        with Image.open(image_path) as pil_image:
+                            local_image = pil_image.convert("RGB")
+                    
+                    results = self.clip_searcher.img_search(
+                        model_name=model_name,
+                        topk=self.topk_each,
+                        image=local_image,
+                        collection_name=collection_name,
+                        partitions=partitions,
+                        deadline=deadline,
+                        image_id=image_id,
+                    )
             
             formatted_results = Dataset.format_search_results(results, "image_search")
             
@@ -106,71 +175,409 @@ class ImageSearch:
                 "error": str(e)
             }
     
+    @staticmethod
+    def _parse_models(model_name: Union[str, List[str]]) -> List[str]:
+        names = model_name.split(",") if isinstance(model_name, str) else list(model_name or [])
+        return list(dict.fromkeys(n.strip() for n in names if n and n.strip())) or ["siglip2"]
+
+    def _stored_vectors(self, model_name: str, collection_name: str, ids: List[int]) -> Dict[int, np.ndarray]:
+        """Stored vectors of indexed keyframes, one batched lookup for all ids."""
+        if model_name == "siglip2":
+            if self.siglip2_searcher is None:
+                raise ValueError("SigLIP2 searcher not initialized")
+            return self.siglip2_searcher.vectors_from_ids(collection_name, ids, self.db_url, self.db_token)
+        if self.clip_searcher is None:
+            raise ValueError("CLIP searcher not initialized")
+        found = fetch_vectors(collection_name, ids)
+        missing = [i for i in ids if i not in found]
+        if missing:
+            found.update(fetch_vectors(collection_name, missing, client=self.clip_searcher._get_milvus(self.db_url, self.db_token)))
+        return found
+
+    def _encode_batch(self, model_name: str, images: List[Image.Image]) -> Optional[np.ndarray]:
+        """(N, D) embeddings of several images in one forward pass; None if the model is not loaded."""
+        if model_name == "siglip2":
+            if self.siglip2_searcher is None:
+                raise ValueError("SigLIP2 searcher not initialized")
+            return self.siglip2_searcher._encode_image(images)
+        if self.clip_searcher is None:
+            raise ValueError("CLIP searcher not initialized")
+        if model_name not in getattr(self.clip_searcher, "models", {}):
+            return None
+        return self.clip_searcher._encode_images(self.clip_searcher.models[model_name], images)
+
+    def _query_vectors(
+        self,
+        model_name: str,
+        collection_name: str,
+        items: List[Tuple[Optional[Image.Image], Optional[int], Optional[np.ndarray]]],
+    ) -> List[Optional[np.ndarray]]:
+        """
+        Query vector per (image, image_id, image_vector) item for one model:
+        precomputed > stored vector of the keyframe id > encoded image.
+        Ids are fetched in one batch and images are encoded in one forward pass.
+        """
+        vecs: List[Optional[np.ndarray]] = [vec for _, _, vec in items]
+
+        id_pos = [p for p, (_, iid, _) in enumerate(items) if vecs[p] is None and iid is not None]
+        if id_pos:
+            stored = self._stored_vectors(model_name, collection_name, [int(items[p][1]) for p in id_pos])
+            for p in id_pos:
+                vecs[p] = stored.get(int(items[p][1]))
+
+        enc_pos = [p for p, (img, _, _) in enumerate(items) if vecs[p] is None and img is not None]
+        if enc_pos:
+            feats = self._encode_batch(model_name, [items[p][0] for p in enc_pos])
+            if feats is not None:
+                for p, feat in zip(enc_pos, feats):
+                    vecs[p] = feat
+        return vecs
+
+    def _batch_model_search(
+        self,
+        model_name: str,
+        items: List[Tuple[Optional[Image.Image], Optional[int], Optional[np.ndarray]]],
+        partitions: Optional[List[str]],
+        deadline: Optional[float],
+        collection_name: Optional[str] = None,
+        source: Optional[str] = None,
+    ) -> List[List[Dict]]:
+        """Formatted results per item for one model, with a single multi-vector ANN request."""
+        collection_name = collection_name or self.collections.get(model_name, model_name)
+        vecs = self._query_vectors(model_name, collection_name, items)
+        valid = [p for p, vec in enumerate(vecs) if vec is not None]
+        if len(valid) < len(vecs):
+            print(f"[WARN] ImageSearch - no query vector for {len(vecs) - len(valid)} item(s) with {model_name}")
+        hits: List[List[Dict]] = [[] for _ in items]
+        if not valid:
+            return hits
+
+        query = [np.asarray(vecs[p], dtype=np.float32).reshape(-1) for p in valid]
+        if model_name == "siglip2":
+            results = self.siglip2_searcher.vector_search_many(
+                query, topk=self.topk_each, collection_name=collection_name, milvus_uri=self.db_url,
+                milvus_token=self.db_token, partitions=partitions, deadline=deadline,
+            )
+        else:
+            results = self.clip_searcher.vector_search_many(
+                query, self.topk_each, collection_name, milvus_token=self.db_token,
+                partitions=partitions, deadline=deadline,
+                client=self.clip_searcher._get_milvus(self.db_url, self.db_token),
+            )
+        for p, res in zip(valid, results):
+            hits[p] = Dataset.format_search_results(res, source or model_name)
+        return hits
+
+    def _model_search(
+        self,
+        model_name: str,
+        image: Optional[Image.Image],
+        image_id: Optional[int],
+        image_vector: Optional[np.ndarray],
+        partitions: Optional[List[str]],
+        deadline: Optional[float],
+    ) -> List[Dict]:
+        return self._batch_model_search(model_name, [(image, image_id, image_vector)], partitions, deadline)[0]
+
+    def _model_weights(self, models: List[str]) -> Dict[str, float]:
+        """Ensemble weight per image model, taken from the matching text-search method."""
+        methods = {MODEL_METHODS.get(m, m): m for m in models}
+        method_weights = weight_manager.get_weights_for_methods(
+            use_cliph14="clip_h14" in methods,
+            use_clipbigg14="clip_bigg14" in methods,
+            use_siglip2="siglip2" in methods,
+        )
+        return {m: method_weights.get(method, 1.0) for method, m in methods.items()}
+
+    @staticmethod
+    def _load_image(image_path: str) -> Image.Image:
+        with Image.open(image_path) as pil_image:
+            return pil_image.convert("RGB")
+
+    def fused_search(
+        self,
+        models: List[str],
+        image: Optional[Image.Image] = None,
+        image_path: Optional[str] = None,
+        image_id: Optional[int] = None,
+        image_vectors: Optional[Dict[str, np.ndarray]] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict:
+        """
+        Query-by-example with several models: each model resolves its query vector (precomputed,
+        stored by id, or encoded) and runs its ANN call in parallel; results are fused with the
+        ensemble weights of the matching text-search methods.
+        """
+        image_vectors = image_vectors or {}
+        try:
+            needs_pixels = image is None and image_path is not None and any(m not in image_vectors for m in models)
+            if needs_pixels:
+                # Decode once, shared by every model that has to encode
+                image = self._load_image(image_path)
+
+            per_model: Dict[str, List[Dict]] = {}
+            with ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="img-model") as ex:
+                futures = {
+                    m: ex.submit(self._model_search, m, image, image_id, image_vectors.get(m), partitions, deadline)
+                    for m in models
+                }
+                for m, fut in futures.items():
+                    try:
+                        per_model[m] = fut.result()
+                    except Exception as e:
+                        print(f"[WARN] ImageSearch model '{m}' failed: {e}")
+
+            fused = Dataset.merge_results_columnar(per_model, self._model_weights(list(per_model)), self.topk_each)
+
+            return {
+                "mode": "ImageSearch",
+                "models": list(per_model.keys()),
+                "per_model": per_model,
+                "image_search": fused
+            }
+        except Exception as e:
+            print(f"Error in fused ImageSearch: {e}")
+            return {
+                "mode": "ImageSearch",
+                "results": [],
+                "error": str(e)
+            }
+
+    # ----- Query algebra: weighted text / image components, negatives subtracted ----- #
+    def _encode_texts(self, model_name: str, texts: List[str]) -> np.ndarray:
+        if model_name == "siglip2":
+            if self.siglip2_searcher is None:
+                raise ValueError("SigLIP2 searcher not initialized")
+            return self.siglip2_searcher._encode_text(texts)
+        if self.clip_searcher is None or model_name not in getattr(self.clip_searcher, "models", {}):
+            raise ValueError(f"Model '{model_name}' not loaded")
+        model_info = self.clip_searcher.models[model_name]
+        return np.stack([self.clip_searcher._encode_text(model_info, t) for t in texts])
+
+    def _component_vectors(self, model_name: str, collection_name: str, components: List[Dict]) -> List[Optional[np.ndarray]]:
+        """
+        Embedding per component ({"text": ...} | {"image_id": ...} | {"upload_id": ...}).
+        Texts come from the embedding cache, keyframes from the vector fetcher, uploads from the
+        upload store; an encoder only runs for something never seen before.
+        """
+        texts = [c["text"] for c in components if c.get("text")]
+        text_vecs = embedding_cache.get_many(model_name, "text", texts, lambda ts: self._encode_texts(model_name, ts)) if texts else {}
+        ids = [int(c["image_id"]) for c in components if not c.get("text") and c.get("image_id") is not None]
+        id_vecs = self._stored_vectors(model_name, collection_name, ids) if ids else {}
+
+        vecs: List[Optional[np.ndarray]] = []
+        for c in components:
+            if c.get("text"):
+                vecs.append(text_vecs.get(c["text"]))
+            elif c.get("image_id") is not None:
+                vecs.append(id_vecs.get(int(c["image_id"])))
+            elif c.get("upload_id"):
+                uid = c["upload_id"]
+                vec = upload_store.get_embedding(uid, model_name)
+                if vec is None and upload_store.exists(uid):
+                    vec = embedding_cache.get_many(
+                        model_name, "upload", [uid],
+                        lambda keys: self._encode_batch(model_name, [self._load_image(str(upload_store.path_for(k))) for k in keys]),
+                    ).get(uid)
+                vecs.append(vec)
+            else:
+                vecs.append(None)
+        return vecs
+
+    def compose_vector(
+        self,
+        model_name: str,
+        positives: List[Dict],
+        negatives: Optional[List[Dict]] = None,
+        collection_name: Optional[str] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        sum(weight * positive) - sum(weight * negative), L2-normalized; each component is normalized
+        first so its weight is its actual share. None if no positive component resolves.
+        """
+        negatives = negatives or []
+        collection_name = collection_name or self.collections.get(model_name, model_name)
+        vecs = self._component_vectors(model_name, collection_name, positives + negatives)
+        query = None
+        n_pos = 0
+        for i, (c, vec) in enumerate(zip(positives + negatives, vecs)):
+            if vec is None:
+                print(f"[WARN] ImageSearch - unresolved query component for {model_name}: {c}")
+                continue
+            vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+            norm = np.linalg.norm(vec)
+            if norm == 0:
+                continue
+            sign = 1.0 if i < len(positives) else -1.0
+            n_pos += sign > 0
+            term = sign * float(c.get("weight", 1.0)) * vec / norm
+            query = term if query is None else query + term
+        if query is None or not n_pos:
+            return None
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 1e-8 else None
+
+    def composite_search(
+        self,
+        positives: List[Dict],
+        negatives: Optional[List[Dict]] = None,
+        model_name: Optional[Union[str, List[str]]] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict:
+        """
+        One ANN search per model for a composed query such as "this frame + 'at night' - that frame".
+        Components of one model are combined in its own embedding space; with several models the
+        per-model results are fused like fused_search.
+        """
+        models = self._parse_models(model_name or self.default_model)
+        single = len(models) == 1
+
+        def run(m: str) -> List[Dict]:
+            vec = self.compose_vector(m, positives, negatives)
+            if vec is None:
+                raise ValueError("Composite query has no resolvable positive component")
+            return self._batch_model_search(m, [(None, None, vec)], partitions, deadline, source="image_search" if single else None)[0]
+
+        try:
+            per_model: Dict[str, List[Dict]] = {}
+            with ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="img-model") as ex:
+                futures = {m: ex.submit(run, m) for m in models}
+                for m, fut in futures.items():
+                    try:
+                        per_model[m] = fut.result()
+                    except Exception as e:
+                        if single:
+                            raise
+                        print(f"[WARN] CompositeSearch model '{m}' failed: {e}")
+
+            fused = per_model[models[0]] if single else Dataset.merge_results_columnar(
+                per_model, self._model_weights(list(per_model)), self.topk_each
+            )
+            return {
+                "mode": "CompositeSearch",
+                "models": list(per_model.keys()),
+                "image_search": fused
+            }
+        except Exception as e:
+            print(f"Error in CompositeSearch: {e}")
+            return {
+                "mode": "CompositeSearch",
+                "results": [],
+                "error": str(e)
+            }
+
     def temporal_search(
         self,
         images: Optional[List[Image.Image]] = None,
         image_paths: Optional[List[str]] = None,
-        model_name: str = "siglip2",
-        collection_name: Optional[str] = None
+        model_name: Union[str, List[str]] = "siglip2",
+        collection_name: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        image_ids: Optional[List[Optional[int]]] = None,
+        image_vectors: Optional[List[Optional[Union[np.ndarray, Dict[str, np.ndarray]]]]] = None
     ) -> Dict:
         """
         Temporal search with 2-3 images
         Args:
             images: List of PIL Image objects (2-3 items)
             image_paths: List of image paths (2-3 items) 
-            model_name: Model to use for search
+            image_ids: List of indexed keyframe ids (2-3 items); may be mixed with
+                images / image_paths position by position, None where not used
+            image_vectors: Precomputed query embeddings (uploads), aligned the same way
+            model_name: Model to use for search (several models: fused search per image)
             collection_name: Milvus collection name
+            partitions: Dataset batches to search (e.g. ["L21"]), None for all
+            deadline: time.monotonic() deadline used to pick ef / nprobe
         Returns:
             Aggregated temporal search results
+
+        The images are not searched one after another: files are decoded concurrently, each model
+        encodes all images in one forward pass and sends one multi-vector ANN request, and the
+        models run in parallel.
         """
         try:
-            # Validate inputs
-            image_list = []
-            path_list = []
-            
-            if images:
-                image_list = [img for img in images if img is not None]
-            if image_paths:
-                path_list = [path for path in image_paths if path is not None and path.strip()]
+            # Validate inputs: one (image, path, id, vector) per position, empty positions dropped
+            images, image_paths, image_ids = images or [], image_paths or [], image_ids or []
+            image_vectors = image_vectors or []
+            n_positions = max(len(images), len(image_paths), len(image_ids), len(image_vectors))
+            items = []
+            for pos in range(n_positions):
+                img = images[pos] if pos < len(images) else None
+                path = image_paths[pos] if pos < len(image_paths) else None
+                iid = image_ids[pos] if pos < len(image_ids) else None
+                vec = image_vectors[pos] if pos < len(image_vectors) else None
+                path = path if path is not None and path.strip() else None
+                if img is not None or path is not None or iid is not None or vec is not None:
+                    items.append((img, path, iid, vec))
             
             # Need at least 2 valid images
-            total_items = max(len(image_list), len(path_list))
+            total_items = len(items)
             if total_items < 2:
                 return {
                     "mode": "TemporalImageSearch",
                     "error": "Temporal image search requires at least 2 images"
                 }
             
-            print(f"🖼️ Temporal Image Search: {total_items} images")
-            
-            # Search each image individually
+            models = self._parse_models(model_name or self.default_model)
+            print(f"🖼️ Temporal Image Search: {total_items} images, models: {models}")
+
+            def model_vector(vec, m):
+                if isinstance(vec, dict):
+                    return vec.get(m)
+                return vec if len(models) == 1 else None
+
+            # Decode the files that some model still has to encode, concurrently
+            to_load = [
+                p for p, (img, path, iid, vec) in enumerate(items)
+                if img is None and path is not None and iid is None
+                and any(model_vector(vec, m) is None for m in models)
+            ]
+            loaded: Dict[int, Image.Image] = {}
+            if to_load:
+                with ThreadPoolExecutor(max_workers=len(to_load), thread_name_prefix="img-load") as ex:
+                    for p, pil in zip(to_load, ex.map(lambda p: self._load_image(items[p][1]), to_load)):
+                        loaded[p] = pil
+
+            # One batched search per model, models in parallel
+            single = len(models) == 1
+            per_model: Dict[str, List[List[Dict]]] = {}
+            with ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="img-model") as ex:
+                futures = {
+                    m: ex.submit(
+                        self._batch_model_search, m,
+                        [(items[p][0] or loaded.get(p), items[p][2], model_vector(items[p][3], m)) for p in range(total_items)],
+                        partitions, deadline,
+                        collection_name if single else None,
+                        "image_search" if single else None,
+                    )
+                    for m in models
+                }
+                for m, fut in futures.items():
+                    try:
+                        per_model[m] = fut.result()
+                    except Exception as e:
+                        if single:
+                            raise
+                        print(f"[WARN] Temporal ImageSearch model '{m}' failed: {e}")
+
+            weights = self._model_weights(list(per_model))
             formatted_results: Dict[str, Dict[str, List[Dict]]] = {}
-            
             for idx in range(total_items):
                 q_key = f"q{idx}"
-                formatted_results[q_key] = {}
-                
-                # Get image and path for this index
-                current_image = image_list[idx] if idx < len(image_list) else None
-                current_path = path_list[idx] if idx < len(path_list) else None
-                
-                if current_image is None and current_path is None:
-                    continue
-                
-                # Perform single image search
-                result = self.search(
-                    image=current_image,
-                    model_name=model_name,
-                    collection_name=collection_name,
-                    image_path=current_path
-                )
-                
-                # Extract results
-                image_results = result.get("image_search", [])
-                
+                if single:
+                    image_results = per_model[models[0]][idx]
+                else:
+                    buckets = {m: hits[idx] for m, hits in per_model.items()}
+                    image_results = Dataset.merge_results_columnar(buckets, weights, self.topk_each)
+
                 # Store in temporal format
-                formatted_results[q_key][f"q{idx}_0"] = image_results
-                formatted_results[q_key][f"ensemble_all_q{idx}"] = image_results
+                formatted_results[q_key] = {
+                    f"q{idx}_0": image_results,
+                    f"ensemble_all_q{idx}": image_results,
+                }
             
             # Use create_id_group to aggregate results (similar to temporal text search)
             final_results = create_id_group("B", formatted_results, n_items=total_items)
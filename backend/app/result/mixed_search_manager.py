@@ -1,9 +1,11 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
+import numpy as np
 from PIL import Image
 from app.result.mode_scene_searcher import ModeSceneSearcher
-from app.result.mode_image_searcher import ModeImageSearcher
+from app.result.mode_image_searcher import ModeImageSearcher, SearchOptions
 from app.result.image_search import ImageSearch
 from app.utils.dataset import Dataset
+from app.vector_database.partitions import normalize_partitions, overfetch_size
 
 class MixedSearchManager:
     """Main manager class for coordinating all search modes"""
@@ -38,11 +40,35 @@ class MixedSearchManager:
         topk_each: Optional[int] = None,
         topk_final: Optional[int] = None,
         topk_prev: Optional[int] = None,
-        use_trans: bool = True
+        use_trans: bool = True,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        cascade: Optional[List[str]] = None,
+        coarse: Optional[str] = None,
+        ocr_fuzzy: Optional[bool] = None,
+        asr_keyframes: Optional[bool] = None,
+        rerank: Optional[bool] = None,
+        object_filter: Optional[Union[str, List[Dict]]] = None,
+        plan: Optional[str] = None
     ) -> Dict:
         mode = Dataset.validate_inputs(query, ocr_text, asr_text, ob_list)
+        if mode == "Scene" and asr_keyframes and asr_text:
+            # ASR hits mapped onto keyframes join the visual methods' fusion instead of scene results
+            mode = "Image"
         print(f"Running mixed_search in mode: {mode}")
 
+        # Per-request options travel with the call; the searchers are shared by concurrent requests
+        options = SearchOptions(
+            partitions=normalize_partitions(partitions),
+            deadline=float(deadline) if deadline is not None else None,
+            cascade=list(cascade) if cascade else None,
+            coarse=coarse or None,
+            ocr_fuzzy=bool(ocr_fuzzy),
+            rerank=bool(rerank),
+            object_filter=object_filter or None,
+            plan=plan or None,
+        )
+
         # Temporarily override topk settings across searchers for this call
         saved_values: Dict[tuple, int] = {}
         try:
@@ -62,7 +88,8 @@ class MixedSearchManager:
             if mode == "Scene":
                 return self._handle_mode_scene(query, asr_text)
             elif mode == "Image":
-                return self._handle_mode_image(query, ocr_text, use_cliph14, use_clipbigg14, use_beit3, use_siglip2, use_gg, use_image_cap, use_trans, weight_config)
+                return self._handle_mode_image(query, ocr_text, use_cliph14, use_clipbigg14, use_beit3, use_siglip2, use_gg, use_image_cap, use_trans, weight_config,
+                                               asr_text=asr_text if asr_keyframes else None, options=options)
             else:
                 return {"error": f"Unknown mode: {mode}"}
         finally:
@@ -75,22 +102,74 @@ class MixedSearchManager:
                     if key in saved_values:
                         setattr(searcher, attr, saved_values[key])
     
+    def prefetch_text(
+        self, ocr_texts: Optional[List[str]] = None, asr_texts: Optional[List[str]] = None, topk_each: Optional[int] = None,
+        partitions: Optional[List[str]] = None
+    ) -> None:
+        """
+        Fetch the OCR / ASR searches of several upcoming mixed_search calls in one _msearch
+        (temporal search); those calls then read their results instead of querying again.
+        partitions must match theirs: the OCR size is over-fetched the same way (overfetch_size).
+        """
+        es, requests = self._text_prefetch(ocr_texts, asr_texts, topk_each, partitions)
+        if not requests or es is None:
+            return
+        try:
+            es.prefetch(requests)
+        except Exception as e:
+            print(f"[WARN] Text msearch failed: {e}")
+
+    async def aprefetch_text(
+        self, ocr_texts: Optional[List[str]] = None, asr_texts: Optional[List[str]] = None, topk_each: Optional[int] = None,
+        partitions: Optional[List[str]] = None
+    ) -> None:
+        """prefetch_text on the async Elasticsearch client, for async handlers that then run the search in a thread."""
+        es, requests = self._text_prefetch(ocr_texts, asr_texts, topk_each, partitions)
+        if not requests or es is None:
+            return
+        try:
+            await es.aprefetch(requests)
+        except Exception as e:
+            print(f"[WARN] Async text msearch failed: {e}")
+
+    def _text_prefetch(self, ocr_texts, asr_texts, topk_each, partitions) -> tuple:
+        requests = []
+        image, scene = self.mode_image_searcher, self.mode_scene_searcher
+        if image is not None and image.es is not None:
+            size = int(topk_each) if topk_each is not None else image.topk_each
+            size = overfetch_size(size, normalize_partitions(partitions))
+            requests += [("ocr", t, size) for t in (ocr_texts or []) if t]
+        if scene is not None and scene.es is not None:
+            size = int(topk_each) if topk_each is not None else scene.topk_each
+            requests += [("asr", t, size) for t in (asr_texts or []) if t]
+        es = (image.es if image is not None and image.es is not None else getattr(scene, "es", None))
+        return es, requests
+
     def _handle_mode_scene(self, query: Optional[str], asr_text: Optional[str]) -> Dict:
         if not self.mode_scene_searcher: return {"mode": "Scene", "error": "Mode Scene searcher not initialized"}
         return self.mode_scene_searcher.search(query, asr_text)
     
-    def _handle_mode_image(self, query: str, ocr_text: Optional[str], use_cliph14: bool, use_clipbigg14: bool, use_beit3: bool, use_siglip2: bool, use_gg: bool, use_image_cap: bool, use_trans: bool, weight_config: Optional[str] = None) -> Dict:
+    def _handle_mode_image(self, query: str, ocr_text: Optional[str], use_cliph14: bool, use_clipbigg14: bool, use_beit3: bool, use_siglip2: bool, use_gg: bool, use_image_cap: bool, use_trans: bool, weight_config: Optional[str] = None, asr_text: Optional[str] = None, options: Optional[SearchOptions] = None) -> Dict:
         if not self.mode_image_searcher: return {"mode": "Image", "error": "Mode Image searcher not initialized"}
-        return self.mode_image_searcher.search(query, ocr_text, use_cliph14, use_clipbigg14, use_beit3, use_siglip2, use_gg, use_image_cap, weight_config, use_trans=use_trans)
+        return self.mode_image_searcher.search(query, ocr_text, use_cliph14, use_clipbigg14, use_beit3, use_siglip2, use_gg, use_image_cap, weight_config, use_trans=use_trans, asr_text=asr_text, options=options)
     
     def search_by_image(
         self,
         image: Optional[Image.Image] = None,
-        model_name: str = "siglip2",
+        model_name: Union[str, List[str]] = "siglip2",
         collection_name: Optional[str] = None,
         topk: Optional[int] = None,
-        image_path: Optional[str] = None
+        image_path: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        image_id: Optional[int] = None,
+        image_vector: Optional[Union[np.ndarray, Dict[str, np.ndarray]]] = None
     ) -> Dict:
+        """
+        Search by an uploaded image, or by an indexed keyframe id (image_id) without any path / file work.
+        image_vector is a precomputed query embedding (uploads are embedded at upload time).
+        Several models in model_name run in parallel and are fused (image_vector then maps model -> vector).
+        """
         if not self.image_search:
             return {"mode": "ImageSearch", "results": [], "error": "Image searcher not initialized"}
         saved_topk = getattr(self.image_search, "topk_each", None)
@@ -101,7 +180,11 @@ class MixedSearchManager:
                 image=image,
                 model_name=model_name,
                 collection_name=collection_name,
-                image_path=image_path
+                image_path=image_path,
+                partitions=partitions,
+                deadline=deadline,
+                image_id=image_id,
+                image_vector=image_vector
             )
         finally:
             if saved_topk is not None:
@@ -111,18 +194,26 @@ class MixedSearchManager:
         self,
         images: Optional[List[Image.Image]] = None,
         image_paths: Optional[List[str]] = None,
-        model_name: str = "siglip2",
+        model_name: Union[str, List[str]] = "siglip2",
         collection_name: Optional[str] = None,
-        topk: Optional[int] = None
+        topk: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        image_ids: Optional[List[Optional[int]]] = None,
+        image_vectors: Optional[List[Optional[Union[np.ndarray, Dict[str, np.ndarray]]]]] = None
     ) -> Dict:
         """
         Temporal search with 2-3 images
         Args:
             images: List of PIL Image objects (2-3 items)
             image_paths: List of image paths (2-3 items)
+            image_ids: List of indexed keyframe ids (2-3 items), aligned with image_paths
+            image_vectors: Precomputed upload embeddings, aligned with image_paths
             model_name: Model to use for search
             collection_name: Milvus collection name
             topk: Number of results per search
+            partitions: Dataset batches to search (e.g. ["L21"]), None for all
+            deadline: time.monotonic() deadline used to pick ef / nprobe
         """
         if not self.image_search:
             return {"mode": "TemporalImageSearch", "results": [], "error": "Image searcher not initialized"}
@@ -135,8 +226,42 @@ class MixedSearchManager:
                 images=images,
                 image_paths=image_paths,
                 model_name=model_name,
-                collection_name=collection_name
+                collection_name=collection_name,
+                partitions=partitions,
+                deadline=deadline,
+                image_ids=image_ids,
+                image_vectors=image_vectors
             )
         finally:
             if saved_topk is not None:
-                self.image_search.topk_each = saved_topk
\ No newline at end of file
+                self.image_search.topk_each = saved_topk
+    
+    def composite_search(
+        self,
+        positives: List[Dict],
+        negatives: Optional[List[Dict]] = None,
+        model_name: Optional[Union[str, List[str]]] = None,
+        topk: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None
+    ) -> Dict:
+        """
+        Query algebra over text and image embeddings of the same model:
+        positives / negatives are {"text" | "image_id" | "upload_id": ..., "weight": float}.
+        """
+        if not self.image_search:
+            return {"mode": "CompositeSearch", "results": [], "error": "Image searcher not initialized"}
+        saved_topk = getattr(self.image_search, "topk_each", None)
+        try:
+            if topk is not None:
+                self.image_search.topk_each = int(topk)
+            return self.image_search.composite_search(
+                positives=positives,
+                negatives=negatives,
+                model_name=model_name,
+                partitions=partitions,
+                deadline=deadline
+            )
+        finally:
+            if saved_topk is not None:
+                self.image_search.topk_each = saved_topk
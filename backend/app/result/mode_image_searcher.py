@@ -1,15 +1,69 @@
-from typing import List, Dict, Optional, Callable, Any
+from typing import List, Dict, Optional, Callable, Any, Union
 from dataclasses import dataclass
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
+import threading
+import time
+import numpy as np
 from app.retrieve.clip import CLIPSearcher
 from app.retrieve.beit3 import BEiT3Searcher
 from app.retrieve.siglip2 import SigLIP2Searcher
 from app.retrieve.ocr_asr_ic import ElasticSearcher
 from app.retrieve.google import GoogleSearcher
+from app.retrieve.ocr_fuzzy import ocr_fuzzy
 from app.vector_database.vector_db_manager import DatabaseManager
+from app.vector_database.partitions import filter_by_partitions, overfetch_size
+from app.vector_database.search_params import search_param_controller
+from app.vector_database.vector_fetch import exact_topk, fetch_vectors
+from app.vector_database.coarse_index import coarse_index
+from app.vector_database.reduced_index import reduced_index
+from app.vector_database.interval_index import scene_intervals
+from app.vector_database.object_index import object_index, filter_hits
 from app.generate.gemini.gemini import Gemini
+from app.rerank.rerank_stage import rerank_stage
 from app.utils.dataset import Dataset
 from app.utils.weight_manager import weight_manager
+from app.utils.embedding_cache import embedding_cache
+from app.utils.query_planner import query_planner
+
+try:
+    from app.config.settings import CASCADE_POOL, OBJECT_EXACT_MAX, OBJECT_OVERFETCH, QUERY_PLAN
+except ImportError:
+    CASCADE_POOL, OBJECT_EXACT_MAX, OBJECT_OVERFETCH, QUERY_PLAN = 1000, 20000, 4, "full"
+
+# Dense text-to-image methods -> model / collection key; these can take part in a cascade
+DENSE_METHODS = {
+    "clip_h14": "h14_quickgelu", "clip_bigg14": "bigg14_datacomp",
+    "beit3": "beit3", "siglip2": "siglip2"
+}
+
+# Planned top-K of the method running on the current worker thread (see _run_method / _topk)
+_planned_topk = threading.local()
+
+@dataclass
+class SearchOptions:
+    """Settings of one request, passed down the call chain: the searcher itself is shared by concurrent requests."""
+    # Dataset batches to search (e.g. ["L21"]); None searches every partition
+    partitions: Optional[List[str]] = None
+    # time.monotonic() deadline of the request; drives adaptive ef / nprobe
+    deadline: Optional[float] = None
+    # Cascade mode: these dense methods (e.g. ["siglip2"]) recall a candidate pool with ANN and every
+    # enabled dense method scores the pool exactly from stored vectors; None runs one ANN per method
+    cascade: Optional[List[str]] = None
+    # Coarse-to-fine: "video" or "shot" picks the top groups from the side collection first and
+    # scores only their keyframes (also used for the cascade recall); None searches all keyframes
+    coarse: Optional[str] = None
+    # Fuzzy OCR: also match the OCR text as a noisy substring through the trigram index ("ocr_fuzzy")
+    ocr_fuzzy: bool = False
+    # Second stage: rerank the fused top-N with rerank_stage (RERANK_BACKEND), bounded by the deadline
+    rerank: bool = False
+    # Object / color filter, e.g. "2 person, red car" or [{"name", "color", "count"}]: only keyframes
+    # matching every object (object_index bitmaps) are searched and returned; None = no filter
+    object_filter: Optional[Union[str, List[Dict]]] = None
+    # "full": every enabled method runs at topk_each, and query_planner still records each method's
+    # contribution; "auto": the planner picks each method's top-K (or skips it) from those stats;
+    # None = QUERY_PLAN
+    plan: Optional[str] = None
 
 @dataclass
 class MethodConfig:
@@ -17,6 +71,7 @@ class MethodConfig:
     enabled: bool
     search_func: Callable
     param: Any
+    topk: Optional[int] = None  # planner's top-K; None = topk_each
 
 class ModeImageSearcher:
     def __init__(
@@ -43,12 +98,14 @@ class ModeImageSearcher:
         self.topk_each = topk_each
         self.topk_final = topk_final
         self.topk_prev = topk_prev
+        # Candidate pool size of cascade mode (SearchOptions.cascade)
+        self.cascade_pool = CASCADE_POOL
 
         self.max_workers_methods = max_workers_methods
 
         self.weights = {
             "clip_h14": 1.0, "clip_bigg14": 1.0, "siglip2": 1.0,
-            "beit3": 0.8, "ocr": 0.8, "gg": 0.6, "img_cap": 0.8
+            "beit3": 0.8, "ocr": 0.8, "ocr_fuzzy": 0.8, "gg": 0.6, "img_cap": 0.8, "asr_keyframe": 0.8
         }
         self.weight_manager = weight_manager
 
@@ -68,8 +125,11 @@ class ModeImageSearcher:
         use_gg: bool = False,
         use_image_cap: bool = False,
         weight_config: Optional[str] = None,
-        use_trans: bool = True
+        use_trans: bool = True,
+        asr_text: Optional[str] = None,
+        options: Optional[SearchOptions] = None
     ) -> Dict:
+        opts = options or SearchOptions()
         print(f"Mode Image - Methods: ClipH14={use_cliph14}, ClipBigG14={use_clipbigg14}, BEiT3={use_beit3}, SigLIP2={use_siglip2}, OCR={bool(ocr_text)}, GG={use_gg}, ImgCap={use_image_cap}")
 
         optimal_weights = self.weight_manager.get_weights_for_methods(
@@ -98,27 +158,153 @@ class ModeImageSearcher:
         else:
             queries = [query]
 
+        has_ocr_fuzzy = bool(ocr_text) and opts.ocr_fuzzy
+        methods = [m for m, enabled in self._method_flags(
+            use_cliph14, use_clipbigg14, use_beit3, use_siglip2, bool(ocr_text), use_gg, use_image_cap, bool(asr_text),
+            has_ocr_fuzzy
+        ) if enabled]
+        plan = self._plan_methods(methods, opts)
+
+        # All Elasticsearch work of the request (captions per query variant, OCR once) in one _msearch;
+        # _search_image_cap / _search_ocr then read their results from the prefetch
+        self._prefetch_text(queries, ocr_text, use_image_cap, asr_text, plan=plan, partitions=opts.partitions)
+
+        allowed = None
+        if opts.object_filter and object_index.available():
+            allowed = object_index.match(opts.object_filter)
+            print(f"Object filter {opts.object_filter}: {len(allowed)} keyframes")
+        elif opts.object_filter:
+            print(f"[WARN] Object filter {opts.object_filter} ignored: no object index")
+
         # Xử lý query chạy song song các method
-        all_query_buckets = {
-            q_idx: self._search_single_query_parallel(
+        search_params_used: Dict[str, Dict[str, Dict]] = {}
+        latencies: Dict[str, float] = {}
+        all_query_buckets = {}
+        for q_idx, q in enumerate(queries):
+            search_params_used[f"query_{q_idx}"] = {}
+            buckets = self._search_single_query_parallel(
                 q, original_query, ocr_text, use_cliph14, use_clipbigg14,
-                use_beit3, use_siglip2, use_gg, use_image_cap
+                use_beit3, use_siglip2, use_gg, use_image_cap,
+                opts, search_params_out=search_params_used[f"query_{q_idx}"],
+                asr_text=asr_text, allowed=allowed, plan=plan,
+                latencies_out=latencies if q_idx == 0 else None
             )
-            for q_idx, q in enumerate(queries)
-        }
+            # Post-filter: text, Google and cascade results only keep keyframes with the requested objects
+            all_query_buckets[q_idx] = {m: filter_hits(hits, allowed) for m, hits in buckets.items()} if allowed is not None else buckets
 
-        return self._create_all_results(
+        response = self._create_all_results(
             all_query_buckets, use_cliph14, use_clipbigg14,
-            use_beit3, use_siglip2, bool(ocr_text), use_gg, use_image_cap
+            use_beit3, use_siglip2, bool(ocr_text), use_gg, use_image_cap,
+            has_asr=bool(asr_text), has_ocr_fuzzy=has_ocr_fuzzy
         )
+        # Contribution of each full-depth method to the fused top-N (first query variant, before rerank)
+        if all_query_buckets:
+            query_planner.record(
+                all_query_buckets[0], response["ensemble_all_queries_all_methods"], self.topk_final,
+                full_methods=[m for m in methods if plan.get(m) == self.topk_each],
+                methods=methods, latencies=latencies,
+            )
+        if opts.rerank and rerank_stage.enabled:
+            self._rerank_response(response, queries, opts.deadline)
+        # Report the ef / nprobe setting each ANN method actually ran with
+        response["search_params"] = search_params_used
+        response["plan"] = plan
+        if opts.object_filter:
+            # Tell the caller whether results were actually restricted to the requested objects
+            response["object_filter"] = {"keyframes": len(allowed)} if allowed is not None else "unavailable"
+        return response
+
+    def _plan_methods(self, methods: List[str], opts: SearchOptions) -> Dict[str, int]:
+        """method -> top-K for this request (0 = skipped)."""
+        if (opts.plan or QUERY_PLAN) == "full" or opts.cascade:
+            # Cascade scores one shared candidate pool for all dense methods: nothing to plan per method
+            return {m: self.topk_each for m in methods}
+        budget_ms = (opts.deadline - time.monotonic()) * 1000.0 if opts.deadline is not None else None
+        plan = query_planner.plan(methods, self.topk_each, budget_ms)
+        if any(k != self.topk_each for k in plan.values()):
+            print(f"Query plan: {plan}")
+        return plan
+
+    def _rerank_response(self, response: Dict, queries: List[str], deadline: Optional[float] = None) -> None:
+        """Rerank each query's ensemble with that query and the overall ensemble with the first one."""
+        for q_idx, q in enumerate(queries):
+            block = response.get("per_query", {}).get(f"query_{q_idx}")
+            if block and block.get("ensemble_all_methods"):
+                block["ensemble_all_methods"] = rerank_stage.rerank(q, block["ensemble_all_methods"], deadline)
+        if response.get("ensemble_all_queries_all_methods") and queries:
+            # Mostly cache hits: the same ids were just scored for queries[0]
+            response["ensemble_all_queries_all_methods"] = rerank_stage.rerank(
+                queries[0], response["ensemble_all_queries_all_methods"], deadline
+            )
+
+    def text_requests(
+        self, queries: List[str], ocr_text: Optional[str], use_image_cap: bool, asr_text: Optional[str] = None,
+        plan: Optional[Dict[str, int]] = None, partitions: Optional[List[str]] = None
+    ) -> List[tuple]:
+        """
+        (index, query, size) of every Elasticsearch search a request with these inputs makes.
+        Methods the plan skips are left out; the others keep size _text_size() (shared with earlier
+        prefetches) and are cut to their planned top-K afterwards.
+        """
+        plan = plan or {}
+        size = self._text_size(partitions)
+        requests = [("ic", q, size) for q in queries if q] if use_image_cap and plan.get("img_cap") != 0 else []
+        if ocr_text and plan.get("ocr") != 0:
+            requests.append(("ocr", ocr_text, size))
+        if asr_text and plan.get("asr_keyframe") != 0:
+            requests.append(("asr", asr_text, size))
+        return requests
+
+    def _text_size(self, partitions: Optional[List[str]] = None) -> int:
+        """Elasticsearch size: topk_each, over-fetched when partitions are post-filtered afterwards."""
+        return overfetch_size(self.topk_each, partitions)
+
+    def _prefetch_text(
+        self, queries: List[str], ocr_text: Optional[str], use_image_cap: bool, asr_text: Optional[str] = None,
+        plan: Optional[Dict[str, int]] = None, partitions: Optional[List[str]] = None
+    ) -> None:
+        if not self.es:
+            return
+        try:
+            self.es.prefetch(self.text_requests(queries, ocr_text, use_image_cap, asr_text, plan=plan, partitions=partitions))
+        except Exception as e:
+            # Methods fall back to one search per index
+            print(f"[WARN] Text msearch failed: {e}")
+
+    @staticmethod
+    def _run_method(cfg: MethodConfig, opts: SearchOptions):
+        """Run one method at its planned top-K; capture the ANN setting it used and its wall time (ms)."""
+        search_param_controller.reset_last_choice()
+        _planned_topk.k = cfg.topk
+        start = time.perf_counter()
+        try:
+            out = cfg.search_func(cfg.param, opts)
+        finally:
+            _planned_topk.k = None
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        choice = search_param_controller.last_choice()
+        return out, (choice.to_dict() if choice is not None else None), elapsed_ms
+
+    def _topk(self) -> int:
+        """Top-K of the method running on this thread: its planned one, else topk_each."""
+        return getattr(_planned_topk, "k", None) or self.topk_each
 
     def _search_single_query_parallel(
         self, query: str, original_query: str, ocr_text: Optional[str], use_cliph14: bool,
-        use_clipbigg14: bool, use_beit3: bool, use_siglip2: bool, use_gg: bool, use_image_cap: bool
+        use_clipbigg14: bool, use_beit3: bool, use_siglip2: bool, use_gg: bool, use_image_cap: bool,
+        opts: SearchOptions, search_params_out: Optional[Dict[str, Dict]] = None, asr_text: Optional[str] = None,
+        allowed: Optional[np.ndarray] = None, plan: Optional[Dict[str, int]] = None,
+        latencies_out: Optional[Dict[str, float]] = None
     ) -> Dict[str, List[Dict]]:
         """
         Chạy song song các phương pháp cho 1 query bằng ThreadPoolExecutor.
+        search_params_out (optional) receives method -> ANN setting used; latencies_out method -> ms.
+        plan (method -> top-K, 0 = skip) comes from _plan_methods.
         """
+        if search_params_out is None:
+            search_params_out = {}
+        if latencies_out is None:
+            latencies_out = {}
         method_configs = [
             MethodConfig("clip_h14", use_cliph14, self._search_clip_h14, query),
             MethodConfig("clip_bigg14", use_clipbigg14, self._search_clip_bigg14, query),
@@ -126,43 +312,224 @@ class ModeImageSearcher:
             MethodConfig("siglip2", use_siglip2, self._search_siglip2, query),
             MethodConfig("img_cap", use_image_cap, self._search_image_cap, query),
             MethodConfig("ocr", bool(ocr_text), self._search_ocr, ocr_text),
+            MethodConfig("ocr_fuzzy", bool(ocr_text) and opts.ocr_fuzzy, self._search_ocr_fuzzy, ocr_text),
+            MethodConfig("asr_keyframe", bool(asr_text), self._search_asr_keyframes, asr_text),
             MethodConfig("gg", use_gg, self._search_google, original_query)
         ]
+        for cfg in method_configs:
+            if plan and cfg.name in plan:
+                cfg.enabled = cfg.enabled and plan[cfg.name] > 0
+                cfg.topk = plan[cfg.name] or None
+
+        # Cascade: the dense methods are replaced by one recall + exact rerank step
+        cascade_methods = [cfg.name for cfg in method_configs if cfg.enabled and cfg.name in DENSE_METHODS] if opts.cascade else []
+        if cascade_methods:
+            for cfg in method_configs:
+                if cfg.name in cascade_methods:
+                    cfg.enabled = False
+        else:
+            # Coarse-to-fine and reduced-dimension first stages need the query vector: route those
+            # methods through _dense_search instead of the searcher's own text_search; so does an object filter
+            for cfg in method_configs:
+                if cfg.name in DENSE_METHODS and (allowed is not None or opts.coarse or reduced_index.enabled(self.collections[DENSE_METHODS[cfg.name]])):
+                    cfg.search_func = functools.partial(self._dense_search, cfg.name, allowed=allowed)
 
         results: Dict[str, List[Dict]] = {}
         # Nếu max_workers_methods <= 1 → chạy tuần tự để đảm bảo an toàn
         if self.max_workers_methods <= 1:
+            if cascade_methods:
+                results.update(self._cascade_search(query, cascade_methods, opts, search_params_out, allowed=allowed))
             for cfg in method_configs:
                 if not cfg.enabled: 
                     continue
-                out = cfg.search_func(cfg.param)
+                out, choice, elapsed_ms = self._run_method(cfg, opts)
                 if out: results[cfg.name] = out
+                if choice: search_params_out[cfg.name] = choice
+                latencies_out[cfg.name] = elapsed_ms
             return results
 
         with ThreadPoolExecutor(max_workers=self.max_workers_methods, thread_name_prefix="img-method") as ex:
             futures = {
-                ex.submit(cfg.search_func, cfg.param): cfg.name
+                ex.submit(self._run_method, cfg, opts): cfg.name
                 for cfg in method_configs if cfg.enabled
             }
+            cascade_future = ex.submit(self._cascade_search, query, cascade_methods, opts, search_params_out, allowed) if cascade_methods else None
+            if cascade_future is not None:
+                try:
+                    results.update(cascade_future.result())
+                except Exception as e:
+                    print(f"[WARN] Cascade search failed: {e}")
             for fut in as_completed(futures):
                 name = futures[fut]
                 try:
-                    out = fut.result()
+                    out, choice, elapsed_ms = fut.result()
                     if out:
                         results[name] = out
+                    if choice:
+                        search_params_out[name] = choice
+                    latencies_out[name] = elapsed_ms
                 except Exception as e:
                     # Log lỗi từng method, không làm hỏng cả query
                     print(f"[WARN] Method '{name}' failed: {e}")
         return results
 
-    
-    def _create_all_results(self, all_query_buckets: Dict[int, Dict[str, List[Dict]]],
-                            use_cliph14: bool, use_clipbigg14: bool,
-                            use_beit3: bool, use_siglip2: bool, has_ocr: bool, use_gg: bool, use_image_cap: bool) -> Dict:
-        method_flags = [
+
+    # ----- Cascade: ANN recall with a few models, exact scores from stored vectors for all ----- #
+    def _encode_query(self, method: str, query: str) -> Optional[np.ndarray]:
+        """Text embedding of `query` for a dense method (cached per model)."""
+        model_name = DENSE_METHODS[method]
+        if method == "siglip2":
+            if not self.siglip2: return None
+            encode = lambda texts: self.siglip2._encode_text(texts)
+        elif method == "beit3":
+            if not self.beit3: return None
+            encode = lambda texts: self.beit3.encode_text(texts)
+        else:
+            if not self.clip_searcher or model_name not in getattr(self.clip_searcher, "models", {}):
+                return None
+            model_info = self.clip_searcher.models[model_name]
+            encode = lambda texts: np.stack([self.clip_searcher._encode_text(model_info, t) for t in texts])
+        return embedding_cache.get_many(model_name, "text", [query], encode).get(query)
+
+    def _searcher_client(self, method: str):
+        if method == "siglip2":
+            return self.siglip2._get_milvus()
+        return (self.beit3 if method == "beit3" else self.clip_searcher)._get_milvus()
+
+    def _recall(self, method: str, vec: np.ndarray, topk: int, opts: SearchOptions) -> List[Dict]:
+        collection = self.collections[DENSE_METHODS[method]]
+        if opts.coarse:
+            hits = coarse_index.search(
+                self._searcher_client(method), collection, vec, topk, level=opts.coarse,
+                partitions=opts.partitions, deadline=opts.deadline,
+            )
+            if hits is not None:
+                return hits
+        if reduced_index.enabled(collection):
+            hits = reduced_index.search(
+                self._searcher_client(method), collection, vec, topk,
+                partitions=opts.partitions, deadline=opts.deadline,
+            )
+            if hits is not None:
+                return hits
+        if method == "siglip2":
+            return self.siglip2.vector_search(vec, topk=topk, collection_name=collection, partitions=opts.partitions, deadline=opts.deadline)
+        if method == "beit3":
+            return self.beit3.vector_search(vec, topk=topk, collection_name=collection, partitions=opts.partitions, deadline=opts.deadline)
+        return self.clip_searcher.vector_search(vec, topk, collection, partitions=opts.partitions, deadline=opts.deadline)
+
+    def _dense_search(self, method: str, query: str, opts: SearchOptions, allowed: Optional[np.ndarray] = None) -> Optional[List[Dict]]:
+        """
+        One dense method through _recall (coarse-to-fine or reduced-dimension first stage).
+        With an object filter, small id sets are scored exactly and larger ones over-fetch ANN.
+        """
+        vec = self._encode_query(method, query)
+        if vec is None:
+            return None
+        if allowed is not None and len(allowed) <= OBJECT_EXACT_MAX:
+            results = self._exact_search(method, vec, allowed)
+        elif allowed is not None:
+            results = filter_hits(self._recall(method, vec, self._topk() * OBJECT_OVERFETCH, opts), allowed)[:self._topk()]
+        else:
+            results = self._recall(method, vec, self._topk(), opts)
+        if method == "clip_bigg14":
+            return Dataset.merge_results({"bigg14_datacomp": results}, {"bigg14_datacomp": 0.3}, self._topk())
+        return Dataset.format_search_results(results, method)
+
+    def _exact_search(self, method: str, vec: np.ndarray, ids: np.ndarray) -> List[Dict]:
+        """Cosine scores of the query against the stored vectors of a small id set."""
+        stored = self._stored_vectors(method, [int(i) for i in ids])
+        found = [int(i) for i in ids if int(i) in stored]
+        if not found:
+            return []
+        matrix = np.stack([np.asarray(stored[i], dtype=np.float32).reshape(-1) for i in found])
+        top, scores = exact_topk(matrix, vec, self._topk())
+        return [{"id": found[j], "score": float(s)} for j, s in zip(top, scores)]
+
+    def _stored_vectors(self, method: str, ids: List[int]) -> Dict[int, np.ndarray]:
+        collection = self.collections[DENSE_METHODS[method]]
+        if method == "siglip2":
+            return self.siglip2.vectors_from_ids(collection, ids)
+        searcher = self.beit3 if method == "beit3" else self.clip_searcher
+        found = fetch_vectors(collection, ids)
+        missing = [i for i in ids if i not in found]
+        if missing:
+            found.update(fetch_vectors(collection, missing, client=searcher._get_milvus()))
+        return found
+
+    def _cascade_search(
+        self, query: str, methods: List[str], opts: SearchOptions, search_params_out: Optional[Dict[str, Dict]] = None,
+        allowed: Optional[np.ndarray] = None
+    ) -> Dict[str, List[Dict]]:
+        """
+        Candidate pool from ANN over the recall methods (opts.cascade, or the first enabled dense
+        method), then each enabled dense method scores every candidate exactly: its stored vectors
+        are fetched in bulk and scored with one matmul against the query embedding. Every candidate
+        thus gets a score from every model, with one ANN call per recall method instead of per method.
+        With an object filter the pool is the filtered id set itself when small, else an over-fetched,
+        filtered ANN pool (as in _dense_search).
+        """
+        if search_params_out is None:
+            search_params_out = {}
+        vecs = {m: self._encode_query(m, query) for m in methods}
+        methods = [m for m in methods if vecs[m] is not None]
+        recall = [m for m in (opts.cascade or []) if m in methods] or methods[:1]
+        if not recall:
+            return {}
+
+        # Stage 1: candidate pool (union of the recall methods' top cascade_pool)
+        candidates: Dict[int, None] = {}
+        if allowed is not None and len(allowed) <= OBJECT_EXACT_MAX:
+            candidates = dict.fromkeys(int(i) for i in allowed)
+            recall = []
+        pool = max(self.cascade_pool, self.topk_each) * (OBJECT_OVERFETCH if allowed is not None else 1)
+        for m in recall:
+            search_param_controller.reset_last_choice()
+            for item in filter_hits(self._recall(m, vecs[m], pool, opts), allowed):
+                if item.get("id") is not None:
+                    candidates[int(item["id"])] = None
+            choice = search_param_controller.last_choice()
+            if choice is not None:
+                search_params_out[m] = {**choice.to_dict(), "cascade": "recall"}
+        ids = list(candidates)
+        if not ids:
+            return {}
+
+        # Stage 2: exact cosine for every candidate under every enabled dense method
+        results: Dict[str, List[Dict]] = {}
+        for m in methods:
+            stored = self._stored_vectors(m, ids)
+            found = [i for i in ids if i in stored]
+            if not found:
+                continue
+            matrix = np.stack([np.asarray(stored[i], dtype=np.float32).reshape(-1) for i in found])
+            top, scores = exact_topk(matrix, vecs[m], self.topk_each)
+            ranked = [{"id": found[j], "score": float(s)} for j, s in zip(top, scores)]
+            if m == "clip_bigg14":
+                # Same scaling as the per-method path (_search_clip_bigg14)
+                results[m] = Dataset.merge_results({"bigg14_datacomp": ranked}, {"bigg14_datacomp": 0.3}, self.topk_each)
+            else:
+                results[m] = Dataset.format_search_results(ranked, m)
+            if m not in search_params_out:
+                search_params_out[m] = {"cascade": "rerank", "candidates": len(ids), "scored": len(found)}
+        return results
+
+    def _method_flags(self, use_cliph14: bool, use_clipbigg14: bool, use_beit3: bool, use_siglip2: bool,
+                      has_ocr: bool, use_gg: bool, use_image_cap: bool, has_asr: bool = False,
+                      has_ocr_fuzzy: bool = False) -> List[tuple]:
+        return [
             ("clip_h14", use_cliph14), ("clip_bigg14", use_clipbigg14),
-            ("beit3", use_beit3), ("siglip2", use_siglip2), ("ocr", has_ocr), ("gg", use_gg), ("img_cap", use_image_cap)
+            ("beit3", use_beit3), ("siglip2", use_siglip2), ("ocr", has_ocr), ("ocr_fuzzy", has_ocr_fuzzy),
+            ("gg", use_gg), ("img_cap", use_image_cap), ("asr_keyframe", has_asr)
         ]
+
+    def _create_all_results(self, all_query_buckets: Dict[int, Dict[str, List[Dict]]],
+                            use_cliph14: bool, use_clipbigg14: bool,
+                            use_beit3: bool, use_siglip2: bool, has_ocr: bool, use_gg: bool, use_image_cap: bool,
+                            has_asr: bool = False, has_ocr_fuzzy: bool = False) -> Dict:
+        method_flags = self._method_flags(
+            use_cliph14, use_clipbigg14, use_beit3, use_siglip2, has_ocr, use_gg, use_image_cap, has_asr, has_ocr_fuzzy
+        )
         results_per_query = {
             f"query_{q_idx}": {
                 "per_method": {
@@ -221,18 +588,20 @@ class ModeImageSearcher:
         return [query]
 
     # ----- Các method đơn lẻ giữ nguyên logic gốc ----- #
-    def _search_clip_h14(self, query: str) -> Optional[List[Dict]]:
+    def _search_clip_h14(self, query: str, opts: SearchOptions) -> Optional[List[Dict]]:
         if not self.clip_searcher or "h14_quickgelu" not in getattr(self.clip_searcher, "models", {}):
             return None
         results = self.clip_searcher.text_search(
             model_name="h14_quickgelu",
-            topk=self.topk_each,
+            topk=self._topk(),
             query=query,
             collection_name=self.collections["h14_quickgelu"],
+            partitions=opts.partitions,
+            deadline=opts.deadline,
         )
         return Dataset.format_search_results(results, "clip_h14")
 
-    def _search_clip_bigg14(self, query: str) -> Optional[List[Dict]]:
+    def _search_clip_bigg14(self, query: str, opts: SearchOptions) -> Optional[List[Dict]]:
         if not self.clip_searcher:
             return None
         multi_models = [
@@ -240,53 +609,79 @@ class ModeImageSearcher:
         ]
         multi_buckets = {
             model_name: self.clip_searcher.text_search(
-                model_name, self.topk_each, query,
-                collection_name=coll
+                model_name, self._topk(), query,
+                collection_name=coll, partitions=opts.partitions, deadline=opts.deadline
             )
             for model_name, coll, _ in multi_models
             if model_name in getattr(self.clip_searcher, "models", {})
         }
         if multi_buckets:
             mc_weights = {m: w for m, _, w in multi_models}
-            return Dataset.merge_results(multi_buckets, mc_weights, self.topk_each)
+            return Dataset.merge_results(multi_buckets, mc_weights, self._topk())
         return None
 
-    def _search_beit3(self, query: str) -> Optional[List[Dict]]:
+    def _search_beit3(self, query: str, opts: SearchOptions) -> Optional[List[Dict]]:
         if not self.beit3: return None
         results = self.beit3.text_search(
             query=query,
-            topk=self.topk_each,
+            topk=self._topk(),
             collection_name=self.collections["beit3"],
+            partitions=opts.partitions,
+            deadline=opts.deadline,
         )
         return Dataset.format_search_results(results, "beit3")
 
-    def _search_siglip2(self, query: str) -> Optional[List[Dict]]:
+    def _search_siglip2(self, query: str, opts: SearchOptions) -> Optional[List[Dict]]:
         if not self.siglip2: return None
         results = self.siglip2.text_search(
             query=query,
-            topk=self.topk_each,
+            topk=self._topk(),
             collection_name=self.collections["siglip2"],
+            partitions=opts.partitions,
+            deadline=opts.deadline,
         )
         return Dataset.format_search_results(results, "siglip2")
     
-    def _search_image_cap(self, query: str) -> Optional[List[Dict]]:
+    def _search_image_cap(self, query: str, opts: SearchOptions) -> Optional[List[Dict]]:
         if not self.es: return None
-        results = self.es.search_text("ic", query, size=self.topk_each)
+        results = self.es.search_text("ic", query, size=self._text_size(opts.partitions))
+        results = filter_by_partitions(results, opts.partitions)[:self._topk()]
         return Dataset.format_search_results(results, "img_cap")
     
-    def _search_ocr(self, ocr_text: str) -> Optional[List[Dict]]:
+    def _search_ocr(self, ocr_text: str, opts: SearchOptions) -> Optional[List[Dict]]:
         if not self.es: return None
-        results = self.es.search_text("ocr", ocr_text, size=self.topk_each)
+        results = self.es.search_text("ocr", ocr_text, size=self._text_size(opts.partitions))
+        results = filter_by_partitions(results, opts.partitions)[:self._topk()]
         return Dataset.format_search_results(results, "ocr")
     
-    def _search_google(self, query: str) -> Optional[List[Dict]]:
+    def _search_ocr_fuzzy(self, ocr_text: str, opts: SearchOptions) -> Optional[List[Dict]]:
+        if not ocr_fuzzy.available("ocr"): return None
+        results = ocr_fuzzy.search_text("ocr", ocr_text, size=overfetch_size(self._topk(), opts.partitions))
+        results = filter_by_partitions(results, opts.partitions)[:self._topk()]
+        return Dataset.format_search_results(results, "ocr_fuzzy")
+
+    def _search_asr_keyframes(self, asr_text: str, opts: SearchOptions) -> Optional[List[Dict]]:
+        """ASR (scene) hits spread onto the keyframes each speech segment covers."""
+        if not self.es or not scene_intervals.available(): return None
+        scenes = self.es.search_text("asr", asr_text, size=self._text_size(opts.partitions))
+        if opts.partitions:
+            # Scene ids carry no batch: keep the scenes that still cover a keyframe of the partitions
+            kept = filter_by_partitions(scene_intervals.scene_hits_to_keyframes(scenes), opts.partitions)
+            in_partitions = set(scene_intervals.scenes_of_keyframes([h["id"] for h in kept]).tolist())
+            scenes = [s for s in scenes if s.get("id") is not None and int(s["id"]) in in_partitions]
+        scenes = scenes[:self._topk()]
+        results = filter_by_partitions(scene_intervals.scene_hits_to_keyframes(scenes), opts.partitions)
+        return Dataset.format_search_results(results, "asr_keyframe")
+
+    def _search_google(self, query: str, opts: SearchOptions) -> Optional[List[Dict]]:
         if not self.google_searcher: return None
         results = self.google_searcher.search(
             query=query,
             collection_name=self.collections["h14_quickgelu"],
-            topk=self.topk_each,
+            topk=self._topk(),
             max_download=3,
-            model_name="h14_quickgelu"
+            model_name="h14_quickgelu",
+            partitions=opts.partitions
         )
         return Dataset.format_search_results(results, "gg")
 
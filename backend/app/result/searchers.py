@@ -2,7 +2,7 @@ import torch
 import json
 import os
 import numpy as np
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 from app.retrieve.clip import CLIPSearcher
 from app.retrieve.beit3 import BEiT3Searcher
 from app.retrieve.siglip2 import SigLIP2Searcher
@@ -27,7 +27,7 @@ def create_searchers(
     topk_each: int = 300,
     topk_final: int = 100,
     topk_prev: int = 500,
-    img_search_model: str = "h14_quickgelu"
+    img_search_model: Union[str, List[str]] = "h14_quickgelu"
 ) -> MixedSearchManager:
     # Use cloud settings by default
     if db_url is None:
@@ -64,20 +64,16 @@ def create_searchers(
         topk_prev=topk_prev
     )
     
-    if img_search_model == "siglip2":
-        image_search = ImageSearch(
-            siglip2_searcher=siglip2,
-            db_url=db_url,
-            db_token=db_token,
-            topk_each=topk_final
-        )
-    else:
-        image_search = ImageSearch(
-            clip_searcher=clip_searcher,
-            db_url=db_url,
-            db_token=db_token,
-            topk_each=topk_final
-        )
+    # Both backbones are available to image search so several models can be fused per query;
+    # img_search_model (a model or a list of models) is the default selection
+    image_search = ImageSearch(
+        clip_searcher=clip_searcher,
+        siglip2_searcher=siglip2,
+        db_url=db_url,
+        db_token=db_token,
+        topk_each=topk_final,
+        default_model=img_search_model
+    )
     
     return MixedSearchManager(
         mode_scene_searcher=mode_scene_searcher,
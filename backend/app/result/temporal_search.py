@@ -1,6 +1,6 @@
 import json
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 
 from app.config.setup import manager as default_manager
 from app.utils.create_id_group import create_id_group
@@ -26,10 +26,21 @@ class TemporalSearch:
         # Optional overrides forwarded to manager for each call
         topk_each: Optional[int] = None,
         topk_final: Optional[int] = None,
-        topk_prev: Optional[int] = None
+        topk_prev: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        cascade: Optional[List[str]] = None,
+        coarse: Optional[str] = None,
+        ocr_fuzzy: Optional[bool] = None,
+        asr_keyframes: Optional[bool] = None,
+        rerank: Optional[bool] = None,
+        object_filter: Optional[Union[str, List[Dict]]] = None,
+        plan: Optional[str] = None
     ):
-        if asr_text is not None:
-            return self.search_mode_a(queries=queries, asr_text=asr_text)
+        # asr_keyframes: ASR (a string, or one per temporal step) is mapped onto keyframes and fused
+        # with the visual methods of each step instead of returning scene results
+        if asr_text is not None and not asr_keyframes:
+            return self.search_mode_a(queries=queries, asr_text=asr_text, partitions=partitions, deadline=deadline)
         return self.search_mode_b(
             queries=queries,
             ocr_text=ocr_text,
@@ -42,7 +53,16 @@ class TemporalSearch:
             use_trans=use_trans,
             topk_each=topk_each,
             topk_final=topk_final,
-            topk_prev=topk_prev
+            topk_prev=topk_prev,
+            partitions=partitions,
+            deadline=deadline,
+            cascade=cascade,
+            coarse=coarse,
+            ocr_fuzzy=ocr_fuzzy,
+            asr_text=asr_text if asr_keyframes else None,
+            rerank=rerank,
+            object_filter=object_filter,
+            plan=plan
         )
 
     def search_mode_a(
@@ -51,7 +71,9 @@ class TemporalSearch:
         asr_text: Optional[str] = None,
         topk_each: Optional[int] = None,
         topk_final: Optional[int] = None,
-        topk_prev: Optional[int] = None
+        topk_prev: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None
     ):
         print("Mode A - Normal search")
         q = None
@@ -62,7 +84,9 @@ class TemporalSearch:
             asr_text=asr_text,
             topk_each=topk_each,
             topk_final=topk_final,
-            topk_prev=topk_prev
+            topk_prev=topk_prev,
+            partitions=partitions,
+            deadline=deadline
         )
         # print(json.dumps(results, indent=2, ensure_ascii=False))
         return results
@@ -80,7 +104,16 @@ class TemporalSearch:
         use_trans: bool = True,
         topk_each: Optional[int] = None,
         topk_final: Optional[int] = None,
-        topk_prev: Optional[int] = None
+        topk_prev: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        cascade: Optional[List[str]] = None,
+        coarse: Optional[str] = None,
+        ocr_fuzzy: Optional[bool] = None,
+        asr_text: Optional[Union[str, List[str]]] = None,
+        rerank: Optional[bool] = None,
+        object_filter: Optional[Union[str, List[Dict]]] = None,
+        plan: Optional[str] = None
     ):
         single_ocr = isinstance(ocr_text, list) and len([x for x in ocr_text if x is not None]) == 1
         no_query = (not queries) or (isinstance(queries, list) and not any(queries))
@@ -98,7 +131,11 @@ class TemporalSearch:
                 use_image_cap=False,
                 topk_each=topk_each,
                 topk_final=topk_final,
-                topk_prev=topk_prev
+                topk_prev=topk_prev,
+                partitions=partitions,
+                deadline=deadline,
+                ocr_fuzzy=ocr_fuzzy,
+                plan=plan
             )
             # print(json.dumps(results, indent=2, ensure_ascii=False))
             return results
@@ -115,6 +152,7 @@ class TemporalSearch:
             current_siglip2 = use_siglip2[idx] if isinstance(use_siglip2, list) else bool(use_siglip2)
             current_imgcap = use_image_cap[idx] if isinstance(use_image_cap, list) else bool(use_image_cap)
             current_gg = use_gg[idx] if isinstance(use_gg, list) else bool(use_gg)
+            current_asr = asr_text[idx] if isinstance(asr_text, list) else asr_text
 
             results = self.manager.mixed_search(
                 query=non_none_queries[0],
@@ -128,13 +166,26 @@ class TemporalSearch:
                 use_trans=use_trans,
                 topk_each=topk_each,
                 topk_final=topk_final,
-                topk_prev=topk_prev
+                topk_prev=topk_prev,
+                partitions=partitions,
+                deadline=deadline,
+                cascade=cascade,
+                coarse=coarse,
+                ocr_fuzzy=ocr_fuzzy,
+                asr_text=current_asr,
+                asr_keyframes=bool(current_asr),
+                rerank=rerank,
+                object_filter=object_filter,
+                plan=plan
             )
             # print(json.dumps(results, indent=2, ensure_ascii=False))
             return results
 
         # Temporal B
         print("Mode B - Temporal search")
+        # Every OCR text of the temporal query in one _msearch; each mixed_search below reads its share
+        if isinstance(ocr_text, list) and hasattr(self.manager, "prefetch_text"):
+            self.manager.prefetch_text(ocr_texts=[t for t in ocr_text if t], topk_each=topk_each, partitions=partitions)
         if isinstance(ocr_text, list) and ((not queries) or not any(queries)):
             print("Mode B - Temporal OCR-only search")
             formatted_results: Dict[str, Dict[str, List[Dict]]] = {}
@@ -154,7 +205,10 @@ class TemporalSearch:
                     use_image_cap=False,
                     topk_each=topk_each,
                     topk_final=topk_final,
-                    topk_prev=topk_prev
+                    topk_prev=topk_prev,
+                    partitions=partitions,
+                    deadline=deadline,
+                    ocr_fuzzy=ocr_fuzzy
                 )
                 per_query_results = result.get("per_query", {})
                 query_pairs = []
@@ -190,6 +244,7 @@ class TemporalSearch:
             current_imgcap = use_image_cap[idx] if isinstance(use_image_cap, list) else bool(use_image_cap)
             current_gg = use_gg[idx] if isinstance(use_gg, list) else bool(use_gg)
             current_ocr = ocr_text[idx] if isinstance(ocr_text, list) else ocr_text
+            current_asr = asr_text[idx] if isinstance(asr_text, list) else asr_text
             result = self.manager.mixed_search(
                 query=q_text,
                 ocr_text=current_ocr,
@@ -202,7 +257,17 @@ class TemporalSearch:
                 use_trans=use_trans,
                 topk_each=topk_each,
                 topk_final=topk_final,
-                topk_prev=topk_prev
+                topk_prev=topk_prev,
+                partitions=partitions,
+                deadline=deadline,
+                cascade=cascade,
+                coarse=coarse,
+                ocr_fuzzy=ocr_fuzzy,
+                asr_text=current_asr,
+                asr_keyframes=bool(current_asr),
+                rerank=rerank,
+                object_filter=object_filter,
+                plan=plan
             )
             per_query_results = result.get("per_query", {})
             query_pairs = []
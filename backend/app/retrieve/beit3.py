@@ -19,6 +19,10 @@ from transformers import XLMRobertaTokenizer
 from huggingface_hub import hf_hub_download
 
 from pymilvus import MilvusClient
+from app.vector_database.partitions import normalize_partitions
+from app.vector_database.search_params import search_param_controller
+from app.vector_database.precision import query_data
+from app.vector_database.dedup import expand_hits
 
 
 class BEiT3Searcher:
@@ -144,17 +148,33 @@ class BEiT3Searcher:
         topk: int = 100,
         collection_name: str = "beit3",
         milvus_token: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
     ) -> List[dict]:
-        client = self._get_milvus(self.milvus_uri, milvus_token)
-
         vec = self.encode_text([query])[0]  # (1024,)
-        res = client.search(
-            collection_name=collection_name,
-            data=[vec.astype(np.float32).tolist()],
-            anns_field="vector",
-            limit=int(topk),
-            search_params={"metric_type": "COSINE"},
-        )
+        return self.vector_search(vec, topk, collection_name, milvus_token=milvus_token, partitions=partitions, deadline=deadline)
+
+    def vector_search(
+        self,
+        vec: np.ndarray,
+        topk: int = 100,
+        collection_name: str = "beit3",
+        milvus_token: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> List[dict]:
+        """ANN search with an already computed query vector."""
+        client = self._get_milvus(self.milvus_uri, milvus_token)
+        choice = search_param_controller.choose(collection_name, topk, deadline=deadline)
+        with search_param_controller.track(choice):
+            res = client.search(
+                collection_name=collection_name,
+                data=query_data(client, collection_name, vec),
+                anns_field="vector",
+                limit=int(topk),
+                search_params=choice.to_search_params("COSINE"),
+                partition_names=normalize_partitions(partitions),
+            )
         hits = res[0] if isinstance(res, list) else res
         out: List[dict] = []
         for h in hits:
@@ -162,7 +182,7 @@ class BEiT3Searcher:
                 "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
                 "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
             })
-        return out
+        return expand_hits(collection_name, out, topk)
 
     @staticmethod
     def _get_large_config(img_size=384, patch_size=16, drop_path_rate=0.0, mlp_ratio=4, vocab_size=64010):
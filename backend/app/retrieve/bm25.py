@@ -0,0 +1,232 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# In-process BM25 over the sparse text files (same interface as ElasticSearcher, TEXT_BACKEND=local).
+# Tokenized like the ES standard analyzer; CSR inverted index of per-term BM25 impacts, cached as
+# data/index/sparse/bm25/<index>.npz and rebuilt when the source file is newer.
+SPARSE_DIR = os.path.abspath(os.getenv("SPARSE_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "sparse")))
+SOURCE_SUFFIXES = (".json", ".jsonl", ".ndjson")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# (index, query, size) of one text search
+TextRequest = Tuple[str, str, int]
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _iter_records(path: str) -> Iterator[Tuple[str, object]]:
+    """(id, value) from a .json dict or one document per .jsonl / .ndjson line (as the ES loader)."""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        yield from data.items()
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            yield obj.get("_id") or obj.get("id") or str(i), obj
+
+
+@dataclass
+class BM25Index:
+    ids: np.ndarray       # (n_docs,) int64 keyframe ids
+    terms: np.ndarray     # (n_terms,) str, sorted
+    indptr: np.ndarray    # (n_terms + 1,) int64, postings of term t are [indptr[t], indptr[t + 1])
+    docs: np.ndarray      # (nnz,) int32 doc positions
+    impacts: np.ndarray   # (nnz,) float32 BM25 contribution of the term to the doc
+
+    def __post_init__(self):
+        self._term_ids = {t: i for i, t in enumerate(self.terms.tolist())}
+
+    @classmethod
+    def build(cls, records: Iterator[Tuple[str, object]], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        ids: List[int] = []
+        term_ids: Dict[str, int] = {}
+        post_term: List[int] = []
+        post_doc: List[int] = []
+        post_tf: List[int] = []
+        lengths: List[int] = []
+        for key, value in records:
+            try:
+                doc_id = int(key)
+            except (TypeError, ValueError):
+                continue
+            text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+            tokens = tokenize(text)
+            counts: Dict[int, int] = {}
+            for tok in tokens:
+                tid = term_ids.setdefault(tok, len(term_ids))
+                counts[tid] = counts.get(tid, 0) + 1
+            pos = len(ids)
+            ids.append(doc_id)
+            lengths.append(len(tokens))
+            post_term.extend(counts.keys())
+            post_doc.extend([pos] * len(counts))
+            post_tf.extend(counts.values())
+
+        n_docs, n_terms = len(ids), len(term_ids)
+        term = np.asarray(post_term, dtype=np.int64)
+        doc = np.asarray(post_doc, dtype=np.int32)
+        tf = np.asarray(post_tf, dtype=np.float32)
+        dl = np.asarray(lengths, dtype=np.float32)
+        # Sort postings by term, renumbering terms alphabetically so the vocabulary can be stored sorted
+        vocab = np.asarray(list(term_ids.keys()), dtype=str)
+        alpha = np.argsort(vocab, kind="stable")
+        rank = np.empty(n_terms, dtype=np.int64)
+        rank[alpha] = np.arange(n_terms)
+        term = rank[term]
+        order = np.argsort(term, kind="stable")
+        term, doc, tf = term[order], doc[order], tf[order]
+        df = np.bincount(term, minlength=n_terms).astype(np.float32)
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=indptr[1:])
+
+        # Lucene BM25: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(dl.mean()) if n_docs else 1.0
+        norm = k1 * (1.0 - b + b * dl[doc] / max(avgdl, 1e-9))
+        impacts = (idf[term] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        return cls(np.asarray(ids, dtype=np.int64), vocab[alpha], indptr, doc, impacts)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, ids=self.ids, terms=self.terms, indptr=self.indptr, docs=self.docs, impacts=self.impacts)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        data = np.load(path, allow_pickle=False)
+        return cls(data["ids"], data["terms"], data["indptr"], data["docs"], data["impacts"])
+
+    def search(self, query: str, size: int) -> List[Dict]:
+        """Top `size` docs by BM25 (OR of the query terms), scores min-max normalized like ElasticSearcher."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = False
+        for tok in tokenize(query):
+            tid = self._term_ids.get(tok)
+            if tid is None:
+                continue
+            lo, hi = self.indptr[tid], self.indptr[tid + 1]
+            # A term occurs once per doc row, so plain fancy-index accumulation is exact
+            scores[self.docs[lo:hi]] += self.impacts[lo:hi]
+            matched = True
+        if not matched or size <= 0:
+            return []
+        hit = np.flatnonzero(scores > 0)
+        if hit.size > size:
+            hit = hit[np.argpartition(-scores[hit], size - 1)[:size]]
+        hit = hit[np.argsort(-scores[hit], kind="stable")]
+        top = scores[hit]
+        mn, mx = float(top.min()), float(top.max())
+        norm = (top - mn) / (mx - mn) if mx - mn != 0 else np.ones_like(top)
+        return [{"id": int(self.ids[i]), "score": float(s)} for i, s in zip(hit, norm)]
+
+
+class LocalTextSearcher:
+    """ElasticSearcher drop-in backed by in-memory BM25 indexes, loaded per index on first use."""
+
+    def __init__(self, sparse_dir: str = SPARSE_DIR, cache_dir: Optional[str] = None):
+        self.sparse_dir = sparse_dir
+        self.cache_dir = cache_dir or os.path.join(sparse_dir, "bm25")
+        self._indexes: Dict[str, Optional[BM25Index]] = {}
+        self._lock = threading.Lock()
+
+    def _source_path(self, index_name: str) -> Optional[str]:
+        for suffix in SOURCE_SUFFIXES:
+            path = os.path.join(self.sparse_dir, f"{index_name}{suffix}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def load_index(self, index_name: str, rebuild: bool = False) -> Optional[BM25Index]:
+        with self._lock:
+            if index_name in self._indexes and not rebuild:
+                return self._indexes[index_name]
+            index = None
+            source = self._source_path(index_name)
+            cache = os.path.join(self.cache_dir, f"{index_name}.npz")
+            try:
+                start = time.perf_counter()
+                if not rebuild and os.path.exists(cache) and (source is None or os.path.getmtime(cache) >= os.path.getmtime(source)):
+                    index = BM25Index.load(cache)
+                elif source is not None:
+                    index = BM25Index.build(_iter_records(source))
+                    index.save(cache)
+                if index is not None:
+                    print(f"[BM25] {index_name}: {len(index.ids)} docs, {len(index.terms)} terms "
+                          f"in {time.perf_counter() - start:.1f}s")
+                else:
+                    print(f"[BM25] No data for index '{index_name}' in {self.sparse_dir}")
+            except Exception as e:
+                print(f"[BM25] Failed to load index '{index_name}': {e}")
+            self._indexes[index_name] = index
+            return index
+
+    def search_text(self, index_name, query_string, size=10):
+        index = self.load_index(index_name)
+        if index is None or not query_string:
+            return []
+        return index.search(query_string, int(size))
+
+    def msearch_text(self, requests: List[TextRequest]) -> List[List[Dict]]:
+        return [self.search_text(index, query, size) for index, query, size in requests]
+
+    def prefetch(self, requests: List[TextRequest]) -> None:
+        """Nothing to batch in-process; just make sure the indexes are loaded."""
+        for index_name in {r[0] for r in requests}:
+            self.load_index(index_name)
+
+    # Async mirrors of ElasticSearcher's: scoring is in-process, so only a first index load runs off the loop
+    async def asearch_text(self, index_name, query_string, size=10):
+        return self.search_text(index_name, query_string, size)
+
+    async def amsearch_text(self, requests: List[TextRequest]) -> List[List[Dict]]:
+        return self.msearch_text(requests)
+
+    async def aprefetch(self, requests: List[TextRequest]) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.prefetch, list(requests))
+
+    async def aclose(self):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build (or query) the in-process BM25 text indexes")
+    parser.add_argument("indexes", nargs="*", help="Index names (default: every file in data/index/sparse)")
+    parser.add_argument("--query", help="Run one query against the given indexes after loading")
+    parser.add_argument("--size", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    searcher = LocalTextSearcher()
+    names = args.indexes or sorted(
+        os.path.splitext(f)[0] for f in os.listdir(SPARSE_DIR) if f.endswith(SOURCE_SUFFIXES) and not f.lower().startswith("object")
+    )
+    for name in names:
+        searcher.load_index(name, rebuild=args.query is None)
+        if args.query:
+            for hit in searcher.search_text(name, args.query, args.size):
+                print(hit)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,12 @@ except Exception:
 from PIL import Image
 from pymilvus import MilvusClient
 import numpy as np
-from typing import Optional
+from typing import Dict, List, Optional
+from app.vector_database.partitions import normalize_partitions
+from app.vector_database.search_params import search_param_controller
+from app.vector_database.precision import query_data
+from app.vector_database.vector_fetch import fetch_vectors
+from app.vector_database.dedup import expand_hits
 
 class CLIPSearcher:
     def __init__(self, milvus_uri: Optional[str] = None, milvus_token: Optional[str] = None, url: Optional[str] = None):
@@ -51,13 +56,16 @@ class CLIPSearcher:
         return x[0]
 
     def _encode_image(self, model_info, image: Image.Image) -> np.ndarray:
-        image = image.convert("RGB")
-        tensor = model_info["preprocess"](image).unsqueeze(0).to(model_info["device"])
+        return self._encode_images(model_info, [image])[0]
+
+    def _encode_images(self, model_info, images: List[Image.Image]) -> np.ndarray:
+        """Encode several images in one batched forward pass -> (N, D), L2-normalized."""
+        tensor = torch.stack([model_info["preprocess"](image.convert("RGB")) for image in images]).to(model_info["device"])
         with torch.no_grad():
             feats = model_info["model"].encode_image(tensor)
         x = feats.cpu().numpy().astype(np.float32)
         x = x / np.linalg.norm(x, axis=1, keepdims=True)
-        return x[0]
+        return x
 
     def _get_milvus(self, milvus_uri: Optional[str] = None, milvus_token: Optional[str] = None) -> MilvusClient:
         uri = milvus_uri or self.milvus_uri or "http://localhost:19530"
@@ -66,18 +74,21 @@ class CLIPSearcher:
             return MilvusClient(uri=uri, token=token)
         return MilvusClient(uri=uri)
 
-    def text_search(self, model_name: str, topk: int, query: str, collection_name: str, milvus_token: Optional[str] = None):
+    def text_search(self, model_name: str, topk: int, query: str, collection_name: str, milvus_token: Optional[str] = None, partitions: Optional[List[str]] = None, deadline: Optional[float] = None):
         if model_name not in self.models:
             raise ValueError(f"Model '{model_name}' not loaded")
         vec = self._encode_text(self.models[model_name], query)
         client = self._get_milvus(self.milvus_uri, milvus_token)
-        res = client.search(
-            collection_name=collection_name,
-            data=[vec.astype(np.float32).tolist()],
-            anns_field="vector",
-            limit=int(topk),
-            search_params={"metric_type": "COSINE"},
-        )
+        choice = search_param_controller.choose(collection_name, topk, deadline=deadline)
+        with search_param_controller.track(choice):
+            res = client.search(
+                collection_name=collection_name,
+                data=query_data(client, collection_name, vec),
+                anns_field="vector",
+                limit=int(topk),
+                search_params=choice.to_search_params("COSINE"),
+                partition_names=normalize_partitions(partitions),
+            )
         hits = res[0] if isinstance(res, list) else res
         out = []
         for h in hits:
@@ -85,28 +96,51 @@ class CLIPSearcher:
                 "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
                 "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
             })
-        return out
+        return expand_hits(collection_name, out, topk)
 
-    def img_search(self, model_name: str, topk: int, image: Image.Image, collection_name: str, milvus_token: Optional[str] = None):
-        if model_name not in self.models:
-            raise ValueError(f"Model '{model_name}' not loaded")
-        vec = self._encode_image(self.models[model_name], image)
+    def img_search(self, model_name: str, topk: int, image: Optional[Image.Image], collection_name: str, milvus_token: Optional[str] = None, partitions: Optional[List[str]] = None, deadline: Optional[float] = None, image_id: Optional[int] = None):
         client = self._get_milvus(self.milvus_uri, milvus_token)
-        res = client.search(
-            collection_name=collection_name,
-            data=[vec.astype(np.float32).tolist()],
-            anns_field="vector",
-            limit=int(topk),
-            search_params={"metric_type": "COSINE"},
-        )
-        hits = res[0] if isinstance(res, list) else res
-        out = []
-        for h in hits:
-            out.append({
-                "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
-                "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
-            })
-        return out
+        vec = None
+        if image_id is not None:
+            # Indexed keyframe: reuse its stored vector, no model or image file needed
+            vec = fetch_vectors(collection_name, [int(image_id)], client=client).get(int(image_id))
+        if vec is None:
+            if image is None:
+                raise ValueError(f"No stored vector for id {image_id} and no image to encode")
+            if model_name not in self.models:
+                raise ValueError(f"Model '{model_name}' not loaded")
+            vec = self._encode_image(self.models[model_name], image)
+        return self.vector_search(vec, topk, collection_name, milvus_token=milvus_token, partitions=partitions, deadline=deadline, client=client)
+
+    def vector_search(self, vec: np.ndarray, topk: int, collection_name: str, milvus_token: Optional[str] = None, partitions: Optional[List[str]] = None, deadline: Optional[float] = None, client: Optional[MilvusClient] = None):
+        """ANN search with an already computed (or stored) query vector."""
+        return self.vector_search_many([vec], topk, collection_name, milvus_token=milvus_token, partitions=partitions, deadline=deadline, client=client)[0]
+
+    def vector_search_many(self, vecs: List[np.ndarray], topk: int, collection_name: str, milvus_token: Optional[str] = None, partitions: Optional[List[str]] = None, deadline: Optional[float] = None, client: Optional[MilvusClient] = None) -> List[List[Dict]]:
+        """One multi-vector ANN request; returns one hit list per query vector."""
+        if not vecs:
+            return []
+        client = client or self._get_milvus(self.milvus_uri, milvus_token)
+        choice = search_param_controller.choose(collection_name, topk, deadline=deadline)
+        with search_param_controller.track(choice):
+            res = client.search(
+                collection_name=collection_name,
+                data=query_data(client, collection_name, np.stack(vecs)),
+                anns_field="vector",
+                limit=int(topk),
+                search_params=choice.to_search_params("COSINE"),
+                partition_names=normalize_partitions(partitions),
+            )
+        outs = []
+        for hits in res:
+            out = []
+            for h in hits:
+                out.append({
+                    "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
+                    "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
+                })
+            outs.append(expand_hits(collection_name, out, topk))
+        return outs
 
 if __name__ == "__main__":
     from PIL import Image
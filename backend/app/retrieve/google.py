@@ -352,6 +352,7 @@ class GoogleSearcher:
         timeout: int = 15,       # chỉ dùng cho CSE; icrawler legacy sẽ bỏ qua
         safe: str = "off",
         debug: bool = False,
+        partitions: Optional[List[str]] = None,
     ) -> List[Dict]:
         """
         Chạy một query (bật debug=True để chẩn đoán gốc lỗi).
@@ -397,6 +398,7 @@ class GoogleSearcher:
             try:
                 res = self.clip_searcher.img_search(
                     model_name=model_name, topk=topk, image=img, collection_name=collection_name,
+                    partitions=partitions,
                 )
                 if res:
                     all_results.extend(res)
@@ -427,6 +429,7 @@ class GoogleSearcher:
         timeout: int = 15,
         safe: str = "off",
         debug: bool = False,
+        partitions: Optional[List[str]] = None,
     ) -> List[Dict]:
         """
         Chạy nhiều query và gộp CombSUM toàn bộ (debug=True để theo dõi từng query).
@@ -447,6 +450,7 @@ class GoogleSearcher:
                 timeout=timeout,
                 safe=safe,
                 debug=debug,
+                partitions=partitions,
             )
             if res:
                 all_results.extend(res)
@@ -1,24 +1,68 @@
+import time
+import threading
 from elasticsearch import Elasticsearch
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+
+try:
+    from elasticsearch import AsyncElasticsearch  # needs aiohttp (elasticsearch[async])
+except ImportError:
+    AsyncElasticsearch = None
+
+try:
+    from app.config.settings import ES_CONNECTIONS_PER_NODE, ES_REQUEST_CACHE
+except ImportError:
+    ES_CONNECTIONS_PER_NODE, ES_REQUEST_CACHE = 16, True
+
+# (index, query, size) of one text search
+TextRequest = Tuple[str, str, int]
+
+# Only ids and scores come back: no _source (the whole OCR / ASR text), no totals, no metadata
+HIT_FILTER = ["hits.hits._id", "hits.hits._score"]
+MSEARCH_FILTER = ["responses.status", "responses.error", "responses.hits.hits._id", "responses.hits.hits._score"]
 
 class ElasticSearcher:
-    def __init__(self, host="http://localhost:9200", timeout=120):
-        self.es = Elasticsearch(host)
+    def __init__(self, host="http://localhost:9200", timeout=120, prefetch_ttl: float = 60.0,
+                 connections_per_node: int = ES_CONNECTIONS_PER_NODE, request_cache: bool = ES_REQUEST_CACHE):
+        self.host = host
+        self.timeout = timeout
+        self.connections_per_node = connections_per_node
+        self.request_cache = request_cache
+        self.es = Elasticsearch(host, request_timeout=timeout, connections_per_node=connections_per_node, retry_on_timeout=True)
+        self._aes = None
+        # Results fetched ahead by prefetch(), each handed out once to the request that asked for it
+        self.prefetch_ttl = prefetch_ttl
+        self._prefetched: Dict[TextRequest, Tuple[float, List[Dict]]] = {}
+        self._lock = threading.Lock()
 
-    def search_text(self, index_name, query_string, size=10):
-        query = {
+    @staticmethod
+    def _query_body(query_string, size):
+        return {
             "query": {
                 "match": {
                     "text": query_string
                 }
-            }
+            },
+            "size": size,
+            "_source": False,
+            "track_total_hits": False
         }
 
-        response = self.es.search(
-            index=index_name,
-            body={**query, "size": size}
-        )
-        hits = response["hits"]["hits"]
+    @property
+    def aes(self):
+        """Pooled AsyncElasticsearch client, created on first use inside the running event loop."""
+        if self._aes is None:
+            if AsyncElasticsearch is None:
+                raise ImportError("AsyncElasticsearch requires 'elasticsearch[async]' (aiohttp)")
+            self._aes = AsyncElasticsearch(self.host, request_timeout=self.timeout, connections_per_node=self.connections_per_node, retry_on_timeout=True)
+        return self._aes
+
+    async def aclose(self):
+        if self._aes is not None:
+            await self._aes.close()
+            self._aes = None
+
+    @staticmethod
+    def _normalize_hits(hits):
         if not hits:
             return []
         scores = [hit["_score"] for hit in hits]
@@ -36,6 +80,103 @@ class ElasticSearcher:
             for hit, norm_score in zip(hits, norm_scores)
         ]
 
+    def _take_prefetched(self, key: TextRequest) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._prefetched.pop(key, None)
+        if entry is None or time.monotonic() - entry[0] > self.prefetch_ttl:
+            return None
+        return entry[1]
+
+    def search_text(self, index_name, query_string, size=10):
+        cached = self._take_prefetched((index_name, query_string, int(size)))
+        if cached is not None:
+            return cached
+        response = self.es.search(
+            index=index_name,
+            body=self._query_body(query_string, size),
+            filter_path=HIT_FILTER,
+            request_cache=self.request_cache
+        )
+        return self._normalize_hits(response.get("hits", {}).get("hits", []))
+
+    async def asearch_text(self, index_name, query_string, size=10):
+        """search_text on the async client: awaits Elasticsearch without holding a worker thread."""
+        cached = self._take_prefetched((index_name, query_string, int(size)))
+        if cached is not None:
+            return cached
+        response = await self.aes.search(
+            index=index_name,
+            body=self._query_body(query_string, size),
+            filter_path=HIT_FILTER,
+            request_cache=self.request_cache
+        )
+        return self._normalize_hits(response.get("hits", {}).get("hits", []))
+
+    def msearch_text(self, requests: List[TextRequest]) -> List[List[Dict]]:
+        """
+        Several (index, query, size) text searches in one _msearch round trip.
+        Returns one normalized result list per request, in order; a failed sub-search yields [].
+        """
+        requests = [(index, query, int(size)) for index, query, size in requests]
+        results: List[Optional[List[Dict]]] = [self._take_prefetched(key) for key in requests]
+        pending = [i for i, r in enumerate(results) if r is None]
+        if not pending:
+            return results
+
+        response = self.es.msearch(body=self._msearch_body(requests, pending), filter_path=MSEARCH_FILTER)
+        return self._fill_msearch(results, requests, pending, response)
+
+    async def amsearch_text(self, requests: List[TextRequest]) -> List[List[Dict]]:
+        """msearch_text on the async client."""
+        requests = [(index, query, int(size)) for index, query, size in requests]
+        results: List[Optional[List[Dict]]] = [self._take_prefetched(key) for key in requests]
+        pending = [i for i, r in enumerate(results) if r is None]
+        if not pending:
+            return results
+        response = await self.aes.msearch(body=self._msearch_body(requests, pending), filter_path=MSEARCH_FILTER)
+        return self._fill_msearch(results, requests, pending, response)
+
+    def _msearch_body(self, requests: List[TextRequest], pending: List[int]) -> List[Dict]:
+        searches = []
+        for i in pending:
+            index, query, size = requests[i]
+            searches.append({"index": index, "request_cache": self.request_cache})
+            searches.append(self._query_body(query, size))
+        return searches
+
+    def _fill_msearch(self, results, requests, pending, response):
+        for i, sub in zip(pending, response.get("responses", [])):
+            if "error" in sub:
+                print(f"[WARN] msearch on '{requests[i][0]}' failed: {sub['error']}")
+                results[i] = []
+            else:
+                results[i] = self._normalize_hits(sub.get("hits", {}).get("hits", []))
+        return [r if r is not None else [] for r in results]
+
+    @staticmethod
+    def _prefetch_keys(requests: List[TextRequest]) -> List[TextRequest]:
+        return list(dict.fromkeys((index, query, int(size)) for index, query, size in requests if query))
+
+    def prefetch(self, requests: List[TextRequest]) -> None:
+        """Run the searches in one _msearch; later search_text / msearch_text calls for them are served locally."""
+        requests = self._prefetch_keys(requests)
+        if requests:
+            self._store_prefetched(requests, self.msearch_text(requests))
+
+    async def aprefetch(self, requests: List[TextRequest]) -> None:
+        """prefetch on the async client: an async handler awaits the text searches, its worker thread reads them."""
+        requests = self._prefetch_keys(requests)
+        if requests:
+            self._store_prefetched(requests, await self.amsearch_text(requests))
+
+    def _store_prefetched(self, requests: List[TextRequest], results: List[List[Dict]]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, (t, _) in self._prefetched.items() if now - t > self.prefetch_ttl]:
+                del self._prefetched[key]
+            for key, result in zip(requests, results):
+                self._prefetched[key] = (now, result)
+
 if __name__ == "__main__":
     searcher = ElasticSearcher()
     text_results = searcher.search_text(
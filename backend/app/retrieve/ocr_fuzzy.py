@@ -0,0 +1,235 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Character trigram index for fuzzy substring search over normalized OCR text
+# (lowercased, no diacritics, letters and digits only). Candidates share enough of the query's
+# trigrams (q-gram lemma) and are verified with a Sellers DP; score = 1 - edits / len(query).
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.retrieve.bm25 import SPARSE_DIR, SOURCE_SUFFIXES, _iter_records
+
+NGRAM_DIR = os.path.join(SPARSE_DIR, "ngram")
+N = 3
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip diacritics, keep only letters and digits."""
+    text = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    return "".join(c for c in text if c.isalnum() and not unicodedata.combining(c))
+
+
+def _codes(text: str) -> np.ndarray:
+    return np.fromiter((min(ord(c), 0xFFFF) for c in text), dtype=np.uint16, count=len(text))
+
+
+def _gram_keys(codes: np.ndarray) -> np.ndarray:
+    if len(codes) < N:
+        return np.empty(0, dtype=np.uint64)
+    c = codes.astype(np.uint64)
+    return (c[:-2] << np.uint64(32)) | (c[1:-1] << np.uint64(16)) | c[2:]
+
+
+def default_max_edits(length: int) -> int:
+    """Fuzziness like Elasticsearch AUTO, a bit looser for long strings."""
+    if length <= 4:
+        return 0
+    if length <= 8:
+        return 1
+    return 2 + (length - 9) // 8
+
+
+@dataclass
+class TrigramIndex:
+    ids: np.ndarray
+    grams: np.ndarray
+    indptr: np.ndarray
+    postings: np.ndarray
+    chars: np.ndarray
+    offsets: np.ndarray
+
+    @classmethod
+    def build(cls, records: Iterator[Tuple[str, object]]) -> "TrigramIndex":
+        ids: List[int] = []
+        texts: List[np.ndarray] = []
+        pair_grams: List[np.ndarray] = []
+        pair_docs: List[np.ndarray] = []
+        for key, value in records:
+            try:
+                doc_id = int(key)
+            except (TypeError, ValueError):
+                continue
+            raw = value if isinstance(value, str) else " ".join(str(v) for v in (value.values() if isinstance(value, dict) else value))
+            codes = _codes(normalize(raw))
+            pos = len(ids)
+            ids.append(doc_id)
+            texts.append(codes)
+            grams = np.unique(_gram_keys(codes))
+            pair_grams.append(grams)
+            pair_docs.append(np.full(len(grams), pos, dtype=np.int32))
+
+        all_grams = np.concatenate(pair_grams) if pair_grams else np.empty(0, dtype=np.uint64)
+        all_docs = np.concatenate(pair_docs) if pair_docs else np.empty(0, dtype=np.int32)
+        order = np.lexsort((all_docs, all_grams))
+        all_grams, all_docs = all_grams[order], all_docs[order]
+        grams, starts = np.unique(all_grams, return_index=True)
+        indptr = np.append(starts, len(all_grams)).astype(np.int64)
+        lengths = np.array([len(t) for t in texts], dtype=np.int64)
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        chars = np.concatenate(texts) if texts else np.empty(0, dtype=np.uint16)
+        return cls(np.asarray(ids, dtype=np.int64), grams, indptr, all_docs, chars, offsets)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, ids=self.ids, grams=self.grams, indptr=self.indptr, postings=self.postings, chars=self.chars, offsets=self.offsets)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TrigramIndex":
+        data = np.load(path, allow_pickle=False)
+        return cls(data["ids"], data["grams"], data["indptr"], data["postings"], data["chars"], data["offsets"])
+
+    # ----- Query ----- #
+    def candidates(self, query_codes: np.ndarray, max_edits: int, max_candidates: int) -> np.ndarray:
+        """Doc positions sharing enough query trigrams, most shared first."""
+        qgrams = np.unique(_gram_keys(query_codes))
+        n_grams = len(qgrams)
+        if n_grams == 0:
+            return np.empty(0, dtype=np.int64)
+        at = np.searchsorted(self.grams, qgrams)
+        valid = at < len(self.grams)
+        at, qgrams = at[valid], qgrams[valid]
+        at = at[self.grams[at] == qgrams]
+        if len(at) == 0:
+            return np.empty(0, dtype=np.int64)
+        docs = np.concatenate([self.postings[self.indptr[g]:self.indptr[g + 1]] for g in at])
+        counts = np.bincount(docs, minlength=len(self.ids))
+        # Each edit destroys at most N distinct trigrams (repeated ones count once, e.g. "0000")
+        need = max(1, n_grams - N * max_edits)
+        cand = np.flatnonzero(counts >= need)
+        if len(cand) > max_candidates:
+            cand = cand[np.argpartition(-counts[cand], max_candidates - 1)[:max_candidates]]
+        return cand[np.argsort(-counts[cand], kind="stable")]
+
+    def substring_edits(self, query_codes: np.ndarray, docs: np.ndarray, max_text: int = 4096) -> np.ndarray:
+        """
+        Fewest edits to turn the query into some substring of each doc's text (Sellers DP),
+        computed column by column for all docs at once.
+        """
+        m = len(query_codes)
+        starts, ends = self.offsets[docs], self.offsets[docs + 1]
+        lengths = np.minimum(ends - starts, max_text)
+        width = int(lengths.max()) if len(docs) else 0
+        text = np.zeros((len(docs), width), dtype=np.int32) - 1  # -1 padding never matches
+        for row, (s, n) in enumerate(zip(starts, lengths)):
+            text[row, :n] = self.chars[s:s + n]
+        q = query_codes.astype(np.int32)
+        steps = np.arange(m + 1, dtype=np.int32)
+        col = np.broadcast_to(steps, (len(docs), m + 1)).copy()  # column before the text: i deletions
+        best = col[:, m].copy()
+        for j in range(width):
+            cost = (q[None, :] != text[:, j:j + 1]).astype(np.int32)
+            x = np.empty_like(col)
+            x[:, 0] = 0  # a match may start anywhere in the text
+            x[:, 1:] = np.minimum(col[:, :-1] + cost, col[:, 1:] + 1)
+            # Vertical (query deletion) moves: D[i] = min_k<=i x[k] + (i - k)
+            col = np.minimum.accumulate(x - steps, axis=1) + steps
+            live = j < lengths
+            best = np.where(live, np.minimum(best, col[:, m]), best)
+        return best
+
+    def search(self, query: str, size: int, max_edits: Optional[int] = None, max_candidates: int = 2000) -> List[Dict]:
+        qcodes = _codes(normalize(query))
+        m = len(qcodes)
+        if m < N or size <= 0:
+            return []
+        k = default_max_edits(m) if max_edits is None else int(max_edits)
+        cand = self.candidates(qcodes, k, max_candidates)
+        if len(cand) == 0:
+            return []
+        edits = self.substring_edits(qcodes, cand)
+        keep = edits <= k
+        cand, edits = cand[keep], edits[keep]
+        order = np.argsort(edits, kind="stable")[:size]  # candidates are already ordered by shared grams
+        return [{"id": int(self.ids[cand[i]]), "score": float(1.0 - edits[i] / m)} for i in order]
+
+
+class FuzzyOCRSearcher:
+    """Trigram indexes per sparse index name, loaded on first use."""
+
+    def __init__(self, ngram_dir: str = NGRAM_DIR):
+        self.ngram_dir = ngram_dir
+        self._indexes: Dict[str, Optional[TrigramIndex]] = {}
+        self._lock = threading.Lock()
+
+    def load_index(self, index_name: str = "ocr") -> Optional[TrigramIndex]:
+        with self._lock:
+            if index_name not in self._indexes:
+                path = os.path.join(self.ngram_dir, f"{index_name}.npz")
+                index = None
+                if os.path.exists(path):
+                    try:
+                        index = TrigramIndex.load(path)
+                    except Exception as e:
+                        print(f"[OCR fuzzy] Failed to load {path}: {e}")
+                self._indexes[index_name] = index
+            return self._indexes[index_name]
+
+    def available(self, index_name: str = "ocr") -> bool:
+        return self.load_index(index_name) is not None
+
+    def search_text(self, index_name: str, query_string: str, size: int = 10, max_edits: Optional[int] = None) -> List[Dict]:
+        index = self.load_index(index_name)
+        if index is None or not query_string:
+            return []
+        return index.search(query_string, int(size), max_edits=max_edits)
+
+
+# Global instance for easy access
+ocr_fuzzy = FuzzyOCRSearcher()
+
+
+def build_trigram_index(source_path: str, out_dir: str = NGRAM_DIR) -> str:
+    """Build and save the trigram index of one sparse file; returns the .npz path."""
+    start = time.perf_counter()
+    index = TrigramIndex.build(_iter_records(source_path))
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    path = os.path.join(out_dir, f"{name}.npz")
+    index.save(path)
+    print(f"[OCR fuzzy] {name}: {len(index.ids)} docs, {len(index.grams)} trigrams, "
+          f"{len(index.postings)} postings in {time.perf_counter() - start:.1f}s -> {path}")
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build (or query) the OCR trigram index")
+    parser.add_argument("index", nargs="?", default="ocr", help="Sparse index name, i.e. data/index/sparse/<index>.json")
+    parser.add_argument("--query", help="Query the existing index instead of building it")
+    parser.add_argument("--size", type=int, default=10)
+    parser.add_argument("--max-edits", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.query:
+        for hit in ocr_fuzzy.search_text(args.index, args.query, args.size, max_edits=args.max_edits):
+            print(hit)
+        return
+    source = next((os.path.join(SPARSE_DIR, f"{args.index}{s}") for s in SOURCE_SUFFIXES
+                   if os.path.exists(os.path.join(SPARSE_DIR, f"{args.index}{s}"))), None)
+    if source is None:
+        raise SystemExit(f"No {args.index}.json/.jsonl/.ndjson in {SPARSE_DIR}")
+    build_trigram_index(source)
+
+
+if __name__ == "__main__":
+    main()
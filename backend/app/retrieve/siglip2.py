@@ -4,7 +4,7 @@ import pickle
 import time
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import numpy as np
 from PIL import Image
@@ -14,6 +14,12 @@ from transformers import AutoModel, AutoProcessor
 from pymilvus import MilvusClient
 from tqdm import tqdm
 
+from app.vector_database.partitions import normalize_partitions
+from app.vector_database.search_params import search_param_controller
+from app.vector_database.precision import query_data
+from app.vector_database.vector_fetch import fetch_vectors
+from app.vector_database.dedup import expand_hits
+
 
 def _process_single_entry(key, entry, base_dir: Path, project_root: Path) -> dict:
     result = {}
@@ -252,48 +258,21 @@ class SigLIP2Searcher:
             return None
 
     def vector_from_id(self, collection_name: str, entity_id: int, milvus_uri: Optional[str] = None, milvus_token: Optional[str] = None) -> Optional[np.ndarray]:
-        client = self._get_milvus(milvus_uri, milvus_token)
+        return self.vectors_from_ids(collection_name, [entity_id], milvus_uri, milvus_token).get(int(entity_id))
+
+    def vectors_from_ids(self, collection_name: str, entity_ids: List[int], milvus_uri: Optional[str] = None, milvus_token: Optional[str] = None) -> Dict[int, np.ndarray]:
+        """Vectors for many ids at once: LRU cache, then the memory-mapped dense file, then one Milvus query."""
+        found = fetch_vectors(collection_name, entity_ids)
+        missing = [int(i) for i in entity_ids if int(i) not in found]
+        if not missing:
+            return found  # no Milvus round trip
         try:
-            res = client.query(
-                collection_name=collection_name,
-                filter=f"id in [{int(entity_id)}]",
-                output_fields=["vector"],
-                limit=1,
-            )
+            client = self._get_milvus(milvus_uri, milvus_token)
         except Exception as exc:
-            print(f"[SigLIP2] Failed to fetch vector for id {entity_id}: {exc}")
-            return None
-
-        if not res:
-            return None
-
-        first = res[0]
-        vec = None
-
-        if isinstance(first, dict):
-            vec = first.get("vector")
-            if vec is None:
-                entity = first.get("entity")
-                if isinstance(entity, dict):
-                    vec = entity.get("vector")
-                elif hasattr(entity, "get"):
-                    vec = entity.get("vector")
-        else:
-            if hasattr(first, "get"):
-                vec = first.get("vector")
-            if vec is None and hasattr(first, "entity"):
-                entity = getattr(first, "entity")
-                if isinstance(entity, dict):
-                    vec = entity.get("vector")
-                elif hasattr(entity, "get"):
-                    vec = entity.get("vector")
-                elif hasattr(entity, "vector"):
-                    vec = getattr(entity, "vector")
-
-        if vec is None:
-            return None
-
-        return np.asarray(vec, dtype=np.float32)
+            print(f"[SigLIP2] Failed to fetch vectors for ids {missing[:5]}: {exc}")
+            return found
+        found.update(fetch_vectors(collection_name, missing, client=client))
+        return found
 
     @torch.inference_mode()
     def _encode_text(self, texts: List[str]) -> np.ndarray:
@@ -330,21 +309,24 @@ class SigLIP2Searcher:
         else:
             raise ValueError(f"Unsupported image input type: {type(images)}")
 
-        features = []
+        pil_images = []
         for item in items:
             if isinstance(item, str):
                 with Image.open(item) as im:
-                    pil_img = im.convert("RGB")
+                    pil_images.append(im.convert("RGB"))
             elif isinstance(item, Image.Image):
-                pil_img = item.convert("RGB")
+                pil_images.append(item.convert("RGB"))
             else:
                 raise ValueError(f"Expected PIL Image or path string, got {type(item)}")
 
-            inputs = self.processor(images=[pil_img], return_tensors="pt").to(self.device)
-            feats = self.model.get_image_features(**inputs).float()   # (1, D)
+        # One batched forward pass for all images
+        features = []
+        if pil_images:
+            inputs = self.processor(images=pil_images, return_tensors="pt").to(self.device)
+            feats = self.model.get_image_features(**inputs).float()   # (N, D)
             if l2norm:
                 feats = torch.nn.functional.normalize(feats, dim=-1)
-            features.append(feats[0].cpu().numpy().astype(np.float32))
+            features = list(feats.cpu().numpy().astype(np.float32))
 
         if not features:
             # xác định D bằng pass giả
@@ -387,6 +369,8 @@ class SigLIP2Searcher:
         collection_name: str = "siglip2",
         milvus_uri: Optional[str] = None,
         milvus_token: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
     ):
 
         vec = self._encode_text([query])[0]  # (D,)
@@ -396,13 +380,16 @@ class SigLIP2Searcher:
         # reconnect fresh rồi thử lại 1 lần
             self.reset_milvus()
             client = self._get_milvus(milvus_uri, milvus_token)
-            res = client.search(
-                collection_name=collection_name,
-                data=[vec.tolist()],
-                anns_field="vector",
-                limit=int(topk),
-                search_params={"metric_type": "COSINE"},
-            )
+            choice = search_param_controller.choose(collection_name, topk, deadline=deadline)
+            with search_param_controller.track(choice):
+                res = client.search(
+                    collection_name=collection_name,
+                    data=query_data(client, collection_name, vec),
+                    anns_field="vector",
+                    limit=int(topk),
+                    search_params=choice.to_search_params("COSINE"),
+                    partition_names=normalize_partitions(partitions),
+                )
             hits = res[0] if isinstance(res, list) else res
             out = []
             for h in hits:
@@ -410,15 +397,18 @@ class SigLIP2Searcher:
                     "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
                     "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
                 })
-            return out
+            return expand_hits(collection_name, out, topk)
         
-        res = client.search(
-            collection_name=collection_name,
-            data=[vec.tolist()],
-            anns_field="vector",
-            limit=int(topk),
-            search_params={"metric_type": "COSINE"},
-        )
+        choice = search_param_controller.choose(collection_name, topk, deadline=deadline)
+        with search_param_controller.track(choice):
+            res = client.search(
+                collection_name=collection_name,
+                data=query_data(client, collection_name, vec),
+                anns_field="vector",
+                limit=int(topk),
+                search_params=choice.to_search_params("COSINE"),
+                partition_names=normalize_partitions(partitions),
+            )
         hits = res[0] if isinstance(res, list) else res
         out = []
         for h in hits:
@@ -426,7 +416,7 @@ class SigLIP2Searcher:
                 "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
                 "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
             })
-        return out
+        return expand_hits(collection_name, out, topk)
     
 
     def img_search(
@@ -437,6 +427,9 @@ class SigLIP2Searcher:
         collection_name: str = "siglip2",
         milvus_uri: Optional[str] = None,
         milvus_token: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        image_id: Optional[int] = None,
     ):
         """
         Search using an image.
@@ -447,18 +440,26 @@ class SigLIP2Searcher:
             collection_name: Milvus collection name
             milvus_uri: Milvus URI (optional)
             milvus_token: Milvus token for Zilliz Cloud (optional)
+            partitions: restrict search to these dataset batches, e.g. ["L21"] (optional)
+            deadline: time.monotonic() deadline of the request, used to pick ef (optional)
+            image_id: id of an indexed keyframe; its stored vector is used directly,
+                without touching the path map or the image file (optional)
         """
         # Support both new (image) and legacy (image_path) parameters
-        if image is None and image_path is None:
-            raise ValueError("Either 'image' or 'image_path' must be provided")
+        if image is None and image_path is None and image_id is None:
+            raise ValueError("Either 'image', 'image_path' or 'image_id' must be provided")
 
         vec = None
 
-        path_id = self.find_id_for_path(str(image_path) if image_path is not None else None)
-        # print(f"Path ID: {path_id}")
-
-        if path_id is not None:
-            vec = self.vector_from_id(collection_name=collection_name, entity_id=path_id, milvus_uri=milvus_uri, milvus_token=milvus_token)
+        if image_id is not None:
+            vec = self.vector_from_id(collection_name=collection_name, entity_id=int(image_id), milvus_uri=milvus_uri, milvus_token=milvus_token)
+            if vec is None and image is None and image_path is None:
+                print(f"[SigLIP2] No stored vector for id {image_id}")
+                return []
+        elif image_path is not None:
+            path_id = self.find_id_for_path(str(image_path))
+            if path_id is not None:
+                vec = self.vector_from_id(collection_name=collection_name, entity_id=path_id, milvus_uri=milvus_uri, milvus_token=milvus_token)
 
         if vec is None:
             if image is not None:
@@ -471,25 +472,61 @@ class SigLIP2Searcher:
 
             vec = feats[0]
 
-        # print(f"vec: {vec}")
-
-        client = self._get_milvus(milvus_uri, milvus_token)
-        res = client.search(
-            collection_name=collection_name,
-            data=[vec.tolist()],
-            anns_field="vector",
-            limit=int(topk),
-            search_params={"metric_type": "COSINE"},
+        return self.vector_search(
+            vec, topk=topk, collection_name=collection_name, milvus_uri=milvus_uri,
+            milvus_token=milvus_token, partitions=partitions, deadline=deadline,
         )
-        hits = res[0] if isinstance(res, list) else res
-        out = []
-        for h in hits:
-            out.append({
-                "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
-                "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
-            })
-        return out
 
+    def vector_search(
+        self,
+        vec: np.ndarray,
+        topk: int = 5,
+        collection_name: str = "siglip2",
+        milvus_uri: Optional[str] = None,
+        milvus_token: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ):
+        """ANN search with an already computed (or stored) query vector."""
+        return self.vector_search_many(
+            [vec], topk=topk, collection_name=collection_name, milvus_uri=milvus_uri,
+            milvus_token=milvus_token, partitions=partitions, deadline=deadline,
+        )[0]
+
+    def vector_search_many(
+        self,
+        vecs: List[np.ndarray],
+        topk: int = 5,
+        collection_name: str = "siglip2",
+        milvus_uri: Optional[str] = None,
+        milvus_token: Optional[str] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> List[List[Dict]]:
+        """One multi-vector ANN request; returns one hit list per query vector."""
+        if not vecs:
+            return []
+        client = self._get_milvus(milvus_uri, milvus_token)
+        choice = search_param_controller.choose(collection_name, topk, deadline=deadline)
+        with search_param_controller.track(choice):
+            res = client.search(
+                collection_name=collection_name,
+                data=query_data(client, collection_name, np.stack(vecs)),
+                anns_field="vector",
+                limit=int(topk),
+                search_params=choice.to_search_params("COSINE"),
+                partition_names=normalize_partitions(partitions),
+            )
+        outs = []
+        for hits in res:
+            out = []
+            for h in hits:
+                out.append({
+                    "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
+                    "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
+                })
+            outs.append(expand_hits(collection_name, out, topk))
+        return outs
 
 
 if __name__ == "__main__":
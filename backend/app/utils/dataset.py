@@ -1,5 +1,6 @@
 from typing import List, Dict, Optional, Any
 import json
+import numpy as np
 
 class Dataset:
     """Class to format and standardize output from different search methods"""
@@ -65,6 +66,35 @@ class Dataset:
         
         return merged[:topk]
     
+    @staticmethod
+    def merge_results_columnar(buckets: Dict[str, List[Dict]], weights: Dict[str, float], topk: int) -> List[Dict]:
+        """
+        Same weighted-sum fusion as merge_results, computed on id / score columns with NumPy
+        (no per-item dict updates); used where several full result lists are fused per request.
+        """
+        id_cols, score_cols = [], []
+        for src, items in buckets.items():
+            if not items:
+                continue
+            w = float(weights.get(src, 1.0))
+            ids = np.fromiter((int(it["id"]) for it in items if it.get("id") is not None), dtype=np.int64)
+            scores = np.fromiter((float(it.get("score", 0.0)) for it in items if it.get("id") is not None), dtype=np.float64)
+            id_cols.append(ids)
+            score_cols.append(scores * w)
+        if not id_cols:
+            return []
+
+        ids = np.concatenate(id_cols)
+        scores = np.concatenate(score_cols)
+        uniq, inverse = np.unique(ids, return_inverse=True)
+        fused = np.bincount(inverse, weights=scores, minlength=len(uniq))
+        k = min(int(topk), len(uniq))
+        if k <= 0:
+            return []
+        top = np.argpartition(-fused, k - 1)[:k]
+        top = top[np.argsort(-fused[top], kind="stable")]
+        return [{"id": int(uniq[i]), "score": float(fused[i])} for i in top]
+    
     @staticmethod
     def create_response_structure(
         per_query: Dict[str, Dict],
@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from app.config.settings import EMBEDDING_CACHE_SIZE
+except ImportError:
+    EMBEDDING_CACHE_SIZE = 4096
+
+
+class EmbeddingCache:
+    """
+    LRU of query embeddings keyed by (model, kind, key), e.g. ("siglip2", "text", "a red car").
+
+    Composite queries are refined step by step (add a negative, change a weight); every
+    component already seen comes from here, so a refinement never re-runs an encoder.
+    """
+
+    def __init__(self, capacity: int = EMBEDDING_CACHE_SIZE):
+        self.capacity = max(0, int(capacity))
+        self._entries: "OrderedDict[Tuple[str, str, Hashable], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_name: str, kind: str, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._entries.get((model_name, kind, key))
+            if vec is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((model_name, kind, key))
+            self.hits += 1
+            return vec
+
+    def put(self, model_name: str, kind: str, key: Hashable, vec: np.ndarray) -> None:
+        if not self.capacity:
+            return
+        with self._lock:
+            self._entries[(model_name, kind, key)] = np.asarray(vec, dtype=np.float32).reshape(-1)
+            self._entries.move_to_end((model_name, kind, key))
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def get_many(
+        self,
+        model_name: str,
+        kind: str,
+        keys: List[Hashable],
+        compute: Callable[[List[Hashable]], np.ndarray],
+    ) -> Dict[Hashable, np.ndarray]:
+        """Embeddings for `keys`; the misses are computed with one `compute(missing) -> (N, D)` call."""
+        out: Dict[Hashable, np.ndarray] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            vec = self.get(model_name, kind, key)
+            if vec is None:
+                missing.append(key)
+            else:
+                out[key] = vec
+        if missing:
+            for key, vec in zip(missing, compute(missing)):
+                self.put(model_name, kind, key, vec)
+                out[key] = np.asarray(vec, dtype=np.float32).reshape(-1)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"cached": len(self._entries), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+# Global instance for easy access
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,180 @@
+import os
+import json
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+try:
+    from app.config.settings import (
+        PLANNER_MIN_SAMPLES, PLANNER_MIN_TOPK, PLANNER_SKIP_PERCENT, PLANNER_EXPLORE_EVERY, PLANNER_STATS_PATH,
+    )
+except ImportError:
+    PLANNER_MIN_SAMPLES, PLANNER_MIN_TOPK, PLANNER_SKIP_PERCENT, PLANNER_EXPLORE_EVERY = 30, 50, 2, 20
+    PLANNER_STATS_PATH = "data/planner/stats.json"
+
+# Per-method top-K (0 = skip) learned from each method's share of the fused top-N for a query type.
+# Every method runs in full until PLANNER_MIN_SAMPLES and on one request in PLANNER_EXPLORE_EVERY.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PLANNER_DEPTH_MARGIN = 1.25
+EMA_ALPHA = 0.1
+
+
+class MethodStats:
+    def __init__(self):
+        self.samples = 0
+        self.share = 0.0
+        self.unique = 0.0
+        self.latency_ms = 0.0
+        self.depths: Deque[int] = deque(maxlen=200)
+
+    def update(self, share: float, unique: float, depth: int, latency_ms: Optional[float]) -> None:
+        a = 1.0 if self.samples == 0 else EMA_ALPHA
+        self.share += a * (share - self.share)
+        self.unique += a * (unique - self.unique)
+        if latency_ms is not None:
+            self.latency_ms = latency_ms if self.latency_ms == 0.0 else self.latency_ms + EMA_ALPHA * (latency_ms - self.latency_ms)
+        if depth > 0:
+            self.depths.append(depth)
+        self.samples += 1
+
+    def depth_p90(self) -> Optional[int]:
+        if not self.depths:
+            return None
+        ordered = sorted(self.depths)
+        return ordered[min(len(ordered) - 1, int(math.ceil(0.9 * len(ordered))) - 1)]
+
+    def to_dict(self) -> Dict:
+        return {"samples": self.samples, "share": self.share, "unique": self.unique,
+                "latency_ms": self.latency_ms, "depths": list(self.depths)}
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "MethodStats":
+        s = cls()
+        s.samples, s.share, s.unique = int(d.get("samples", 0)), float(d.get("share", 0.0)), float(d.get("unique", 0.0))
+        s.latency_ms = float(d.get("latency_ms", 0.0))
+        s.depths.extend(int(x) for x in d.get("depths", []))
+        return s
+
+
+class QueryPlanner:
+    def __init__(
+        self,
+        stats_path: str = PLANNER_STATS_PATH,
+        min_samples: int = PLANNER_MIN_SAMPLES,
+        min_topk: int = PLANNER_MIN_TOPK,
+        skip_share: float = PLANNER_SKIP_PERCENT / 100.0,
+        explore_every: int = PLANNER_EXPLORE_EVERY,
+        save_every: int = 20,
+    ):
+        self.stats_path = stats_path if os.path.isabs(stats_path) else os.path.join(PROJECT_ROOT, stats_path)
+        self.min_samples = int(min_samples)
+        self.min_topk = int(min_topk)
+        self.skip_share = float(skip_share)
+        self.explore_every = max(1, int(explore_every))
+        self.save_every = max(1, int(save_every))
+        self._stats: Dict[str, Dict[str, MethodStats]] = {}
+        self._requests: Dict[str, int] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def query_type(methods: List[str]) -> str:
+        return "+".join(sorted(methods))
+
+    def plan(self, methods: List[str], topk: int, budget_ms: Optional[float] = None) -> Dict[str, int]:
+        """method -> top-K to run with (0 = skip); every method at topk while the type is still being learned."""
+        full = {m: int(topk) for m in methods}
+        if len(methods) < 2:
+            return full
+        qtype = self.query_type(methods)
+        with self._lock:
+            n = self._requests.get(qtype, 0)
+            self._requests[qtype] = n + 1
+            stats = {m: self._stats.get(qtype, {}).get(m) for m in methods}
+        if n % self.explore_every == 0 or any(s is None or s.samples < self.min_samples for s in stats.values()):
+            return full
+
+        keep = max(methods, key=lambda m: (stats[m].share, stats[m].unique))
+        plan: Dict[str, int] = {}
+        for m in methods:
+            s = stats[m]
+            if m != keep and s.share < self.skip_share and s.unique < self.skip_share:
+                plan[m] = 0
+                continue
+            if m != keep and budget_ms is not None and s.latency_ms > budget_ms and s.unique < 0.05:
+                plan[m] = 0  # would blow the budget for little that only it finds
+                continue
+            depth = s.depth_p90()
+            k = int(math.ceil(depth * PLANNER_DEPTH_MARGIN)) if depth else self.min_topk
+            plan[m] = max(min(k, int(topk)), min(self.min_topk, int(topk)))
+        return plan
+
+    def record(
+        self,
+        buckets: Dict[str, List[Dict]],
+        final: List[Dict],
+        top_n: int,
+        full_methods: List[str],
+        methods: List[str],
+        latencies: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """Contribution of each method that ran at full top-K to the final top-N ids."""
+        final_ids = [h["id"] for h in final[:top_n] if h.get("id") is not None]
+        if not final_ids or len(methods) < 2:
+            return
+        final_set = set(final_ids)
+        ranks = {m: {h["id"]: r for r, h in enumerate(buckets.get(m) or []) if h.get("id") is not None} for m in methods}
+        found = {m: final_set & ranks[m].keys() for m in methods}
+        qtype = self.query_type(methods)
+        with self._lock:
+            per_type = self._stats.setdefault(qtype, {})
+            for m in full_methods:
+                if m not in ranks:
+                    continue
+                others = set().union(*(found[o] for o in methods if o != m)) if len(methods) > 1 else set()
+                depth = max((ranks[m][i] + 1 for i in found[m]), default=0)
+                per_type.setdefault(m, MethodStats()).update(
+                    len(found[m]) / len(final_ids), len(found[m] - others) / len(final_ids), depth,
+                    (latencies or {}).get(m),
+                )
+            self._pending += 1
+            save = self._pending >= self.save_every
+            if save:
+                self._pending = 0
+        if save:
+            self.save()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                qtype: {m: {**s.to_dict(), "depth_p90": s.depth_p90(), "depths": len(s.depths)} for m, s in per.items()}
+                for qtype, per in self._stats.items()
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            data = {qtype: {m: s.to_dict() for m, s in per.items()} for qtype, per in self._stats.items()}
+        try:
+            os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+            tmp = self.stats_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.stats_path)
+        except Exception as e:
+            print(f"[Planner] Failed to save stats: {e}")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._stats = {qtype: {m: MethodStats.from_dict(d) for m, d in per.items()} for qtype, per in data.items()}
+        except Exception as e:
+            print(f"[Planner] Failed to load stats from {self.stats_path}: {e}")
+
+
+# Global instance for easy access
+query_planner = QueryPlanner()
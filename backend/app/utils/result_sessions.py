@@ -0,0 +1,142 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+try:
+    from app.config.settings import RESULT_SESSION_TTL_S, RESULT_SESSION_MAX
+except ImportError:
+    RESULT_SESSION_TTL_S, RESULT_SESSION_MAX = 600, 200
+
+# Result lists the first page is taken from, in order of preference (single / temporal / others)
+PRIMARY_KEYS = ("ensemble_all_queries_all_methods", "objects", "results")
+
+
+def _sections(result: Dict, prefix: str = "") -> Dict[str, List]:
+    """Every list in a (nested) result dict, by its "/"-joined key path."""
+    out: Dict[str, List] = {}
+    for key, value in result.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, list):
+            out[path] = value
+        elif isinstance(value, dict):
+            out.update(_sections(value, prefix=f"{path}/"))
+    return out
+
+
+def _primary(keys: List[str]) -> Optional[str]:
+    return next((k for k in PRIMARY_KEYS if k in keys), next(iter(keys), None))
+
+
+class ResultSessionStore:
+    """
+    Search results kept server-side for a short while, keyed by a result token.
+
+    A search returns only the first page of each top-level result list plus the token; the
+    remaining pages (cursor = offset into the stored list, stable since stored results never change)
+    and the per-query / per-method breakdowns are fetched on demand with page(). Nothing is
+    recomputed. Sessions expire after `ttl_s`; beyond `max_sessions` the least recently used go first.
+    """
+
+    def __init__(self, ttl_s: int = RESULT_SESSION_TTL_S, max_sessions: int = RESULT_SESSION_MAX):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        # token -> {"created": float, "sections": {path: list}, "primary": Optional[str]}
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, result: Dict) -> str:
+        sections = _sections(result)
+        primary = _primary([k for k, v in result.items() if isinstance(v, list)])
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[token] = {"created": time.time(), "sections": sections, "primary": primary}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self.purge_expired()
+        return token
+
+    def _get(self, token: str) -> Dict[str, Any]:
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None or time.time() - session["created"] > self.ttl_s:
+                self._sessions.pop(token, None)
+                raise KeyError(f"Unknown or expired result token: {token}")
+            self._sessions.move_to_end(token)
+            return session
+
+    def page(self, token: str, section: Optional[str] = None, cursor: Optional[str] = None, limit: int = 100) -> Dict:
+        """
+        One page of a stored result list: the primary one by default, or any breakdown path such as
+        "per_query/query_0/per_method/siglip2". Raises KeyError for an unknown token or section.
+        """
+        session = self._get(token)
+        section = section or session["primary"]
+        items = session["sections"].get(section) if section else None
+        if items is None:
+            raise KeyError(f"Unknown result section: {section}")
+        try:
+            offset = max(0, int(cursor)) if cursor else 0
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        limit = max(1, int(limit))
+        end = offset + limit
+        return {
+            "result_token": token,
+            "section": section,
+            "items": items[offset:end],
+            "total": len(items),
+            "next_cursor": str(end) if end < len(items) else None,
+        }
+
+    def first_page(self, result: Dict, page_size: int) -> Dict:
+        """
+        Store `result` and return it slimmed down: top-level lists cut to page_size, nested breakdowns
+        (per_query, ensemble_per_method_across_queries) replaced by their section paths and sizes.
+        Other fields (mode, search_params, plan, error, ...) are kept as they are.
+        """
+        token = self.create(result)
+        slim: Dict[str, Any] = {}
+        totals: Dict[str, int] = {}
+        sections: Dict[str, int] = {}
+        for key, value in result.items():
+            nested = _sections(value) if isinstance(value, dict) else {}
+            if isinstance(value, list):
+                slim[key] = value[:page_size]
+                totals[key] = len(value)
+            elif nested:
+                sections.update({f"{key}/{path}": len(items) for path, items in nested.items()})
+            else:
+                slim[key] = value
+        primary = _primary(list(totals))
+        slim["page"] = {
+            "result_token": token,
+            "page_size": page_size,
+            "primary": primary,
+            "totals": totals,
+            "next_cursor": str(page_size) if primary and totals.get(primary, 0) > page_size else None,
+            "expires_in_s": self.ttl_s,
+        }
+        slim["sections"] = sections
+        return slim
+
+    def delete(self, token: str) -> None:
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [t for t, s in self._sessions.items() if now - s["created"] > self.ttl_s]
+            for t in expired:
+                del self._sessions[t]
+        return len(expired)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "ttl_s": self.ttl_s, "max_sessions": self.max_sessions}
+
+
+# Global instance for easy access
+result_sessions = ResultSessionStore()
@@ -0,0 +1,165 @@
+import io
+import time
+import uuid
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    from app.config.settings import UPLOAD_TTL_S, UPLOAD_MAX_SIDE, UPLOAD_MAX_BYTES
+except ImportError:
+    UPLOAD_TTL_S, UPLOAD_MAX_SIDE, UPLOAD_MAX_BYTES = 3600, 1024, 20 * 1024 * 1024
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "BMP", "GIF"}
+DEFAULT_UPLOAD_DIR = Path(__file__).resolve().parents[2] / "temp_uploads"
+
+
+class UploadStore:
+    """
+    Query images uploaded by users, keyed by upload id.
+
+    On upload the image is validated, downscaled and saved as <upload_id>.jpg, then encoded in the
+    background with every configured image model. Searches read the embeddings from here, so an
+    uploaded query costs one ANN call instead of a file decode + model forward per search.
+    Uploads (embeddings and file) expire after `ttl_s` seconds.
+    """
+
+    def __init__(
+        self,
+        upload_dir: Path = DEFAULT_UPLOAD_DIR,
+        ttl_s: int = UPLOAD_TTL_S,
+        max_side: int = UPLOAD_MAX_SIDE,
+        max_bytes: int = UPLOAD_MAX_BYTES,
+    ):
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(exist_ok=True)
+        self.ttl_s = ttl_s
+        self.max_side = max_side
+        self.max_bytes = max_bytes
+        # upload_id -> {"created": float, "embeddings": {model: vector}, "future": Optional[Future]}
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        # One worker: encoding shares the models (and GPU) with live searches
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-encode")
+
+    def path_for(self, upload_id: str) -> Path:
+        return self.upload_dir / f"{upload_id}.jpg"
+
+    # ----- Upload ----- #
+    def _load_image(self, contents: bytes) -> Image.Image:
+        if not contents:
+            raise ValueError("Empty upload")
+        if len(contents) > self.max_bytes:
+            raise ValueError(f"Image too large ({len(contents)} bytes, max {self.max_bytes})")
+        try:
+            with Image.open(io.BytesIO(contents)) as probe:
+                fmt = probe.format
+                probe.verify()
+        except Exception as e:
+            raise ValueError(f"Not a valid image: {e}")
+        if fmt not in ALLOWED_FORMATS:
+            raise ValueError(f"Unsupported image format: {fmt}")
+        with Image.open(io.BytesIO(contents)) as raw:
+            image = raw.convert("RGB")
+        if max(image.size) > self.max_side:
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        return image
+
+    def save(self, contents: bytes) -> Tuple[str, Image.Image]:
+        """Validate, downscale and store an upload; raises ValueError for anything that is not an image."""
+        self.purge_expired()
+        image = self._load_image(contents)
+        upload_id = str(uuid.uuid4())
+        image.save(self.path_for(upload_id), format="JPEG", quality=92)
+        with self._lock:
+            self._entries[upload_id] = {"created": time.time(), "embeddings": {}, "future": None}
+        return upload_id, image
+
+    def encode_async(self, upload_id: str, image: Image.Image, encoders: Dict[str, Callable[[Image.Image], np.ndarray]]) -> Optional[Future]:
+        """Encode the upload with each model in the background; returns the future (None if nothing to do)."""
+        if not encoders:
+            return None
+
+        def _encode():
+            for model_name, encode in encoders.items():
+                try:
+                    vec = np.asarray(encode(image), dtype=np.float32).reshape(-1)
+                except Exception as e:
+                    print(f"[UploadStore] Encoding {upload_id} with {model_name} failed: {e}")
+                    continue
+                with self._lock:
+                    entry = self._entries.get(upload_id)
+                    if entry is None:
+                        return  # expired / deleted meanwhile
+                    entry["embeddings"][model_name] = vec
+
+        future = self._executor.submit(_encode)
+        with self._lock:
+            if upload_id in self._entries:
+                self._entries[upload_id]["future"] = future
+        return future
+
+    # ----- Lookup ----- #
+    def _expired(self, entry: Dict) -> bool:
+        return time.time() - entry["created"] > self.ttl_s
+
+    def get_embedding(self, upload_id: str, model_name: str, wait_s: float = 5.0) -> Optional[np.ndarray]:
+        """Stored embedding for an upload; waits up to wait_s for a pending encode. None if unknown / expired."""
+        with self._lock:
+            entry = self._entries.get(upload_id)
+        if entry is None or self._expired(entry):
+            return None
+        if model_name not in entry["embeddings"] and entry["future"] is not None and wait_s > 0:
+            try:
+                entry["future"].result(timeout=wait_s)
+            except Exception:
+                pass
+        return entry["embeddings"].get(model_name)
+
+    def exists(self, upload_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(upload_id)
+        if entry is not None:
+            return not self._expired(entry)
+        return self.path_for(upload_id).exists()  # uploads from before a restart: file only
+
+    # ----- Expiry ----- #
+    def delete(self, upload_id: str) -> None:
+        with self._lock:
+            self._entries.pop(upload_id, None)
+        try:
+            self.path_for(upload_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self) -> int:
+        """Drop expired uploads (entries and files, including files left from earlier runs)."""
+        now = time.time()
+        with self._lock:
+            expired = [uid for uid, entry in self._entries.items() if now - entry["created"] > self.ttl_s]
+        for uid in expired:
+            self.delete(uid)
+        for path in self.upload_dir.glob("*.jpg"):
+            try:
+                if path.stem not in self._entries and now - path.stat().st_mtime > self.ttl_s:
+                    path.unlink()
+                    expired.append(path.stem)
+            except OSError:
+                continue
+        return len(expired)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "uploads": len(self._entries),
+                "encoded": sum(1 for e in self._entries.values() if e["embeddings"]),
+                "ttl_s": self.ttl_s,
+            }
+
+
+# Global instance for easy access
+upload_store = UploadStore()
@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import faiss
+
+# Ensure project root is on sys.path so `app` imports work when run as a script
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.vector_database.local_vector_db import LocalVectorDB
+from app.vector_database.reduced_index import PROJECTION_METHODS, fit_projection
+
+# Recall@k / QPS / p50-p99 / memory sweep over local-engine index settings against exact ground truth;
+# --reduced-dims measures reduced-dimension first stages instead.
+FOLDER_PATH = os.path.join(PROJECT_ROOT, "data", "index", "dense")
+
+# (index_type, build params, list of search params) - mirrors what MilvusVectorDB can create
+DEFAULT_SWEEP: List[Tuple[str, Dict, List[Dict]]] = [
+    ("FLAT", {}, [{}]),
+    ("HNSW", {"M": 16, "efConstruction": 200}, [{"ef": ef} for ef in (64, 128, 256, 512)]),
+    ("HNSW", {"M": 32, "efConstruction": 200}, [{"ef": ef} for ef in (64, 128, 256, 512)]),
+    ("HNSW", {"M": 48, "efConstruction": 200}, [{"ef": ef} for ef in (64, 128, 256, 512)]),
+    ("IVF_FLAT", {"nlist": 1024}, [{"nprobe": p} for p in (8, 16, 32, 64, 128)]),
+    ("IVF_FLAT", {"nlist": 4096}, [{"nprobe": p} for p in (16, 32, 64, 128, 256)]),
+    ("IVF_SQ8", {"nlist": 1024}, [{"nprobe": p} for p in (16, 32, 64, 128)]),
+    ("IVF_PQ", {"nlist": 1024, "m": 64}, [{"nprobe": p} for p in (16, 32, 64, 128)]),
+    ("BIN_SIGN", {}, [{"rerank": r} for r in (4, 10, 20, 50)]),
+    ("BIN_ITQ", {}, [{"rerank": r} for r in (4, 10, 20, 50)]),
+]
+
+
+@dataclass
+class BenchmarkResult:
+    index_type: str
+    build_params: Dict
+    search_params: Dict
+    recall: float
+    qps: float
+    p50_ms: float
+    p99_ms: float
+    memory_mb: float
+    build_s: float
+    extra: Dict = field(default_factory=dict)
+
+
+def load_vectors(faiss_file_path: str, max_vectors: Optional[int] = None) -> np.ndarray:
+    index = faiss.read_index(faiss_file_path)
+    n = int(index.ntotal) if max_vectors is None else min(int(index.ntotal), int(max_vectors))
+    return np.ascontiguousarray(index.reconstruct_n(0, n), dtype=np.float32)
+
+
+def load_queries(path: str) -> np.ndarray:
+    if path.endswith(".npy"):
+        return np.ascontiguousarray(np.load(path), dtype=np.float32)
+    return load_vectors(path)
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (x / norms).astype(np.float32)
+
+
+def hold_out_queries(vectors: np.ndarray, num_queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sample query rows from the collection and remove them from the base set."""
+    rng = np.random.default_rng(seed)
+    q_idx = rng.choice(vectors.shape[0], size=min(num_queries, vectors.shape[0] // 2), replace=False)
+    mask = np.ones(vectors.shape[0], dtype=bool)
+    mask[q_idx] = False
+    base_ids = np.nonzero(mask)[0].astype(np.int64)
+    return vectors[mask], base_ids, vectors[q_idx]
+
+
+def exact_ground_truth(
+    base: np.ndarray,
+    base_ids: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    distance: str = "COSINE",
+    chunk_size: int = 200_000,
+) -> np.ndarray:
+    """Brute-force top-k ids per query, computed block by block to bound memory."""
+    if distance == "COSINE":
+        base, queries = normalize(base), normalize(queries)
+    nq = queries.shape[0]
+    best_scores = np.full((nq, k), -np.inf, dtype=np.float32)
+    best_ids = np.full((nq, k), -1, dtype=np.int64)
+
+    for start in range(0, base.shape[0], chunk_size):
+        block = base[start:start + chunk_size]
+        scores = queries @ block.T  # (nq, b)
+        if distance == "L2":
+            scores = 2.0 * scores - np.sum(block * block, axis=1)[None, :]
+        kk = min(k, scores.shape[1])
+        part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        cand_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+        cand_ids = np.concatenate([best_ids, base_ids[start + part]], axis=1)
+        top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(cand_scores, top, axis=1)
+        best_ids = np.take_along_axis(cand_ids, top, axis=1)
+    return best_ids
+
+
+def recall_at_k(found: List[List[int]], truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = [len(set(f[:k]) & set(t.tolist())) for f, t in zip(found, truth)]
+    return float(np.mean(hits) / k) if hits else 0.0
+
+
+def time_queries(db: LocalVectorDB, queries: np.ndarray, k: int, search_params: Dict, warmup: int = 5):
+    for q in queries[:warmup]:
+        db.search(q, limit=k, search_params=search_params)
+    found, latencies = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits = db.search(q, limit=k, search_params=search_params)
+        latencies.append(time.perf_counter() - t0)
+        found.append([h["id"] for h in hits])
+    return found, np.asarray(latencies, dtype=np.float64)
+
+
+def run_sweep(
+    base: np.ndarray,
+    base_ids: np.ndarray,
+    queries: np.ndarray,
+    ground_truth: np.ndarray,
+    k: int,
+    sweep: List[Tuple[str, Dict, List[Dict]]],
+    distance: str = "COSINE",
+    collection_name: str = "benchmark",
+    storage_dtype: str = "float32",
+) -> List[BenchmarkResult]:
+    results: List[BenchmarkResult] = []
+    for index_type, build_params, search_grid in sweep:
+        print(f"\n=== {index_type} {build_params} ===")
+        db = LocalVectorDB(
+            collection_name=collection_name,
+            distance=distance,
+            partition_by_batch=False,
+            index_type=index_type,
+            index_params=build_params,
+            storage_dtype=storage_dtype,
+        )
+        t0 = time.perf_counter()
+        try:
+            db.add_vectors(base_ids, base)
+        except Exception as e:
+            print(f"  ✗ build failed: {e}")
+            continue
+        build_s = time.perf_counter() - t0
+        memory_mb = db.memory_bytes() / (1024 * 1024)
+        rerank_rows_mb = db.rerank_rows_bytes() / (1024 * 1024)
+
+        for search_params in search_grid:
+            found, lat = time_queries(db, queries, k, search_params)
+            res = BenchmarkResult(
+                index_type=index_type,
+                build_params=build_params,
+                search_params=search_params,
+                recall=recall_at_k(found, ground_truth),
+                qps=float(len(lat) / lat.sum()) if lat.sum() > 0 else 0.0,
+                p50_ms=float(np.percentile(lat, 50) * 1000),
+                p99_ms=float(np.percentile(lat, 99) * 1000),
+                memory_mb=memory_mb,
+                build_s=build_s,
+                extra={"storage_dtype": storage_dtype, "rerank_rows_mb": rerank_rows_mb},
+            )
+            print(f"  {search_params or '-'}: recall@{k}={res.recall:.4f} qps={res.qps:.1f} "
+                  f"p50={res.p50_ms:.2f}ms p99={res.p99_ms:.2f}ms mem={res.memory_mb:.0f}MB"
+                  f" (of which {rerank_rows_mb:.0f}MB float32 rerank rows)")
+            results.append(res)
+        db.close()
+    return results
+
+
+def run_reduced_sweep(
+    base: np.ndarray,
+    base_ids: np.ndarray,
+    queries: np.ndarray,
+    ground_truth: np.ndarray,
+    k: int,
+    dims: List[int],
+    methods: List[str],
+    rerank_factors: List[int],
+    sample: int = 200_000,
+    seed: int = 0,
+) -> List[BenchmarkResult]:
+    """Recall@k of a reduced first stage + full-dimension rerank, per (method, dim, rerank factor)."""
+    results: List[BenchmarkResult] = []
+    full_base, full_queries = normalize(base), normalize(queries)
+    rng = np.random.default_rng(seed)
+    fit_rows = base[rng.choice(base.shape[0], size=min(sample, base.shape[0]), replace=False)]
+    for method in methods:
+        for dim in dims:
+            if dim >= base.shape[1]:
+                continue
+            print(f"\n=== {method} {base.shape[1]} -> {dim} ===")
+            t0 = time.perf_counter()
+            projection = fit_projection(fit_rows, dim, method)
+            reduced_base = projection.apply(base)
+            build_s = time.perf_counter() - t0
+            reduced_queries = projection.apply(queries)
+            for rf in rerank_factors:
+                n_cand = min(k * rf, reduced_base.shape[0])
+                found, latencies = [], []
+                for q_red, q_full in zip(reduced_queries, full_queries):
+                    t1 = time.perf_counter()
+                    scores = reduced_base @ q_red
+                    cand = np.argpartition(-scores, n_cand - 1)[:n_cand]
+                    exact = full_base[cand] @ q_full
+                    top = cand[np.argsort(-exact)[:k]]
+                    latencies.append(time.perf_counter() - t1)
+                    found.append(base_ids[top].tolist())
+                lat = np.asarray(latencies, dtype=np.float64)
+                res = BenchmarkResult(
+                    index_type=f"REDUCED_{method.upper()}",
+                    build_params={"dim": dim},
+                    search_params={"rerank_factor": rf},
+                    recall=recall_at_k(found, ground_truth),
+                    qps=float(len(lat) / lat.sum()) if lat.sum() > 0 else 0.0,
+                    p50_ms=float(np.percentile(lat, 50) * 1000),
+                    p99_ms=float(np.percentile(lat, 99) * 1000),
+                    memory_mb=reduced_base.nbytes / (1024 * 1024),
+                    build_s=build_s,
+                    extra={"full_dim": int(base.shape[1]), "candidates": n_cand},
+                )
+                print(f"  rerank x{rf}: recall@{k}={res.recall:.4f} qps={res.qps:.1f} "
+                      f"p50={res.p50_ms:.2f}ms mem={res.memory_mb:.0f}MB")
+                results.append(res)
+    return results
+
+
+def print_report(results: List[BenchmarkResult], k: int) -> None:
+    print(f"\n{'=' * 100}")
+    print(f"{'index':<10} {'build':<28} {'search':<16} {'recall@' + str(k):>10} {'qps':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'mem MB':>8} {'build s':>8}")
+    print(f"{'-' * 100}")
+    for r in results:
+        print(f"{r.index_type:<10} {json.dumps(r.build_params):<28} {json.dumps(r.search_params):<16} "
+              f"{r.recall:>10.4f} {r.qps:>9.1f} {r.p50_ms:>8.2f} {r.p99_ms:>8.2f} {r.memory_mb:>8.0f} {r.build_s:>8.1f}")
+    print(f"{'=' * 100}")
+
+
+def select_sweep(index_types: Optional[str]) -> List[Tuple[str, Dict, List[Dict]]]:
+    if not index_types:
+        return DEFAULT_SWEEP
+    wanted = {LocalVectorDB._normalize_index_type(t.strip()) for t in index_types.split(",") if t.strip()}
+    return [entry for entry in DEFAULT_SWEEP if entry[0] in wanted]
+
+
+def main(argv: Optional[List[str]] = None) -> List[BenchmarkResult]:
+    parser = argparse.ArgumentParser(description="Sweep ANN index parameters against exact ground truth")
+    parser.add_argument("collection", help="Collection name, i.e. data/index/dense/<collection>.bin")
+    parser.add_argument("--folder", default=FOLDER_PATH, help="Folder with dense .bin files")
+    parser.add_argument("--queries", default=None, help="Query embeddings (.npy or FAISS .bin); default: hold out from the collection")
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=100)
+    parser.add_argument("--max-base", type=int, default=None, help="Only use the first N vectors of the collection")
+    parser.add_argument("--distance", default="COSINE", choices=["COSINE", "IP", "L2"])
+    parser.add_argument("--index-types", default=None, help="Comma list to restrict the sweep, e.g. HNSW,IVF_PQ")
+    parser.add_argument("--storage-dtype", default="float32", choices=["float32", "float16", "int8"],
+                        help="Precision of the stored vectors (reduced modes rerank at float32)")
+    parser.add_argument("--reduced-dims", default=None, help="Comma list of reduced dimensions to benchmark instead of index types, e.g. 128,256,512")
+    parser.add_argument("--reduced-methods", default="pca,truncate", help=f"Comma list of projections: {', '.join(PROJECTION_METHODS)}")
+    parser.add_argument("--rerank-factors", default="1,4,10", help="Candidates per result rescored at full dimension")
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    faiss_path = os.path.join(args.folder, f"{args.collection}.bin")
+    print(f"Loading {faiss_path}")
+    vectors = load_vectors(faiss_path, args.max_base)
+
+    if args.queries:
+        base, base_ids = vectors, np.arange(vectors.shape[0], dtype=np.int64)
+        queries = load_queries(args.queries)
+        if args.num_queries and queries.shape[0] > args.num_queries:
+            sel = np.random.default_rng(args.seed).choice(queries.shape[0], args.num_queries, replace=False)
+            queries = queries[sel]
+    else:
+        base, base_ids, queries = hold_out_queries(vectors, args.num_queries, args.seed)
+    del vectors
+    print(f"Base: {base.shape[0]} x {base.shape[1]}, queries: {queries.shape[0]}, k={args.k}")
+
+    t0 = time.perf_counter()
+    ground_truth = exact_ground_truth(base, base_ids, queries, args.k, args.distance)
+    print(f"Exact ground truth computed in {time.perf_counter() - t0:.1f}s")
+
+    if args.reduced_dims:
+        results = run_reduced_sweep(
+            base, base_ids, queries, ground_truth, args.k,
+            dims=[int(d) for d in args.reduced_dims.split(",") if d.strip()],
+            methods=[m.strip() for m in args.reduced_methods.split(",") if m.strip()],
+            rerank_factors=[int(r) for r in args.rerank_factors.split(",") if r.strip()],
+            seed=args.seed,
+        )
+    else:
+        results = run_sweep(
+            base, base_ids, queries, ground_truth, args.k,
+            select_sweep(args.index_types), args.distance, args.collection, args.storage_dtype,
+        )
+    print_report(results, args.k)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+        print(f"Results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # only needed to build the side collections / read the dense file
+    faiss = None
+
+# Pooled video / shot vectors of a dense collection, uploaded as the side collection <name>_<level>.
+# Shots are runs of `shot_size` consecutive keyframes (the metadata has no shot boundaries).
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.vector_database.partitions import PATH_KEYFRAME_FILE, batch_from_video, normalize_partitions
+from app.vector_database.precision import query_data
+from app.vector_database.search_params import search_param_controller
+from app.vector_database.vector_fetch import DENSE_DIR, exact_topk, vector_fetcher
+from app.vector_database.dedup import expand_hits, dedup_index
+
+try:
+    from app.config.settings import COARSE_GROUPS, COARSE_SHOT_SIZE
+except ImportError:
+    COARSE_GROUPS, COARSE_SHOT_SIZE = 30, 8
+
+COARSE_DIR = os.path.abspath(os.getenv("COARSE_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "coarse")))
+LEVELS = ("video", "shot")
+
+
+def side_collection_name(collection_name: str, level: str) -> str:
+    return f"{collection_name}_{level}"
+
+
+# ----- Offline build ----- #
+def _keyframe_order(path: Optional[str]) -> Tuple[Optional[str], int]:
+    """'.../keyframe/L21_V001/keyframe_12.webp' -> ('L21_V001', 12)."""
+    parts = str(path or "").replace("\\", "/").split("/")
+    if len(parts) < 2:
+        return None, 0
+    video = parts[parts.index("keyframe") + 1] if "keyframe" in parts[:-1] else parts[-2]
+    digits = re.findall(r"\d+", os.path.splitext(parts[-1])[0])
+    return video or None, int(digits[-1]) if digits else 0
+
+
+def load_video_keyframes(metadata_path: Optional[str] = None) -> Dict[str, List[int]]:
+    """video id -> keyframe ids in frame order, from path_keyframe.json."""
+    with open(metadata_path or PATH_KEYFRAME_FILE, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    frames: Dict[str, List[Tuple[int, int]]] = {}
+    items = raw.items() if isinstance(raw, dict) else enumerate(raw)
+    for key, entry in items:
+        path = entry if isinstance(entry, str) else (entry or {}).get("path")
+        video, order = _keyframe_order(path)
+        try:
+            kid = int(key)
+        except (TypeError, ValueError):
+            continue
+        if video is not None:
+            frames.setdefault(video, []).append((order, kid))
+    return {video: [kid for _, kid in sorted(rows)] for video, rows in frames.items()}
+
+
+def build_groups(video_keyframes: Dict[str, List[int]], level: str, shot_size: int = COARSE_SHOT_SIZE) -> Dict[str, List[int]]:
+    if level == "video":
+        return dict(video_keyframes)
+    if level != "shot":
+        raise ValueError(f"Unknown coarse level: {level} (expected one of {LEVELS})")
+    groups: Dict[str, List[int]] = {}
+    for video, ids in video_keyframes.items():
+        for s in range(0, len(ids), shot_size):
+            groups[f"{video}#{s // shot_size}"] = ids[s:s + shot_size]
+    return groups
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def _centroids(vectors: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on the keyframes of one group."""
+    rng = np.random.default_rng(seed)
+    centers = vectors[rng.choice(len(vectors), size=k, replace=False)]
+    for _ in range(iters):
+        assign = np.argmax(vectors @ centers.T, axis=1)
+        for c in range(k):
+            members = vectors[assign == c]
+            if len(members):
+                centers[c] = members.mean(axis=0)
+        centers = _normalize_rows(centers)
+    return centers
+
+
+def aggregate_group(vectors: np.ndarray, pooling: str = "mean", n_centroids: int = 0) -> List[Tuple[str, np.ndarray]]:
+    """Aggregate rows for one group: the pooled vector, plus centroids when the group is large enough."""
+    vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    pooled = vectors.max(axis=0) if pooling == "max" else vectors.mean(axis=0)
+    rows = [(pooling, pooled / max(float(np.linalg.norm(pooled)), 1e-12))]
+    if n_centroids > 1 and len(vectors) >= 4 * n_centroids:
+        rows.extend(("centroid", c) for c in _centroids(vectors, n_centroids))
+    return rows
+
+
+def build_coarse_level(
+    collection_name: str,
+    level: str,
+    pooling: str = "mean",
+    n_centroids: int = 0,
+    shot_size: int = COARSE_SHOT_SIZE,
+    dense_dir: str = DENSE_DIR,
+    out_dir: str = COARSE_DIR,
+    metadata_path: Optional[str] = None,
+) -> str:
+    """Write <collection>_<level>.bin / .json / .groups.json; returns the .bin path."""
+    if faiss is None:
+        raise RuntimeError("faiss is required to build coarse indexes")
+    index = faiss.read_index(os.path.join(dense_dir, f"{collection_name}.bin"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    groups = build_groups(load_video_keyframes(metadata_path), level, shot_size)
+
+    rows: List[np.ndarray] = []
+    payloads: Dict[str, Dict] = {}
+    group_ids: Dict[str, List[int]] = {}
+    for group, ids in groups.items():
+        ids = [i for i in ids if 0 <= i < index.ntotal]
+        if not ids:
+            continue
+        vectors = index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+        for kind, vec in aggregate_group(vectors, pooling, n_centroids if level == "video" else 0):
+            payloads[str(len(rows))] = {"group": group, "video": group.split("#", 1)[0], "kind": kind}
+            rows.append(vec)
+        group_ids[group] = ids
+
+    os.makedirs(out_dir, exist_ok=True)
+    name = side_collection_name(collection_name, level)
+    flat = faiss.IndexFlatIP(index.d)
+    flat.add(np.stack(rows).astype(np.float32))
+    bin_path = os.path.join(out_dir, f"{name}.bin")
+    faiss.write_index(flat, bin_path)
+    with open(os.path.join(out_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(payloads, f)
+    with open(os.path.join(out_dir, f"{name}.groups.json"), "w", encoding="utf-8") as f:
+        json.dump(group_ids, f)
+    print(f"[Coarse] {name}: {len(group_ids)} {level}s -> {len(rows)} aggregate vectors ({pooling}, centroids={n_centroids})")
+    return bin_path
+
+
+# ----- Online search ----- #
+class CoarseIndex:
+    """Top videos / shots from the side collection, then exact scores for their keyframes only."""
+
+    def __init__(self, coarse_dir: str = COARSE_DIR, n_groups: int = COARSE_GROUPS):
+        self.coarse_dir = coarse_dir
+        self.n_groups = n_groups
+        self._payloads: Dict[str, Optional[Dict[int, Dict]]] = {}
+        self._groups: Dict[str, Optional[Dict[str, List[int]]]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, name: str) -> Tuple[Optional[Dict[int, Dict]], Optional[Dict[str, List[int]]]]:
+        with self._lock:
+            if name in self._groups:
+                return self._payloads[name], self._groups[name]
+        payloads = groups = None
+        try:
+            with open(os.path.join(self.coarse_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+                payloads = {int(k): v for k, v in json.load(f).items()}
+            with open(os.path.join(self.coarse_dir, f"{name}.groups.json"), "r", encoding="utf-8") as f:
+                groups = json.load(f)
+        except Exception as e:
+            print(f"[Coarse] {name} not available, falling back to keyframe search: {e}")
+            payloads = groups = None
+        with self._lock:
+            self._payloads[name], self._groups[name] = payloads, groups
+        return payloads, groups
+
+    def available(self, collection_name: str, level: str) -> bool:
+        return self._load(side_collection_name(collection_name, level))[1] is not None
+
+    def top_groups(
+        self,
+        client,
+        collection_name: str,
+        vec: np.ndarray,
+        level: str = "video",
+        n_groups: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> List[Tuple[str, float]]:
+        """(group, score) of the best videos / shots; a group scores as its best aggregate row."""
+        name = side_collection_name(collection_name, level)
+        payloads, _ = self._load(name)
+        if payloads is None:
+            return []
+        n_groups = n_groups or self.n_groups
+        batches = set(normalize_partitions(partitions) or [])
+        # Several rows per group (pooled + centroids) and a partition filter: over-fetch
+        limit = min(len(payloads), n_groups * 4 * (4 if batches else 1))
+        choice = search_param_controller.choose(name, limit, deadline=deadline)
+        with search_param_controller.track(choice):
+            res = client.search(
+                collection_name=name,
+                data=query_data(client, name, vec),
+                anns_field="vector",
+                limit=int(limit),
+                search_params=choice.to_search_params("COSINE"),
+            )
+        hits = res[0] if isinstance(res, list) else res
+        best: Dict[str, float] = {}
+        for h in hits:
+            rid = h.get("id") if isinstance(h, dict) else getattr(h, "id", None)
+            payload = payloads.get(int(rid)) if rid is not None else None
+            if payload is None or (batches and batch_from_video(payload["video"]) not in batches):
+                continue
+            score = float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0))
+            if score > best.get(payload["group"], float("-inf")):
+                best[payload["group"]] = score
+        return sorted(best.items(), key=lambda kv: kv[1], reverse=True)[:n_groups]
+
+    def search(
+        self,
+        client,
+        collection_name: str,
+        vec: np.ndarray,
+        topk: int,
+        level: str = "video",
+        n_groups: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> Optional[List[Dict]]:
+        """Keyframe hits [{"id", "score"}] of the top groups; None when the side collection is missing."""
+        name = side_collection_name(collection_name, level)
+        _, groups = self._load(name)
+        if groups is None:
+            return None
+        top = self.top_groups(client, collection_name, vec, level, n_groups, partitions, deadline)
+        ids = list(dict.fromkeys(i for group, _ in top for i in groups.get(group, [])))
+        if not ids:
+            return []
+
+        q = np.asarray(vec, dtype=np.float32).reshape(-1)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        stored = vector_fetcher._mmap_get(collection_name, ids)
+        if len(stored) == len(ids):
+            rows, scores = exact_topk(np.stack([stored[i] for i in ids]), q, topk)
+            return [{"id": ids[j], "score": float(s)} for j, s in zip(rows, scores)]
+
+        # No local copy of the vectors: let Milvus score just these keyframes (their representatives
+        # when near-duplicates were collapsed) and expand back to the group's frames
+        indexed = list(dict.fromkeys(dedup_index.representative(collection_name, i) for i in ids))
+        res = client.search(
+            collection_name=collection_name,
+            data=query_data(client, collection_name, q),
+            anns_field="vector",
+            filter=f"id in [{', '.join(str(i) for i in indexed)}]",
+            limit=min(int(topk), len(indexed)),
+            search_params={"metric_type": "COSINE", "params": {}},
+        )
+        hits = res[0] if isinstance(res, list) else res
+        wanted = set(ids)
+        out = expand_hits(collection_name, [
+            {
+                "id": h.get("id") if isinstance(h, dict) else getattr(h, "id", None),
+                "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
+            }
+            for h in hits
+        ], limit=len(ids))
+        return [h for h in out if h["id"] is not None and int(h["id"]) in wanted][:int(topk)]
+
+
+# Global instance for easy access
+coarse_index = CoarseIndex()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build video / shot aggregate side collections for coarse-to-fine search")
+    parser.add_argument("collection", help="Collection name, i.e. data/index/dense/<collection>.bin")
+    parser.add_argument("--levels", default="video,shot", help="Comma list of levels: video, shot")
+    parser.add_argument("--pooling", default="mean", choices=["mean", "max"])
+    parser.add_argument("--centroids", type=int, default=2, help="k-means centroids per video (0 = pooled vector only)")
+    parser.add_argument("--shot-size", type=int, default=COARSE_SHOT_SIZE, help="Consecutive keyframes per shot")
+    parser.add_argument("--no-upload", action="store_true", help="Only write the files under data/index/coarse")
+    args = parser.parse_args(argv)
+
+    for level in [l.strip() for l in args.levels.split(",") if l.strip()]:
+        bin_path = build_coarse_level(args.collection, level, args.pooling, args.centroids, args.shot_size)
+        if args.no_upload:
+            continue
+        from app.vector_database.index import MILVUS_URI, MILVUS_TOKEN
+        from app.vector_database.vector_db import MilvusVectorDB
+        name = side_collection_name(args.collection, level)
+        with MilvusVectorDB(collection_name=name, distance="COSINE", milvus_uri=MILVUS_URI, milvus_token=MILVUS_TOKEN, index_type="HNSW") as db:
+            ok = db.create_collection_from_faiss(
+                faiss_file_path=bin_path,
+                metadata_file_path=os.path.join(COARSE_DIR, f"{name}.json"),
+                partition_by_batch=False,
+            )
+        print(f"{'✅' if ok else '❌'} Uploaded side collection {name}")
+
+
+if __name__ == "__main__":
+    main()
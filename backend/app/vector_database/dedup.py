@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # only needed to build the map
+    faiss = None
+
+# Near-duplicate groups of consecutive keyframes: {"threshold", "total", "uploaded", "groups": {rep_id: [member ids]}}
+# in data/index/dedup/<collection>.json. Representatives keep their FAISS id.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+DENSE_DIR = os.path.abspath(os.getenv("DENSE_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "dense")))
+DEDUP_DIR = os.path.abspath(os.getenv("DEDUP_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "dedup")))
+
+
+# ----- Offline build ----- #
+def build_dedup_groups(
+    collection_name: str,
+    threshold: float = 0.97,
+    dense_dir: str = DENSE_DIR,
+    metadata_path: Optional[str] = None,
+) -> Tuple[Dict[int, List[int]], int]:
+    """rep id -> member ids (without the rep) for runs of near-identical consecutive keyframes."""
+    if faiss is None:
+        raise RuntimeError("faiss is required to build the dedup map")
+    from app.vector_database.coarse_index import load_video_keyframes
+
+    index = faiss.read_index(os.path.join(dense_dir, f"{collection_name}.bin"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    groups: Dict[int, List[int]] = {}
+    total = 0
+    for ids in load_video_keyframes(metadata_path).values():
+        ids = [i for i in ids if 0 <= i < index.ntotal]
+        if not ids:
+            continue
+        total += len(ids)
+        vecs = index.reconstruct_batch(np.asarray(ids, dtype=np.int64)).astype(np.float32)
+        vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        rep = 0
+        for j in range(1, len(ids)):
+            # Compare with the representative, not the previous frame, so slow pans don't chain
+            if float(vecs[j] @ vecs[rep]) >= threshold:
+                groups.setdefault(ids[rep], []).append(ids[j])
+            else:
+                rep = j
+    return groups, total
+
+
+def write_dedup_map(collection_name: str, groups: Dict[int, List[int]], total: int, threshold: float, out_dir: str = DEDUP_DIR) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{collection_name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        # A fresh map is not in any collection yet: expansion waits for a deduplicated upload (see mark_upload)
+        json.dump({"threshold": threshold, "total": total, "uploaded": False, "groups": {str(k): v for k, v in groups.items()}}, f)
+    return path
+
+
+# ----- Runtime ----- #
+class DedupIndex:
+    """
+    Representative / member maps per collection. Hits are mapped and expanded only when the collection
+    was uploaded with the members left out ("uploaded" in the map, set by mark_upload); otherwise identity.
+    """
+
+    def __init__(self, dedup_dir: str = DEDUP_DIR):
+        self.dedup_dir = dedup_dir
+        self._maps: Dict[str, Optional[Tuple[Dict[int, List[int]], Dict[int, int], bool]]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, collection_name: str) -> str:
+        return os.path.join(self.dedup_dir, f"{collection_name}.json")
+
+    def _load(self, collection_name: str) -> Optional[Tuple[Dict[int, List[int]], Dict[int, int], bool]]:
+        with self._lock:
+            if collection_name in self._maps:
+                return self._maps[collection_name]
+        loaded = None
+        path = self._path(collection_name)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                groups = {int(rep): [int(m) for m in members] for rep, members in raw.get("groups", {}).items()}
+                rep_of = {m: rep for rep, members in groups.items() for m in members}
+                loaded = (groups, rep_of, bool(raw.get("uploaded", False)))
+            except Exception as e:
+                print(f"[Dedup] Failed to load {path}: {e}")
+        with self._lock:
+            self._maps[collection_name] = loaded
+        return loaded
+
+    def member_ids(self, collection_name: str) -> Set[int]:
+        """Ids a deduplicated upload leaves out (members of some representative)."""
+        loaded = self._load(collection_name)
+        return set(loaded[1]) if loaded else set()
+
+    def is_deduplicated(self, collection_name: str) -> bool:
+        """Whether the collection holds only the representatives of its map."""
+        loaded = self._load(collection_name)
+        return bool(loaded and loaded[2])
+
+    def mark_upload(self, collection_name: str, deduplicated: bool) -> None:
+        """Record whether the collection was (re)uploaded with the members left out."""
+        path = self._path(collection_name)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            raw["uploaded"] = bool(deduplicated)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(raw, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[Dedup] Failed to update {path}: {e}")
+        with self._lock:
+            self._maps.pop(collection_name, None)
+
+    def representative(self, collection_name: str, entity_id: int) -> int:
+        loaded = self._load(collection_name)
+        return loaded[1].get(int(entity_id), int(entity_id)) if loaded and loaded[2] else int(entity_id)
+
+    def expand(self, collection_name: str, hits: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+        """
+        Each representative hit followed by its members, with the same score (the payload stays on the
+        representative), cut to `limit` hits (default: as many as were passed in).
+        """
+        loaded = self._load(collection_name)
+        if not loaded or not loaded[2]:
+            return hits
+        limit = len(hits) if limit is None else int(limit)
+        groups = loaded[0]
+        out: List[Dict] = []
+        seen: Set[int] = set()
+        for hit in hits:
+            if len(out) >= limit:
+                break
+            rid = hit.get("id")
+            if rid is None:
+                out.append(hit)
+                continue
+            if int(rid) in seen:
+                continue
+            seen.add(int(rid))
+            out.append(hit)
+            for member in groups.get(int(rid), ()):
+                if len(out) >= limit:
+                    break
+                if member not in seen:
+                    seen.add(member)
+                    out.append({**{k: v for k, v in hit.items() if k != "payload"}, "id": member})
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._maps.clear()
+
+
+# Global instance for easy access
+dedup_index = DedupIndex()
+
+
+def expand_hits(collection_name: str, hits: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+    """Expand representative hits of a deduplicated collection back to every frame id, at most `limit` of them."""
+    return dedup_index.expand(collection_name, hits, limit)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Collapse near-duplicate consecutive keyframes into representatives")
+    parser.add_argument("collection", help="Collection name, i.e. data/index/dense/<collection>.bin")
+    parser.add_argument("--threshold", type=float, default=0.97, help="Cosine similarity to the representative to join its group")
+    parser.add_argument("--folder", default=DENSE_DIR, help="Folder with dense .bin files")
+    args = parser.parse_args(argv)
+
+    groups, total = build_dedup_groups(args.collection, args.threshold, args.folder)
+    path = write_dedup_map(args.collection, groups, total, args.threshold)
+    members = sum(len(m) for m in groups.values())
+    print(f"[Dedup] {args.collection}: {total} keyframes -> {total - members} representatives "
+          f"({members} collapsed into {len(groups)} groups, threshold {args.threshold}) -> {path}")
+
+
+if __name__ == "__main__":
+    main()
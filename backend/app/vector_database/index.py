@@ -1,12 +1,18 @@
 import os
+import sys
 import time
 from typing import Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from vector_db import MilvusVectorDB 
 from pymilvus import MilvusClient
 
 # Resolve project root and default dense index directory robustly
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.vector_database.vector_db import MilvusVectorDB
+from app.vector_database.dedup import dedup_index
+
 FOLDER_PATH = os.path.join(PROJECT_ROOT, "data", "index", "dense")
 
 # Milvus Cloud Configuration (load from environment or use defaults)
@@ -25,6 +31,17 @@ NUM_COLLECTIONS_PARALLEL = 1  # Process collections sequentially to avoid gRPC c
 # Only load siglip2 collection
 ONLY_COLLECTIONS = ["siglip2"]
 
+# Vector storage / index type: FLOAT16 or BFLOAT16 halve the stored vectors, HNSW_SQ / IVF_SQ8 quantize the index
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "FLOAT")  # FLOAT / FLOAT16 / BFLOAT16
+INDEX_TYPE = os.getenv("INDEX_TYPE", "HNSW")  # HNSW / HNSW_SQ / IVF_FLAT / IVF_SQ8 / IVF_PQ
+
+# One Milvus partition per dataset batch (L21, L22, ...); restrict to ONLY_BATCHES to add a new batch on its own
+PARTITION_BY_BATCH = True
+ONLY_BATCHES = [b for b in os.getenv("ONLY_BATCHES", "").split(",") if b.strip()] or None
+
+# Index only the representatives of near-duplicate keyframe runs (map built by dedup.py)
+DEDUP_KEYFRAMES = os.getenv("DEDUP_KEYFRAMES", "0").lower() in ("1", "true", "yes")
+
 def wait_for_milvus(milvus_uri: Optional[str], milvus_token: Optional[str], timeout: int = 180, interval: float = 3.0) -> bool:
     uri = milvus_uri or MILVUS_URI
     deadline = time.time() + timeout
@@ -47,7 +64,7 @@ def wait_for_milvus(milvus_uri: Optional[str], milvus_token: Optional[str], time
 
 def process_single_collection(args):
     """Process a single collection - designed for parallel execution"""
-    fname, folder, milvus_uri, milvus_token, distance = args
+    fname, folder, milvus_uri, milvus_token, distance, only_batches = args
     collection_name = os.path.splitext(fname)[0]
     faiss_path = os.path.join(folder, fname)
     metadata_path = os.path.join(folder, collection_name + ".json")
@@ -70,9 +87,10 @@ def process_single_collection(args):
             milvus_uri=milvus_uri,
             milvus_token=milvus_token,
             use_gpu=False,  # HNSW is CPU-based
-            index_type="HNSW",  # HNSW for best search quality
+            index_type=INDEX_TYPE,  # HNSW for best search quality
             hnsw_m=32,  # Good balance between speed and accuracy
             hnsw_ef_construction=200,  # Higher = better quality index
+            vector_dtype=VECTOR_DTYPE,
         )
 
         ok = db.create_collection_from_faiss(
@@ -80,9 +98,17 @@ def process_single_collection(args):
             metadata_file_path=metadata_path,
             batch_size=BATCH_SIZE,
             num_workers=NUM_UPLOAD_WORKERS,  # Parallel upload within collection
+            partition_by_batch=PARTITION_BY_BATCH,
+            only_batches=only_batches,
+            skip_ids=dedup_index.member_ids(collection_name) if DEDUP_KEYFRAMES else None,
         )
         
         db.close()
+        if ok:
+            # Search expands representatives back to their members only for deduplicated uploads
+            if only_batches and dedup_index.is_deduplicated(collection_name) != DEDUP_KEYFRAMES:
+                print(f"⚠️  {collection_name}: batch uploaded with DEDUP_KEYFRAMES={int(DEDUP_KEYFRAMES)}, unlike the rest of the collection")
+            dedup_index.mark_upload(collection_name, DEDUP_KEYFRAMES)
         
         # Explicit cleanup to free RAM after upload
         del db
@@ -107,6 +133,7 @@ def upload_folder_to_milvus(
     distance: str = "COSINE",
     parallel_collections: int = NUM_COLLECTIONS_PARALLEL,
     only_collections: Optional[list] = None,
+    only_batches: Optional[list] = None,
 ):
     if not os.path.isdir(folder):
         print(f"❌ Folder not found: {os.path.abspath(folder)}")
@@ -137,13 +164,15 @@ def upload_folder_to_milvus(
     print(f"   - Parallel collections: {parallel_collections}")
     print(f"   - Workers per collection: {NUM_UPLOAD_WORKERS}")
     print(f"   - Batch size: {BATCH_SIZE} (optimized for RAM)")
-    print(f"   - Index type: HNSW")
+    print(f"   - Index type: {INDEX_TYPE} ({VECTOR_DTYPE} vectors)")
+    print(f"   - Partitions: {'per batch' if PARTITION_BY_BATCH else 'none'}{f' (only {only_batches})' if only_batches else ''}")
+    print(f"   - Near-duplicate keyframes: {'representatives only' if DEDUP_KEYFRAMES else 'all indexed'}")
     print(f"   \n💡 RAM Optimization: Using small batch size + cleanup after each collection")
     
     # Process collections in parallel using threads (not processes)
     # Note: Using ThreadPoolExecutor instead of ProcessPoolExecutor
     # to avoid segfault issues with gRPC/Milvus client in forked processes
-    args_list = [(fname, folder, milvus_uri, milvus_token, distance) for fname in bin_files]
+    args_list = [(fname, folder, milvus_uri, milvus_token, distance, only_batches) for fname in bin_files]
     
     results = []
     with ThreadPoolExecutor(max_workers=parallel_collections) as executor:
@@ -171,4 +200,5 @@ if __name__ == "__main__":
         milvus_token=MILVUS_TOKEN,
         distance=DISTANCE,
         only_collections=ONLY_COLLECTIONS,
+        only_batches=ONLY_BATCHES,
     )
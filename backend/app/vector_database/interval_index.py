@@ -0,0 +1,217 @@
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Per-video mapping between scenes (ASR segments) and the keyframes their frame spans cover,
+# saved as data/index/interval/scenes.npz. Spans end exclusive, in keyframe file-name frame numbers.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.vector_database.partitions import PATH_KEYFRAME_FILE
+from app.vector_database.coarse_index import _keyframe_order
+
+PATH_SCENE_FILE = os.path.join(os.path.dirname(str(PATH_KEYFRAME_FILE)), "path_scene.json")
+INTERVAL_DIR = os.path.abspath(os.getenv("INTERVAL_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "interval")))
+ARRAYS = ("kf_ids", "kf_frames", "kf_scene", "scene_ids", "scene_start", "scene_end", "scene_lo", "scene_hi")
+
+
+def _load_json(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return raw if isinstance(raw, dict) else dict(enumerate(raw))
+
+
+def _scene_span(entry) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+    """(video, start, end) of a scene metadata entry; end None when it is implied by the next scene."""
+    path = entry if isinstance(entry, str) else (entry or {}).get("path")
+    video, start = _keyframe_order(path)
+    end = None
+    if isinstance(entry, dict):
+        start = entry.get("start", entry.get("start_frame", start))
+        end = entry.get("end", entry.get("end_frame"))
+    if end is None and path:
+        digits = re.findall(r"\d+", os.path.splitext(str(path).replace("\\", "/").split("/")[-1])[0])
+        if len(digits) >= 2:
+            start, end = int(digits[-2]), int(digits[-1])
+    return video, (int(start) if start is not None else None), (int(end) if end is not None else None)
+
+
+def build_interval_arrays(keyframe_path: Optional[str] = None, scene_path: Optional[str] = None) -> Dict[str, np.ndarray]:
+    keyframes: Dict[str, List[Tuple[int, int]]] = {}
+    for key, entry in _load_json(keyframe_path or str(PATH_KEYFRAME_FILE)).items():
+        path = entry if isinstance(entry, str) else (entry or {}).get("path")
+        video, frame = _keyframe_order(path)
+        if video is None or not str(key).lstrip("-").isdigit():
+            continue
+        keyframes.setdefault(video, []).append((frame, int(key)))
+    scenes: Dict[str, List[Tuple[int, Optional[int], int]]] = {}
+    for key, entry in _load_json(scene_path or PATH_SCENE_FILE).items():
+        video, start, end = _scene_span(entry)
+        if video is None or start is None or not str(key).lstrip("-").isdigit():
+            continue
+        scenes.setdefault(video, []).append((start, end, int(key)))
+
+    parts: Dict[str, List[np.ndarray]] = {name: [] for name in ARRAYS}
+    kf_base = scene_base = 0
+    for video in sorted(set(keyframes) | set(scenes)):
+        kf = sorted(keyframes.get(video, []))
+        frames = np.array([f for f, _ in kf], dtype=np.int64)
+        sc = sorted(scenes.get(video, []), key=lambda s: s[0])
+        starts = np.array([s for s, _, _ in sc], dtype=np.int64)
+        # Without an explicit end a scene runs until the next one starts (the last one to the video's end)
+        last = max([int(frames.max()) + 1 if len(frames) else 0] + [int(starts[-1]) + 1 if len(starts) else 0])
+        implied = np.append(starts[1:], last)
+        ends = np.array([e if e is not None else implied[i] for i, (_, e, _) in enumerate(sc)], dtype=np.int64)
+
+        lo = np.searchsorted(frames, starts, side="left")
+        hi = np.maximum(np.searchsorted(frames, ends, side="left"), lo)
+        cover = np.searchsorted(starts, frames, side="right") - 1
+        if len(ends):
+            inside = (cover >= 0) & (frames < ends[np.maximum(cover, 0)])
+        else:
+            inside = np.zeros(len(frames), dtype=bool)
+
+        parts["kf_ids"].append(np.array([i for _, i in kf], dtype=np.int64))
+        parts["kf_frames"].append(frames)
+        parts["kf_scene"].append(np.where(inside, cover + scene_base, -1).astype(np.int64))
+        parts["scene_ids"].append(np.array([i for _, _, i in sc], dtype=np.int64))
+        parts["scene_start"].append(starts)
+        parts["scene_end"].append(ends)
+        parts["scene_lo"].append(lo.astype(np.int64) + kf_base)
+        parts["scene_hi"].append(hi.astype(np.int64) + kf_base)
+        kf_base += len(kf)
+        scene_base += len(sc)
+    return {name: (np.concatenate(arrs) if arrs else np.empty(0, dtype=np.int64)) for name, arrs in parts.items()}
+
+
+class SceneIntervalIndex:
+    """Vectorized scene <-> keyframe mapping, loaded on first use."""
+
+    def __init__(self, interval_dir: str = INTERVAL_DIR):
+        self.interval_dir = interval_dir
+        self._arrays: Optional[Dict[str, np.ndarray]] = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.interval_dir, "scenes.npz")
+
+    def _load(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._arrays is not None or self._failed:
+            return self._arrays
+        with self._lock:
+            if self._arrays is None and not self._failed:
+                try:
+                    if os.path.exists(self.path):
+                        data = np.load(self.path, allow_pickle=False)
+                        arrays = {name: data[name] for name in ARRAYS}
+                    else:
+                        arrays = build_interval_arrays()
+                    # id -> position lookups by binary search
+                    for side, ids in (("kf", arrays["kf_ids"]), ("scene", arrays["scene_ids"])):
+                        order = np.argsort(ids, kind="stable")
+                        arrays[f"{side}_sorted"], arrays[f"{side}_order"] = ids[order], order
+                    self._arrays = arrays
+                    print(f"[Intervals] {len(arrays['scene_ids'])} scenes over {len(arrays['kf_ids'])} keyframes")
+                except Exception as e:
+                    print(f"[Intervals] Scene / keyframe interval index unavailable: {e}")
+                    self._failed = True
+        return self._arrays
+
+    def available(self) -> bool:
+        return self._load() is not None
+
+    @staticmethod
+    def _positions(sorted_ids: np.ndarray, order: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        if len(sorted_ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        at = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[at] == ids, order[at], -1)
+
+    def keyframes_of_scenes(self, scene_ids) -> Tuple[np.ndarray, np.ndarray]:
+        """(owner, keyframe ids): every keyframe covered by each scene, owner = index into scene_ids."""
+        a = self._load()
+        ids = np.asarray(scene_ids, dtype=np.int64).reshape(-1)
+        if a is None or len(ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        pos = self._positions(a["scene_sorted"], a["scene_order"], ids)
+        ok = pos >= 0
+        lo = np.where(ok, a["scene_lo"][np.maximum(pos, 0)], 0)
+        n = np.where(ok, a["scene_hi"][np.maximum(pos, 0)] - lo, 0)
+        owner = np.repeat(np.arange(len(ids)), n)
+        # Concatenated ranges lo[i] .. lo[i] + n[i] without a Python loop
+        starts = np.cumsum(n) - n
+        flat = np.arange(int(n.sum())) - np.repeat(starts, n) + np.repeat(lo, n)
+        return owner, a["kf_ids"][flat]
+
+    def scenes_of_keyframes(self, keyframe_ids) -> np.ndarray:
+        """Scene id covering each keyframe, -1 where none does."""
+        a = self._load()
+        ids = np.asarray(keyframe_ids, dtype=np.int64).reshape(-1)
+        if a is None or len(ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = self._positions(a["kf_sorted"], a["kf_order"], ids)
+        scene = np.where(pos >= 0, a["kf_scene"][np.maximum(pos, 0)], -1)
+        return np.where(scene >= 0, a["scene_ids"][np.maximum(scene, 0)], -1)
+
+    def scene_hits_to_keyframes(self, hits: List[Dict]) -> List[Dict]:
+        """Scene hits -> hits on every keyframe they cover, with the scene's score (best scene wins)."""
+        hits = [h for h in hits if h.get("id") is not None]
+        if not hits:
+            return []
+        owner, kf = self.keyframes_of_scenes([int(h["id"]) for h in hits])
+        scores = np.asarray([float(h.get("score", 0.0)) for h in hits], dtype=np.float32)[owner]
+        return self._best_per_id(kf, scores)
+
+    def keyframe_hits_to_scenes(self, hits: List[Dict]) -> List[Dict]:
+        """Keyframe hits -> scene hits scored by their best keyframe."""
+        hits = [h for h in hits if h.get("id") is not None]
+        if not hits:
+            return []
+        scenes = self.scenes_of_keyframes([int(h["id"]) for h in hits])
+        scores = np.asarray([float(h.get("score", 0.0)) for h in hits], dtype=np.float32)
+        keep = scenes >= 0
+        return self._best_per_id(scenes[keep], scores[keep])
+
+    @staticmethod
+    def _best_per_id(ids: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        if len(ids) == 0:
+            return []
+        order = np.lexsort((-scores, ids))
+        ids, scores = ids[order], scores[order]
+        first = np.ones(len(ids), dtype=bool)
+        first[1:] = ids[1:] != ids[:-1]
+        ids, scores = ids[first], scores[first]
+        rank = np.argsort(-scores, kind="stable")
+        return [{"id": int(ids[i]), "score": float(scores[i])} for i in rank]
+
+
+# Global instance for easy access
+scene_intervals = SceneIntervalIndex()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the scene / keyframe interval index")
+    parser.add_argument("--keyframes", default=str(PATH_KEYFRAME_FILE), help="path_keyframe.json")
+    parser.add_argument("--scenes", default=PATH_SCENE_FILE, help="path_scene.json")
+    parser.add_argument("--out", default=INTERVAL_DIR)
+    args = parser.parse_args(argv)
+
+    arrays = build_interval_arrays(args.keyframes, args.scenes)
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, "scenes.npz")
+    np.savez(path, **arrays)
+    covered = int((arrays["kf_scene"] >= 0).sum())
+    print(f"[Intervals] {len(arrays['scene_ids'])} scenes, {covered}/{len(arrays['kf_ids'])} keyframes covered -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+import os
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import faiss
+
+from app.vector_database.partitions import DEFAULT_PARTITION, load_id_to_batch, normalize_partitions
+from app.vector_database.search_params import search_param_controller
+from app.vector_database.precision import binary_codes, dequantize_sq8, hamming_distances, quantize_sq8, train_itq
+
+# Index types understood by the local engine (names follow Milvus, plus binary-hash prefilters)
+INDEX_TYPES = ("FLAT", "HNSW", "IVF_FLAT", "IVF_PQ", "IVF_SQ8", "BIN_SIGN", "BIN_ITQ")
+INDEX_TYPE_ALIASES = {"SQ8": "IVF_SQ8", "BRUTE_FORCE": "FLAT", "BINARY": "BIN_SIGN", "ITQ": "BIN_ITQ"}
+# Hamming scan over packed sign bits, float rerank of limit * rerank candidates
+BINARY_INDEX_TYPES = ("BIN_SIGN", "BIN_ITQ")
+# Precision of the vectors kept in RAM for search; reduced modes rerank at float32
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+
+class LocalVectorDB:
+    """
+    In-process vector engine over a dense FAISS .bin dump (data/index/dense/<collection>.bin).
+
+    Mirrors the search API of MilvusVectorDB so it can stand in for a collection locally.
+    Vectors are sharded by dataset batch (L21, L22, ...) exactly like the Milvus partitions,
+    so `partitions=` prunes the search to a fraction of the data and shards can be
+    loaded / released independently.
+
+    index_type "FLAT" is exact NumPy search; the other types build a FAISS ANN index per shard
+    with the same parameters Milvus takes (M / efConstruction, nlist, m) and honour
+    ef / nprobe at search time.
+
+    storage_dtype "float16" / "int8" keeps the searched vectors at 1/2 or 1/4 of the float32 size
+    (FLAT: NumPy arrays; HNSW / IVF_FLAT: FAISS scalar-quantized storage, IndexHNSWSQ or
+    IVF{nlist},SQfp16 / SQ8) and reranks the top `limit * rerank_factor` candidates per shard at
+    full precision, read on demand from the memory-mapped FAISS file. Shards with an ANN index keep
+    no separate vector array: the index holds the only copy.
+
+    index_type "BIN_SIGN" / "BIN_ITQ" keeps only packed sign bits per vector in RAM (d / 8 bytes,
+    192 for siglip2), centered or ITQ-rotated (index_params "nbits" shortens ITQ codes). A popcount
+    Hamming scan picks `limit * rerank` candidates (search_params "rerank", default index_params
+    "rerank" or 10), which are rescored with float vectors from the memory-mapped file.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        faiss_file_path: Optional[str] = None,
+        distance: str = "COSINE",  # one of: "COSINE", "IP", "L2"
+        partition_by_batch: bool = True,
+        index_type: str = "FLAT",
+        index_params: Optional[Dict] = None,  # e.g. {"M": 32, "efConstruction": 200} or {"nlist": 1024, "m": 64}
+        storage_dtype: str = "float32",  # "float32", "float16" or "int8"
+        rerank_factor: int = 4,  # candidates reranked at full precision = limit * rerank_factor
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.collection_name = collection_name
+        self.faiss_file_path = faiss_file_path
+        self.distance = (distance or "COSINE").upper()
+        self.partition_by_batch = partition_by_batch
+        self.index_type = self._normalize_index_type(index_type)
+        self.index_params: Dict = dict(index_params or {})
+        self.storage_dtype = (storage_dtype or "float32").lower()
+        if self.storage_dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported storage dtype: {storage_dtype} (expected one of {STORAGE_DTYPES})")
+        self.rerank_factor = max(1, int(rerank_factor))
+        self.vector_size: Optional[int] = None
+        # partition name -> {"ids": int64 (n,), "index": Optional[faiss.Index],
+        #                    "vectors": float32 / float16 / int8 (n, d) for FLAT only, "sq8": (vmin, scale) for int8,
+        #                    "bin": packed codes for BIN_*, "full": float32 rerank rows when there is no file to map}
+        self._shards: Dict[str, Dict] = {}
+        # Memory-mapped source of full-precision vectors for reranking (set by load())
+        self._full_index: Optional[faiss.Index] = None
+
+    @staticmethod
+    def _normalize_index_type(index_type: Optional[str]) -> str:
+        name = (index_type or "FLAT").upper()
+        name = INDEX_TYPE_ALIASES.get(name, name)
+        if name not in INDEX_TYPES:
+            raise ValueError(f"Unsupported local index type: {index_type} (expected one of {INDEX_TYPES})")
+        return name
+
+    # ----- Loading ----- #
+    def _read_index(self) -> faiss.Index:
+        if not self.faiss_file_path or not os.path.exists(self.faiss_file_path):
+            raise FileNotFoundError(f"FAISS file not found: {self.faiss_file_path}")
+        try:
+            # Flat indexes can be memory-mapped instead of copied into RAM
+            return faiss.read_index(self.faiss_file_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            return faiss.read_index(self.faiss_file_path)
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.distance == "COSINE":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+        return vectors
+
+    def load(self, partitions: Optional[List[str]] = None, chunk_size: int = 100_000) -> bool:
+        """Load all shards, or only the given batches, from the FAISS file."""
+        try:
+            index = self._read_index()
+            self.vector_size = int(index.d)
+            wanted = set(normalize_partitions(partitions) or [])
+            id_to_batch = load_id_to_batch() if self.partition_by_batch else {}
+
+            total = int(index.ntotal)
+            all_ids = np.arange(total, dtype=np.int64)
+            if id_to_batch:
+                labels = np.array([id_to_batch.get(i, DEFAULT_PARTITION) for i in range(total)], dtype=object)
+            else:
+                labels = np.full(total, DEFAULT_PARTITION, dtype=object)
+
+            for name in sorted(set(labels.tolist())):
+                if wanted and name not in wanted:
+                    continue
+                ids = all_ids[labels == name]
+                vectors = np.empty((len(ids), index.d), dtype=np.float32)
+                for s in range(0, len(ids), chunk_size):
+                    chunk = ids[s:s + chunk_size]
+                    # Batch ids are contiguous in practice; fall back to per-id reconstruct otherwise
+                    if chunk[-1] - chunk[0] + 1 == len(chunk):
+                        vectors[s:s + len(chunk)] = index.reconstruct_n(int(chunk[0]), len(chunk))
+                    else:
+                        for k, pid in enumerate(chunk):
+                            vectors[s + k] = index.reconstruct(int(pid))
+                prepared = self._prepare(vectors)
+                del vectors
+                self._shards[name] = self._make_shard(ids, prepared)
+
+            if self.storage_dtype != "float32" or self.index_type != "FLAT":
+                # Rerank rows / index rebuilds read from the mapped file
+                self._full_index = index
+
+            self.logger.info(
+                f"Loaded {self.collection_name}: {sum(len(s['ids']) for s in self._shards.values())} vectors "
+                f"in {len(self._shards)} shards"
+            )
+            return True
+        except Exception as e:
+            self.logger.error(f"LocalVectorDB.load error: {e}")
+            return False
+
+    def add_vectors(self, ids: np.ndarray, vectors: np.ndarray, partition: str = DEFAULT_PARTITION) -> None:
+        """Register an in-memory shard (used by offline tools and benchmarks)."""
+        vectors = self._prepare(vectors)
+        self.vector_size = int(vectors.shape[1])
+        self._shards[partition] = self._make_shard(np.asarray(ids, dtype=np.int64), vectors, keep_full=True)
+
+    def _make_shard(self, ids: np.ndarray, vectors: np.ndarray, keep_full: bool = False) -> Dict:
+        """
+        Build the ANN index (at the configured storage precision) from float32. Only FLAT shards keep
+        a vector array of their own; binary shards keep codes, ANN shards only the index.
+        """
+        shard: Dict = {"ids": ids, "index": self._build_shard_index(vectors)}
+        reduced = self.storage_dtype != "float32"
+        if self.index_type in BINARY_INDEX_TYPES:
+            shard["bin"] = self._build_binary_codes(vectors)
+            # Only the codes stay resident; candidates are reranked from the mapped file (or "full")
+            if keep_full:
+                shard["full"] = vectors
+            return shard
+        if shard["index"] is not None:
+            if keep_full and reduced:
+                shard["full"] = vectors
+            return shard
+        if self.storage_dtype == "float16":
+            shard["vectors"] = vectors.astype(np.float16)
+        elif self.storage_dtype == "int8":
+            codes, vmin, scale = quantize_sq8(vectors)
+            shard["vectors"], shard["sq8"] = codes, (vmin, scale)
+        else:
+            shard["vectors"] = vectors
+        if keep_full and reduced:
+            # No file to map back to (offline tools / benchmarks): keep the float32 rows for reranking
+            shard["full"] = vectors
+        return shard
+
+    def _all_vectors(self, shard: Dict) -> np.ndarray:
+        """Every float32 row of a shard, whatever form it is kept in."""
+        if "full" in shard:
+            return shard["full"]
+        n = len(shard["ids"])
+        if "vectors" in shard:
+            return self._decode(shard, 0, n)
+        if self._full_index is not None:
+            return self._full_vectors(shard, np.arange(n))
+        # In-memory shard with only an ANN index: decode its storage (exact for Flat, approximate for SQ / PQ)
+        index = shard.get("index")
+        if index is None:
+            return np.empty((0, self.vector_size or 0), dtype=np.float32)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        return index.reconstruct_n(0, index.ntotal)
+
+    def _decode(self, shard: Dict, start: int, stop: int) -> np.ndarray:
+        block = shard["vectors"][start:stop]
+        if "sq8" in shard:
+            return dequantize_sq8(block, *shard["sq8"])
+        return block.astype(np.float32, copy=False)
+
+    # ----- ANN indexes ----- #
+    def _faiss_metric(self) -> int:
+        return faiss.METRIC_L2 if self.distance == "L2" else faiss.METRIC_INNER_PRODUCT
+
+    def _build_binary_codes(self, vectors: np.ndarray) -> Dict:
+        """Packed sign codes of a shard, with the centering mean and ITQ projection needed for queries."""
+        if vectors.shape[0] == 0:
+            return {"codes": np.empty((0, (vectors.shape[1] + 7) // 8), dtype=np.uint8), "mean": None, "projection": None}
+        params = self.index_params
+        if self.index_type == "BIN_ITQ":
+            n = vectors.shape[0]
+            train_size = min(n, int(params.get("train_size", 100_000)))
+            train = vectors if train_size >= n else vectors[np.random.default_rng(0).choice(n, train_size, replace=False)]
+            mean, projection = train_itq(train, params.get("nbits"), int(params.get("itq_iter", 50)))
+        else:
+            mean, projection = vectors.mean(axis=0).astype(np.float32), None
+        return {"codes": binary_codes(vectors, mean, projection), "mean": mean, "projection": projection}
+
+    def _build_shard_index(self, vectors: np.ndarray) -> Optional[faiss.Index]:
+        if self.index_type in ("FLAT",) + BINARY_INDEX_TYPES or vectors.shape[0] == 0:
+            return None
+        n, d = vectors.shape
+        metric = self._faiss_metric()
+        params = self.index_params
+
+        if self.index_type == "HNSW":
+            M = int(params.get("M", 16))
+            if self.storage_dtype == "float32":
+                index = faiss.IndexHNSWFlat(d, M, metric)
+            else:
+                qtype = faiss.ScalarQuantizer.QT_fp16 if self.storage_dtype == "float16" else faiss.ScalarQuantizer.QT_8bit
+                index = faiss.IndexHNSWSQ(d, qtype, M, metric)
+                index.train(vectors)
+            index.hnsw.efConstruction = int(params.get("efConstruction", 200))
+            index.add(vectors)
+            return index
+
+        # IVF family: keep at least ~39 training points per centroid (FAISS guideline)
+        nlist = max(1, min(int(params.get("nlist", 1024)), n // 39 or 1))
+        if self.index_type == "IVF_FLAT":
+            codec = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}[self.storage_dtype]
+            factory = f"IVF{nlist},{codec}"
+        elif self.index_type == "IVF_SQ8":
+            factory = f"IVF{nlist},SQ8"
+        else:
+            m = int(params.get("m", 64))
+            if d % m != 0:
+                raise ValueError(f"IVF_PQ m={m} must divide dim={d}")
+            factory = f"IVF{nlist},PQ{m}x{int(params.get('nbits', 8))}"
+        index = faiss.index_factory(d, factory, metric)
+        train_size = min(n, int(params.get("train_size", max(nlist * 64, 50_000))))
+        train = vectors if train_size >= n else vectors[np.random.default_rng(0).choice(n, train_size, replace=False)]
+        index.train(train)
+        index.add(vectors)
+        return index
+
+    def build_index(self, index_type: Optional[str] = None, index_params: Optional[Dict] = None) -> bool:
+        """(Re)build the ANN index of every loaded shard."""
+        try:
+            if index_type is not None:
+                self.index_type = self._normalize_index_type(index_type)
+            if index_params is not None:
+                self.index_params = dict(index_params)
+            for name, shard in list(self._shards.items()):
+                self._shards[name] = self._make_shard(shard["ids"], self._all_vectors(shard), keep_full="full" in shard)
+            return True
+        except Exception as e:
+            self.logger.error(f"LocalVectorDB.build_index error: {e}")
+            return False
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate resident size of every array the shards hold: ids, vectors, binary codes, ANN
+        indexes and in-memory float32 rerank rows ("full", add_vectors only). Rows read from the
+        memory-mapped file are not counted.
+        """
+        total = 0
+        for shard in self._shards.values():
+            total += shard["ids"].nbytes
+            for key in ("vectors", "full"):
+                if key in shard:
+                    total += shard[key].nbytes
+            if "sq8" in shard:
+                total += sum(np.asarray(a).nbytes for a in shard["sq8"])
+            if "bin" in shard:
+                total += sum(a.nbytes for a in shard["bin"].values() if a is not None)
+            if shard.get("index") is not None:
+                # ANN indexes keep their own (possibly scalar-quantized) copy / codes of the vectors
+                total += int(faiss.serialize_index(shard["index"]).nbytes)
+        return total
+
+    def rerank_rows_bytes(self) -> int:
+        """Part of memory_bytes() that is in-memory float32 rerank rows (served from the mapped file once loaded)."""
+        return sum(shard["full"].nbytes for shard in self._shards.values() if "full" in shard)
+
+    # ----- Partitions ----- #
+    def list_partitions(self) -> List[str]:
+        return sorted(self._shards.keys())
+
+    def load_partitions(self, partitions: List[str]) -> bool:
+        names = [p for p in (normalize_partitions(partitions) or []) if p not in self._shards]
+        if not names:
+            return True
+        return self.load(partitions=names)
+
+    def release_partitions(self, partitions: List[str]) -> bool:
+        for name in normalize_partitions(partitions) or []:
+            self._shards.pop(name, None)
+        return True
+
+    # ----- Search ----- #
+    def _faiss_search_params(self, search_params: Optional[Dict], limit: int):
+        search_params = search_params or {}
+        if self.index_type == "HNSW":
+            ef = int(search_params.get("ef") or max(limit * 2, 150))
+            return faiss.SearchParametersHNSW(efSearch=max(ef, limit))
+        if self.index_type.startswith("IVF"):
+            return faiss.SearchParametersIVF(nprobe=int(search_params.get("nprobe") or 16))
+        return None
+
+    def _score(self, vectors: np.ndarray, qv: np.ndarray) -> np.ndarray:
+        if self.distance == "L2":
+            return -np.sum((vectors - qv) ** 2, axis=1)
+        return vectors @ qv
+
+    def _flat_scores(self, shard: Dict, qv: np.ndarray, block: int = 65536) -> np.ndarray:
+        if self.storage_dtype == "float32":
+            return self._score(shard["vectors"], qv)
+        # Decode reduced-precision rows block by block so no full float32 copy is materialised
+        n = shard["vectors"].shape[0]
+        scores = np.empty(n, dtype=np.float32)
+        for s in range(0, n, block):
+            scores[s:s + block] = self._score(self._decode(shard, s, s + block), qv)
+        return scores
+
+    def _full_vectors(self, shard: Dict, pos: np.ndarray) -> np.ndarray:
+        if "full" in shard:
+            return shard["full"][pos]
+        ids = shard["ids"][pos]
+        if self._full_index is None:
+            if "vectors" not in shard:
+                return self._all_vectors(shard)[pos]
+            rows = shard["vectors"][pos]  # nothing to rerank against: fall back to the stored precision
+            return dequantize_sq8(rows, *shard["sq8"]) if "sq8" in shard else rows.astype(np.float32)
+        try:
+            rows = self._full_index.reconstruct_batch(ids)
+        except Exception:
+            rows = np.stack([self._full_index.reconstruct(int(i)) for i in ids]) if len(ids) else np.empty((0, self.vector_size), dtype=np.float32)
+        return self._prepare(rows)
+
+    def _search_binary(self, shard: Dict, qv: np.ndarray, limit: int, search_params: Optional[Dict] = None):
+        """Hamming scan over the packed codes, then float rerank of the closest codes."""
+        codes = shard["bin"]["codes"]
+        if codes.shape[0] == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rerank = int((search_params or {}).get("rerank") or self.index_params.get("rerank", 10))
+        k = min(limit * max(1, rerank), codes.shape[0])
+        dist = hamming_distances(codes, binary_codes(qv, shard["bin"]["mean"], shard["bin"]["projection"]))
+        pos = np.argpartition(dist, k - 1)[:k]
+        scores = self._score(self._full_vectors(shard, pos), qv)
+        top = np.argpartition(-scores, min(limit, len(pos)) - 1)[:limit]
+        return shard["ids"][pos[top]], scores[top]
+
+    def _search_shard(self, shard: Dict, qv: np.ndarray, limit: int, search_params: Optional[Dict] = None):
+        if "bin" in shard:
+            return self._search_binary(shard, qv, limit, search_params)
+        reduced = self.storage_dtype != "float32"
+        k_cand = limit * self.rerank_factor if reduced else limit
+        index = shard.get("index")
+        if index is not None:
+            k = min(k_cand, index.ntotal)
+            dist, idx = index.search(qv.reshape(1, -1), k, params=self._faiss_search_params(search_params, k))
+            keep = idx[0] >= 0
+            pos, scores = idx[0][keep], dist[0][keep]
+            if self.distance == "L2":
+                scores = -scores
+        else:
+            if shard["vectors"].shape[0] == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            all_scores = self._flat_scores(shard, qv)
+            k = min(k_cand, all_scores.shape[0])
+            pos = np.argpartition(-all_scores, k - 1)[:k]
+            scores = all_scores[pos]
+
+        if reduced and len(pos):
+            # Rerank the candidates at full precision, then keep the top `limit`
+            scores = self._score(self._full_vectors(shard, pos), qv)
+            top = np.argpartition(-scores, min(limit, len(pos)) - 1)[:limit]
+            pos, scores = pos[top], scores[top]
+        return shard["ids"][pos], scores
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = False,
+        partitions: Optional[List[str]] = None,
+        search_params: Optional[Dict] = None,  # {"ef": ...} for HNSW, {"nprobe": ...} for IVF_*
+        deadline: Optional[float] = None,  # used to pick ef / nprobe when search_params is not given
+    ) -> List[Dict]:
+        try:
+            names = normalize_partitions(partitions)
+            shards = [self._shards[n] for n in names if n in self._shards] if names else list(self._shards.values())
+            if not shards or limit <= 0:
+                return []
+
+            qv = self._prepare(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+            choice = search_param_controller.choose(self.collection_name, limit, deadline=deadline, index_type=self.index_type)
+            if search_params is not None:
+                # Explicit settings (benchmarks) are reported but kept out of the latency curve
+                choice.params, choice.level, choice.name, choice.reason = dict(search_params), -1, "explicit", "explicit"
+            ids_parts, score_parts = [], []
+            with search_param_controller.track(choice):
+                for shard in shards:
+                    ids, scores = self._search_shard(shard, qv, int(limit), choice.params)
+                    ids_parts.append(ids)
+                    score_parts.append(scores)
+
+            ids = np.concatenate(ids_parts)
+            scores = np.concatenate(score_parts)
+            order = np.argsort(-scores)[:int(limit)]
+            out: List[Dict] = []
+            for i in order:
+                # Report L2 as a distance (smaller is better), same as Milvus
+                score = float(-scores[i]) if self.distance == "L2" else float(scores[i])
+                out.append({"id": int(ids[i]), "score": score, "payload": None})
+            return out
+        except Exception as e:
+            self.logger.error(f"LocalVectorDB.search error: {e}")
+            return []
+
+    def close(self):
+        self._shards.clear()
+        self._full_index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
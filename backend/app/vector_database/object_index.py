@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+# Object / color bitmaps: one sorted keyframe id array per "<name>", "<name>#<n>" (at least n),
+# "<name>|<color>" and "<name>|<color>#<n>", stored CSR-style in data/index/object/objects.npz.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+SPARSE_DIR = os.path.abspath(os.getenv("SPARSE_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "sparse")))
+OBJECT_DIR = os.path.abspath(os.getenv("OBJECT_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "object")))
+MAX_COUNT = 5  # "at least n" bitmaps are kept up to this count; larger asks use it
+
+ObjectFilter = Union[str, List[Dict]]
+
+
+def _key(name: str, color: Optional[str] = None, count: int = 1) -> str:
+    key = name.strip().lower()
+    if color:
+        key += f"|{color.strip().lower()}"
+    count = min(int(count or 1), MAX_COUNT)
+    return f"{key}#{count}" if count > 1 else key
+
+
+def _objects(value) -> List[Dict]:
+    if isinstance(value, dict):
+        value = value.get("objects", [])
+    out = []
+    for o in value or []:
+        if isinstance(o, dict):
+            out.append({"name": o.get("name"), "color": o.get("color")})
+        elif isinstance(o, (list, tuple)) and o:
+            out.append({"name": o[0], "color": o[1] if len(o) > 1 else None})
+    return [o for o in out if o["name"]]
+
+
+# ----- Offline build ----- #
+def build_object_index(paths: Iterable[str], out_dir: str = OBJECT_DIR) -> str:
+    """One bitmap per (name[, color][, count]) key over every object file; returns the .npz path."""
+    postings: Dict[str, List[int]] = {}
+    docs = 0
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f) if path.endswith(".json") else {
+                str(obj.get("_id") or obj.get("id")): obj for obj in (json.loads(line) for line in f if line.strip())
+            }
+        for key, value in raw.items():
+            try:
+                kid = int(key)
+            except (TypeError, ValueError):
+                continue
+            docs += 1
+            counts: Counter = Counter()
+            for o in _objects(value):
+                counts[(str(o["name"]).lower(), None)] += 1
+                if o["color"]:
+                    counts[(str(o["name"]).lower(), str(o["color"]).lower())] += 1
+            for (name, color), n in counts.items():
+                for c in range(1, min(n, MAX_COUNT) + 1):
+                    postings.setdefault(_key(name, color, c), []).append(kid)
+
+    keys = np.array(sorted(postings), dtype=str)
+    arrays = [np.unique(np.asarray(postings[k], dtype=np.uint32)) for k in keys.tolist()]
+    indptr = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=indptr[1:])
+    ids = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint32)
+    os.makedirs(out_dir, exist_ok=True)
+    out = os.path.join(out_dir, "objects.npz")
+    np.savez(out, keys=keys, indptr=indptr, ids=ids)
+    print(f"[Objects] {docs} keyframes, {len(keys)} bitmaps, {len(ids)} ids -> {out}")
+    return out
+
+
+# ----- Runtime ----- #
+class ObjectIndex:
+    def __init__(self, object_dir: str = OBJECT_DIR):
+        self.object_dir = object_dir
+        self._data: Optional[Dict[str, np.ndarray]] = None
+        self._key_pos: Dict[str, int] = {}
+        self._colors: set = set()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    path = os.path.join(self.object_dir, "objects.npz")
+                    data: Dict[str, np.ndarray] = {}
+                    if os.path.exists(path):
+                        try:
+                            npz = np.load(path, allow_pickle=False)
+                            data = {k: npz[k] for k in ("keys", "indptr", "ids")}
+                        except Exception as e:
+                            print(f"[Objects] Failed to load {path}: {e}")
+                    keys = data.get("keys", np.empty(0, dtype=str)).tolist()
+                    self._key_pos = {k: i for i, k in enumerate(keys)}
+                    self._colors = {k.split("|", 1)[1].split("#", 1)[0] for k in keys if "|" in k}
+                    self._data = data
+        return self._data or None
+
+    def available(self) -> bool:
+        return self._load() is not None
+
+    def bitmap(self, name: str, color: Optional[str] = None, count: int = 1) -> np.ndarray:
+        data = self._load()
+        pos = self._key_pos.get(_key(name, color, count)) if data else None
+        if pos is None:
+            return np.empty(0, dtype=np.uint32)
+        return data["ids"][data["indptr"][pos]:data["indptr"][pos + 1]]
+
+    def parse(self, text: str) -> List[Dict]:
+        """'2 person, red car' -> [{"name": "person", "count": 2}, {"name": "car", "color": "red"}]."""
+        self._load()
+        filters = []
+        for part in re.split(r"[,+;]|\band\b", text.lower()):
+            count, color, name = 1, None, []
+            for tok in part.split():
+                if tok.isdigit():
+                    count = int(tok)
+                elif tok in self._colors and color is None:
+                    color = tok
+                else:
+                    name.append(tok)
+            if name:
+                filters.append({"name": " ".join(name), "color": color, "count": count})
+        return filters
+
+    def match(self, filters: ObjectFilter) -> np.ndarray:
+        """Sorted keyframe ids satisfying every filter (intersection, smallest bitmap first)."""
+        if isinstance(filters, str):
+            filters = self.parse(filters)
+        bitmaps = [self.bitmap(f.get("name", ""), f.get("color"), f.get("count", 1)) for f in filters if f.get("name")]
+        if not bitmaps:
+            return np.empty(0, dtype=np.uint32)
+        bitmaps.sort(key=len)
+        out = bitmaps[0]
+        for b in bitmaps[1:]:
+            if len(out) == 0:
+                break
+            out = np.intersect1d(out, b, assume_unique=True)
+        return out
+
+
+# Global instance for easy access
+object_index = ObjectIndex()
+
+
+def filter_hits(hits: Optional[List[Dict]], allowed: Optional[np.ndarray]) -> Optional[List[Dict]]:
+    """Keep the hits whose id is in the sorted id set (None = no filter)."""
+    if allowed is None or not hits:
+        return hits
+    ids = np.asarray([int(h["id"]) if h.get("id") is not None else -1 for h in hits], dtype=np.int64)
+    at = np.minimum(np.searchsorted(allowed, ids), max(len(allowed) - 1, 0))
+    keep = (allowed[at] == ids) if len(allowed) else np.zeros(len(ids), dtype=bool)
+    return [h for h, k in zip(hits, keep) if k]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build (or query) the object / color bitmap index")
+    parser.add_argument("--folder", default=SPARSE_DIR, help="Folder with object*.json / .jsonl files")
+    parser.add_argument("--query", help="e.g. '2 person, red car': print the matching keyframe count and a few ids")
+    args = parser.parse_args(argv)
+
+    if args.query:
+        ids = object_index.match(args.query)
+        print(f"{object_index.parse(args.query)} -> {len(ids)} keyframes: {ids[:20].tolist()}")
+        return
+    paths = sorted(p for ext in ("json", "jsonl", "ndjson") for p in glob.glob(os.path.join(args.folder, f"object*.{ext}")))
+    if not paths:
+        raise SystemExit(f"No object*.json files in {args.folder}")
+    build_object_index(paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import json
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# Keyframe ids follow dataset batches: "L21_V001/keyframe_0.webp" -> batch "L21".
+# Each batch becomes its own Milvus partition / local-engine shard.
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+PATH_KEYFRAME_FILE = PROJECT_ROOT / "data" / "metadata" / "path_keyframe.json"
+DEFAULT_PARTITION = "_default"
+
+_ID_TO_BATCH: Optional[Dict[int, str]] = None
+
+
+def batch_from_video(video_id: Optional[str]) -> Optional[str]:
+    """'L21_V001' -> 'L21'. Bare batch names ('L21') are returned unchanged."""
+    if not video_id:
+        return None
+    token = str(video_id).strip().strip("/")
+    if not token:
+        return None
+    batch = token.split("_", 1)[0]
+    # Milvus partition names: letters, digits and underscores, not starting with a digit
+    if not batch or batch[0].isdigit() or not batch.replace("_", "").isalnum():
+        return None
+    return batch
+
+
+def batch_from_path(path: Optional[str]) -> Optional[str]:
+    """Extract the batch prefix from a keyframe path like '../../data/keyframe/L21_V001/keyframe_0.webp'."""
+    if not path:
+        return None
+    parts = str(path).replace("\\", "/").split("/")
+    if "keyframe" in parts:
+        idx = parts.index("keyframe")
+        folder = parts[idx + 1] if idx + 1 < len(parts) else None
+    else:
+        folder = parts[-2] if len(parts) >= 2 else None
+    return batch_from_video(folder)
+
+
+def load_id_to_batch(path: Optional[str] = None) -> Dict[int, str]:
+    """Load (and cache) keyframe id -> batch prefix from path_keyframe.json."""
+    global _ID_TO_BATCH
+    if _ID_TO_BATCH is not None and path is None:
+        return _ID_TO_BATCH
+
+    mapping: Dict[int, str] = {}
+    metadata_path = Path(path) if path else PATH_KEYFRAME_FILE
+    try:
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except Exception as e:
+        print(f"[Partitions] Failed to load {metadata_path}: {e}")
+        raw = {}
+
+    items = raw.items() if isinstance(raw, dict) else enumerate(raw)
+    for key, entry in items:
+        path_str = entry if isinstance(entry, str) else (entry or {}).get("path")
+        batch = batch_from_path(path_str)
+        if batch is None:
+            continue
+        try:
+            mapping[int(key)] = batch
+        except (TypeError, ValueError):
+            continue
+
+    if path is None:
+        _ID_TO_BATCH = mapping
+    return mapping
+
+
+def partition_for_id(entity_id: int, id_to_batch: Optional[Dict[int, str]] = None) -> str:
+    mapping = id_to_batch if id_to_batch is not None else load_id_to_batch()
+    return mapping.get(int(entity_id), DEFAULT_PARTITION)
+
+
+def normalize_partitions(partitions: Optional[Iterable[str]]) -> Optional[List[str]]:
+    """
+    Normalize a user supplied partition list.
+    Accepts batch names ('L21') or video ids ('L21_V001'); returns None for "search everything".
+    """
+    if not partitions:
+        return None
+    if isinstance(partitions, str):
+        partitions = partitions.split(",")
+    out: List[str] = []
+    for p in partitions:
+        batch = batch_from_video(p)
+        if batch and batch not in out:
+            out.append(batch)
+    return out or None
+
+
+def filter_by_partitions(results: List[Dict], partitions: Optional[List[str]]) -> List[Dict]:
+    """Post-filter id/score results (e.g. from Elasticsearch) to the requested batches."""
+    if not partitions or not results:
+        return results
+    allowed = set(partitions)
+    mapping = load_id_to_batch()
+    return [r for r in results if mapping.get(int(r.get("id", -1))) in allowed]
+
+
+MAX_OVERFETCH_SIZE = 10000  # Elasticsearch's default index.max_result_window
+
+
+def overfetch_size(size: int, partitions: Optional[List[str]], margin: float = 1.5) -> int:
+    """
+    Hits to request from an index that cannot filter by batch (Elasticsearch, trigram index) so that
+    about `size` survive filter_by_partitions: size scaled by the inverse of the batches' share of
+    all keyframes, with some margin.
+    """
+    if not partitions:
+        return int(size)
+    mapping = load_id_to_batch()
+    allowed = set(partitions)
+    share = sum(1 for b in mapping.values() if b in allowed) / len(mapping) if mapping else 0.0
+    if share <= 0.0:
+        return int(size)
+    return min(MAX_OVERFETCH_SIZE, max(int(size), math.ceil(size * margin / share)))
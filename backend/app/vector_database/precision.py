@@ -0,0 +1,167 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import ml_dtypes  # numpy bfloat16 dtype; pymilvus accepts these arrays directly
+except ImportError:
+    ml_dtypes = None
+
+# Vectors go to Milvus in the collection's own type (FLOAT / FLOAT16 / BFLOAT16); int8 and sign codes
+# are for LocalVectorDB.
+
+# Canonical storage names (match pymilvus DataType names without the _VECTOR suffix)
+VECTOR_DTYPES = ("FLOAT", "FLOAT16", "BFLOAT16")
+VECTOR_DTYPE_ALIASES = {
+    "FLOAT32": "FLOAT", "FP32": "FLOAT", "FLOAT_VECTOR": "FLOAT",
+    "FP16": "FLOAT16", "HALF": "FLOAT16", "FLOAT16_VECTOR": "FLOAT16",
+    "BF16": "BFLOAT16", "BFLOAT16_VECTOR": "BFLOAT16",
+}
+
+_DTYPE_CACHE: Dict[str, str] = {}
+_DTYPE_LOCK = threading.Lock()
+
+
+def normalize_vector_dtype(dtype: Optional[str]) -> str:
+    name = (dtype or "FLOAT").upper()
+    name = VECTOR_DTYPE_ALIASES.get(name, name)
+    if name not in VECTOR_DTYPES:
+        raise ValueError(f"Unsupported vector dtype: {dtype} (expected one of {VECTOR_DTYPES})")
+    return name
+
+
+def _to_bfloat16_bytes(vectors: np.ndarray) -> List[bytes]:
+    """float32 -> bfloat16 (round to nearest even) as raw little-endian bytes, one per row."""
+    bits = np.ascontiguousarray(vectors, dtype=np.float32).view(np.uint32)
+    rounded = ((bits + 0x7FFF + ((bits >> 16) & 1)) >> 16).astype("<u2")
+    return [row.tobytes() for row in rounded]
+
+
+def encode_vectors(vectors: np.ndarray, dtype: str = "FLOAT") -> List:
+    """Rows in the form pymilvus expects for a FLOAT / FLOAT16 / BFLOAT16 vector field."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    dtype = normalize_vector_dtype(dtype)
+    if dtype == "FLOAT16":
+        return list(vectors.astype(np.float16))
+    if dtype == "BFLOAT16":
+        if ml_dtypes is not None:
+            return list(vectors.astype(ml_dtypes.bfloat16))
+        return _to_bfloat16_bytes(vectors)
+    return vectors.tolist()
+
+
+def decode_vector(raw, dtype: str = "FLOAT") -> Optional[np.ndarray]:
+    """Inverse of encode_vectors for one row returned by client.query / client.get."""
+    if raw is None:
+        return None
+    if isinstance(raw, list) and len(raw) == 1 and isinstance(raw[0], (bytes, bytearray)):
+        raw = raw[0]
+    if isinstance(raw, (bytes, bytearray)):
+        dtype = normalize_vector_dtype(dtype)
+        if dtype == "BFLOAT16":
+            half = np.frombuffer(bytes(raw), dtype="<u2").astype(np.uint32)
+            return (half << 16).view(np.float32)
+        return np.frombuffer(bytes(raw), dtype="<f2").astype(np.float32)
+    return np.asarray(raw, dtype=np.float32)
+
+
+def collection_vector_dtype(client, collection_name: str, field_name: str = "vector") -> str:
+    """Storage type of a collection's vector field (cached; FLOAT when it cannot be determined)."""
+    with _DTYPE_LOCK:
+        if collection_name in _DTYPE_CACHE:
+            return _DTYPE_CACHE[collection_name]
+    dtype = "FLOAT"
+    try:
+        desc = client.describe_collection(collection_name=collection_name)
+        for field in desc.get("fields", []):
+            if field.get("name") != field_name:
+                continue
+            type_name = getattr(field.get("type"), "name", str(field.get("type"))).upper()
+            dtype = normalize_vector_dtype(type_name.split(".")[-1])
+            break
+    except Exception:
+        return dtype  # don't cache failures, retry on the next call
+    with _DTYPE_LOCK:
+        _DTYPE_CACHE[collection_name] = dtype
+    return dtype
+
+
+def query_data(client, collection_name: str, vector: np.ndarray) -> List:
+    """`data=` argument for client.search with the query converted to the collection's type."""
+    return encode_vectors(vector, collection_vector_dtype(client, collection_name))
+
+
+# ----- Scalar quantization (int8) for the local engine ----- #
+def quantize_sq8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-dimension min / max scalar quantization to int8 codes; returns (codes, vmin, scale)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.shape[0] == 0:
+        d = vectors.shape[1]
+        return np.empty((0, d), dtype=np.int8), np.zeros(d, dtype=np.float32), np.ones(d, dtype=np.float32)
+    vmin = vectors.min(axis=0)
+    scale = (vectors.max(axis=0) - vmin) / 255.0
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint((vectors - vmin) / scale) - 128, -128, 127).astype(np.int8)
+    return codes, vmin.astype(np.float32), scale.astype(np.float32)
+
+
+def dequantize_sq8(codes: np.ndarray, vmin: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    return (codes.astype(np.float32) + 128.0) * scale + vmin
+
+
+# ----- Binary codes (sign / ITQ) for the local engine's Hamming prefilter ----- #
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def train_itq(vectors: np.ndarray, nbits: Optional[int] = None, n_iter: int = 50, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Iterative quantization (Gong & Lazebnik): PCA to nbits, then the rotation that minimizes the
+    quantization error of sign(). Returns (mean, projection) with projection of shape (d, nbits).
+    """
+    x = np.asarray(vectors, dtype=np.float32)
+    nbits = int(nbits or x.shape[1])
+    mean = x.mean(axis=0)
+    x = x - mean
+    eigvals, eigvecs = np.linalg.eigh(np.cov(x, rowvar=False))
+    pca = eigvecs[:, np.argsort(eigvals)[::-1][:nbits]].astype(np.float32)
+    v = x @ pca
+    rng = np.random.default_rng(seed)
+    rotation, _ = np.linalg.qr(rng.standard_normal((nbits, nbits)).astype(np.float32))
+    for _ in range(n_iter):
+        b = np.where(v @ rotation >= 0, 1.0, -1.0).astype(np.float32)
+        u, _, wt = np.linalg.svd(v.T @ b)
+        rotation = (u @ wt).astype(np.float32)
+    return mean.astype(np.float32), (pca @ rotation).astype(np.float32)
+
+
+def binary_codes(vectors: np.ndarray, mean: Optional[np.ndarray] = None, projection: Optional[np.ndarray] = None) -> np.ndarray:
+    """Sign bits of (optionally centered / projected) rows, packed 8 per byte: (n, nbits / 8) uint8."""
+    x = np.asarray(vectors, dtype=np.float32)
+    single = x.ndim == 1
+    x = x.reshape(1, -1) if single else x
+    if mean is not None:
+        x = x - mean
+    if projection is not None:
+        x = x @ projection
+    codes = np.packbits(x > 0, axis=1)
+    return codes[0] if single else codes
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray, block: int = 65536) -> np.ndarray:
+    """Hamming distance of every packed code to the query, vectorized popcount block by block."""
+    n, nbytes = codes.shape
+    out = np.empty(n, dtype=np.uint16)
+    # 64-bit words with a native popcount when NumPy has one (2.0+), else a byte lookup table
+    wide = nbytes % 8 == 0 and hasattr(np, "bitwise_count") and codes.flags["C_CONTIGUOUS"]
+    q = np.ascontiguousarray(query_code, dtype=np.uint8)
+    q64 = q.view(np.uint64) if wide else None
+    for s in range(0, n, block):
+        blk = codes[s:s + block]
+        if wide:
+            out[s:s + block] = np.bitwise_count(np.bitwise_xor(blk.view(np.uint64), q64)).sum(axis=1, dtype=np.uint16)
+        else:
+            out[s:s + block] = _POPCOUNT8[np.bitwise_xor(blk, q)].sum(axis=1, dtype=np.uint16)
+    return out
@@ -0,0 +1,227 @@
+import os
+import sys
+import argparse
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # only needed to build the side collections
+    faiss = None
+
+# PCA / truncated side collections <name>_d<dim> for first-stage ANN, rescored at full dimension.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.vector_database.partitions import normalize_partitions
+from app.vector_database.precision import query_data
+from app.vector_database.search_params import search_param_controller
+from app.vector_database.vector_fetch import DENSE_DIR, exact_topk, fetch_vectors
+from app.vector_database.dedup import expand_hits
+
+try:
+    from app.config.settings import REDUCED_INDEX, REDUCED_RERANK_FACTOR
+except ImportError:
+    REDUCED_INDEX, REDUCED_RERANK_FACTOR = "", 4
+
+REDUCED_DIR = os.path.abspath(os.getenv("REDUCED_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "reduced")))
+PROJECTION_METHODS = ("pca", "truncate")
+
+
+def reduced_collection_name(collection_name: str, dim: int) -> str:
+    return f"{collection_name}_d{int(dim)}"
+
+
+def parse_reduced_config(spec: Optional[str]) -> Dict[str, int]:
+    """'siglip2:256,bigg14_datacomp:256' -> {"siglip2": 256, "bigg14_datacomp": 256}."""
+    out: Dict[str, int] = {}
+    for part in (spec or "").split(","):
+        name, _, dim = part.strip().partition(":")
+        if name and dim.strip().isdigit():
+            out[name.strip()] = int(dim)
+    return out
+
+
+@dataclass
+class Projection:
+    method: str
+    mean: np.ndarray        # (D,)
+    components: np.ndarray  # (dim, D)
+
+    @property
+    def dim(self) -> int:
+        return int(self.components.shape[0])
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        """Project rows (or one vector) and L2-normalize, ready for a COSINE index."""
+        x = np.asarray(vectors, dtype=np.float32)
+        single = x.ndim == 1
+        x = (x.reshape(1, -1) if single else x) - self.mean
+        y = x @ self.components.T
+        y /= np.maximum(np.linalg.norm(y, axis=1, keepdims=True), 1e-12)
+        return y[0] if single else y
+
+    def save(self, path: str) -> None:
+        np.savez(path, method=self.method, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        data = np.load(path)
+        return cls(str(data["method"]), data["mean"].astype(np.float32), data["components"].astype(np.float32))
+
+
+def fit_projection(vectors: np.ndarray, dim: int, method: str = "pca") -> Projection:
+    """PCA on L2-normalized rows, or truncation to the first `dim` dimensions."""
+    x = np.asarray(vectors, dtype=np.float32)
+    x = x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+    d = x.shape[1]
+    if not 0 < dim < d:
+        raise ValueError(f"dim must be in (0, {d}), got {dim}")
+    if method == "truncate":
+        return Projection(method, np.zeros(d, dtype=np.float32), np.eye(d, dtype=np.float32)[:dim])
+    if method != "pca":
+        raise ValueError(f"Unknown projection method: {method} (expected one of {PROJECTION_METHODS})")
+    mean = x.mean(axis=0)
+    # Eigenvectors of the covariance; cheaper than an SVD of the sample for D <= ~2k
+    cov = np.cov(x - mean, rowvar=False)
+    eigvals, eigvecs = np.linalg.eigh(cov)
+    order = np.argsort(eigvals)[::-1][:dim]
+    return Projection(method, mean.astype(np.float32), eigvecs[:, order].T.astype(np.float32))
+
+
+# ----- Offline build ----- #
+def build_reduced(
+    collection_name: str,
+    dim: int,
+    method: str = "pca",
+    sample: int = 200_000,
+    dense_dir: str = DENSE_DIR,
+    out_dir: str = REDUCED_DIR,
+    seed: int = 0,
+    chunk_size: int = 100_000,
+) -> str:
+    """Train the projection and write <name>_d<dim>.npz / .bin; returns the .bin path."""
+    if faiss is None:
+        raise RuntimeError("faiss is required to build reduced indexes")
+    index = faiss.read_index(os.path.join(dense_dir, f"{collection_name}.bin"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    n = int(index.ntotal)
+    rng = np.random.default_rng(seed)
+    sample_ids = np.sort(rng.choice(n, size=min(sample, n), replace=False)).astype(np.int64)
+    projection = fit_projection(index.reconstruct_batch(sample_ids), dim, method)
+
+    os.makedirs(out_dir, exist_ok=True)
+    name = reduced_collection_name(collection_name, dim)
+    projection.save(os.path.join(out_dir, f"{name}.npz"))
+    flat = faiss.IndexFlatIP(projection.dim)
+    for start in range(0, n, chunk_size):
+        flat.add(projection.apply(index.reconstruct_n(start, min(chunk_size, n - start))))
+    bin_path = os.path.join(out_dir, f"{name}.bin")
+    faiss.write_index(flat, bin_path)
+    print(f"[Reduced] {name}: {n} vectors {index.d}-d -> {projection.dim}-d ({method})")
+    return bin_path
+
+
+# ----- Online search ----- #
+class ReducedIndex:
+    """First-stage ANN on a reduced companion collection, full-dimension rerank of the candidates."""
+
+    def __init__(self, config: Optional[Dict[str, int]] = None, reduced_dir: str = REDUCED_DIR, rerank_factor: int = REDUCED_RERANK_FACTOR):
+        self.config = dict(config if config is not None else parse_reduced_config(REDUCED_INDEX))
+        self.reduced_dir = reduced_dir
+        self.rerank_factor = max(1, int(rerank_factor))
+        self._projections: Dict[str, Optional[Projection]] = {}
+        self._lock = threading.Lock()
+
+    def projection(self, collection_name: str) -> Optional[Projection]:
+        dim = self.config.get(collection_name)
+        if not dim:
+            return None
+        name = reduced_collection_name(collection_name, dim)
+        with self._lock:
+            if name in self._projections:
+                return self._projections[name]
+        projection = None
+        try:
+            projection = Projection.load(os.path.join(self.reduced_dir, f"{name}.npz"))
+        except Exception as e:
+            print(f"[Reduced] {name} not available, searching full vectors: {e}")
+        with self._lock:
+            self._projections[name] = projection
+        return projection
+
+    def enabled(self, collection_name: str) -> bool:
+        return self.projection(collection_name) is not None
+
+    def search(
+        self,
+        client,
+        collection_name: str,
+        vec: np.ndarray,
+        topk: int,
+        rerank_factor: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> Optional[List[Dict]]:
+        """[{"id", "score"}] with full-dimension scores; None when no reduced collection is configured."""
+        projection = self.projection(collection_name)
+        if projection is None:
+            return None
+        name = reduced_collection_name(collection_name, projection.dim)
+        limit = int(topk) * max(1, int(rerank_factor or self.rerank_factor))
+
+        choice = search_param_controller.choose(name, limit, deadline=deadline)
+        with search_param_controller.track(choice):
+            res = client.search(
+                collection_name=name,
+                data=query_data(client, name, projection.apply(vec)),
+                anns_field="vector",
+                limit=limit,
+                search_params=choice.to_search_params("COSINE"),
+                partition_names=normalize_partitions(partitions),
+            )
+        hits = res[0] if isinstance(res, list) else res
+        ids = [int(i) for i in (h.get("id") if isinstance(h, dict) else getattr(h, "id", None) for h in hits) if i is not None]
+        if not ids:
+            return []
+
+        # Rerank at full dimension
+        stored = fetch_vectors(collection_name, ids, client=client)
+        found = [i for i in ids if i in stored]
+        if not found:
+            return []
+        matrix = np.stack([np.asarray(stored[i], dtype=np.float32).reshape(-1) for i in found])
+        top, scores = exact_topk(matrix, vec, topk)
+        return expand_hits(collection_name, [{"id": found[j], "score": float(s)} for j, s in zip(top, scores)], topk)
+
+
+# Global instance for easy access
+reduced_index = ReducedIndex()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build a reduced-dimension companion collection for first-stage ANN")
+    parser.add_argument("collection", help="Collection name, i.e. data/index/dense/<collection>.bin")
+    parser.add_argument("--dim", type=int, required=True)
+    parser.add_argument("--method", default="pca", choices=list(PROJECTION_METHODS))
+    parser.add_argument("--sample", type=int, default=200_000, help="Vectors used to fit the PCA")
+    parser.add_argument("--no-upload", action="store_true", help="Only write the files under data/index/reduced")
+    args = parser.parse_args(argv)
+
+    bin_path = build_reduced(args.collection, args.dim, args.method, args.sample)
+    if args.no_upload:
+        return
+    from app.vector_database.index import MILVUS_URI, MILVUS_TOKEN, INDEX_TYPE
+    from app.vector_database.vector_db import MilvusVectorDB
+    name = reduced_collection_name(args.collection, args.dim)
+    with MilvusVectorDB(collection_name=name, distance="COSINE", milvus_uri=MILVUS_URI, milvus_token=MILVUS_TOKEN, index_type=INDEX_TYPE) as db:
+        # Same ids as the full collection, so partitions and id lookups line up
+        ok = db.create_collection_from_faiss(faiss_file_path=bin_path, partition_by_batch=True)
+    print(f"{'✅' if ok else '❌'} Uploaded side collection {name}")
+
+
+if __name__ == "__main__":
+    main()
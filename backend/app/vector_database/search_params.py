@@ -0,0 +1,207 @@
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from app.config.settings import SEARCH_INDEX_TYPE, SEARCH_OVERLOAD_INFLIGHT
+except ImportError:
+    SEARCH_INDEX_TYPE, SEARCH_OVERLOAD_INFLIGHT = "HNSW", 16
+
+LEVEL_NAMES = ("fast", "balanced", "accurate", "max")
+
+# Search-time knob per index family, cheapest to most accurate (one value per level)
+LADDERS: Dict[str, Tuple[str, Tuple[int, ...]]] = {
+    "HNSW": ("ef", (64, 128, 256, 512)),
+    "IVF": ("nprobe", (8, 16, 32, 64)),
+}
+BASELINE_EF = 150  # ef of requests without a deadline: max(2 * topk, BASELINE_EF), as before adaptive search
+
+
+@dataclass
+class SearchChoice:
+    collection: str
+    index_type: str
+    level: int  # index into LEVEL_NAMES, -1 when the index has nothing to tune
+    name: str
+    params: Dict[str, int]
+    reason: str
+    elapsed_ms: Optional[float] = None
+
+    def to_search_params(self, metric_type: str = "COSINE") -> Dict:
+        return {"metric_type": metric_type, "params": dict(self.params)}
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class _LatencyCurve:
+    # knob value (ef / nprobe actually used) -> EWMA latency in seconds
+    ewma: Dict[int, float] = field(default_factory=dict)
+    samples: Dict[int, int] = field(default_factory=dict)
+    choices: int = 0  # deadline-driven choices so far; drives the periodic probe of a higher level
+
+    def predict(self, value: int) -> Optional[float]:
+        """Latency ~ overhead + slope * value, least squares over the measured values."""
+        if not self.ewma:
+            return None
+        if value in self.ewma:
+            return self.ewma[value]
+        xs = list(self.ewma.keys())
+        ys = [self.ewma[x] for x in xs]
+        if len(xs) == 1:
+            # One point: a fixed round trip may dominate, so don't assume cheaper below it
+            return ys[0] * max(1.0, value / xs[0])
+        mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+        var = sum((x - mx) ** 2 for x in xs)
+        slope = max(0.0, sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var) if var > 0 else 0.0
+        overhead = max(0.0, my - slope * mx)
+        return overhead + slope * value
+
+
+class SearchParamController:
+    """
+    Picks ef / nprobe per ANN call from the requested topk, the collection's measured
+    latency curve (fixed overhead + cost per ef / nprobe) and the time left before the request deadline.
+
+    Under overload (too many ANN calls in flight) it drops to the cheapest setting; with
+    headroom it climbs to the most accurate setting that is predicted to fit the budget. Every
+    `probe_every` choices it tries one level above the prediction so the curve keeps being
+    re-measured. Requests without a deadline keep the baseline ef.
+    """
+
+    def __init__(
+        self,
+        index_type: str = SEARCH_INDEX_TYPE,
+        overload_inflight: int = SEARCH_OVERLOAD_INFLIGHT,
+        default_level: int = 1,
+        safety: float = 0.8,  # only spend this share of the remaining budget on one ANN call
+        ewma_alpha: float = 0.2,
+        probe_every: int = 50,
+    ):
+        self.index_type = (index_type or "HNSW").upper()
+        self.overload_inflight = max(1, int(overload_inflight))
+        self.default_level = default_level
+        self.safety = safety
+        self.ewma_alpha = ewma_alpha
+        self.probe_every = max(1, int(probe_every))
+
+        self._curves: Dict[Tuple[str, str], _LatencyCurve] = {}
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def _ladder(index_type: str) -> Optional[Tuple[str, Tuple[int, ...]]]:
+        if index_type.startswith("HNSW"):  # HNSW, HNSW_SQ
+            return LADDERS["HNSW"]
+        if index_type.startswith("IVF") or index_type.startswith("GPU_IVF"):
+            return LADDERS["IVF"]
+        return None  # FLAT / AUTOINDEX: nothing to tune
+
+    @staticmethod
+    def _value(knob: str, values: Tuple[int, ...], level: int, topk: int) -> int:
+        if knob == "ef":
+            return max(values[level], 2 * int(topk))  # HNSW requires ef >= limit; keep some headroom for recall
+        return values[level]
+
+    def choose(
+        self,
+        collection: str,
+        topk: int,
+        deadline: Optional[float] = None,  # time.monotonic() deadline of the request
+        index_type: Optional[str] = None,
+    ) -> SearchChoice:
+        index_type = (index_type or self.index_type).upper()
+        ladder = self._ladder(index_type)
+        if ladder is None:
+            return SearchChoice(collection, index_type, -1, "default", {}, "index has no search-time parameter")
+
+        knob, values = ladder
+        if deadline is None:
+            if knob == "ef":
+                return SearchChoice(collection, index_type, -1, "baseline", {"ef": max(2 * int(topk), BASELINE_EF)}, "no deadline")
+            return SearchChoice(collection, index_type, -1, "default", {}, "no deadline")
+        remaining = deadline - time.monotonic()
+        inflight = self._inflight
+        with self._lock:
+            curve = self._curves.setdefault((collection, index_type), _LatencyCurve())
+            curve.choices += 1
+            probe = curve.choices % self.probe_every == 0
+
+        if remaining <= 0:
+            level, reason = 0, "deadline exceeded"
+        elif inflight >= self.overload_inflight:
+            level, reason = 0, f"overload ({inflight} in flight)"
+        else:
+            budget = remaining * self.safety
+            predictions = [curve.predict(self._value(knob, values, lvl, topk)) for lvl in range(len(values))]
+            fitting = [lvl for lvl, pred in enumerate(predictions) if pred is not None and pred <= budget]
+            if fitting:
+                level, reason = max(fitting), f"fits {budget * 1000:.0f}ms budget"
+            elif any(pred is not None for pred in predictions):
+                level, reason = 0, f"no setting fits {budget * 1000:.0f}ms budget"
+            else:
+                level, reason = self.default_level, "no latency measured yet"
+            if probe and level < len(values) - 1:
+                level, reason = level + 1, "probe (re-measuring a higher level)"
+            if inflight >= self.overload_inflight // 2 and level > self.default_level:
+                level, reason = self.default_level, f"busy ({inflight} in flight)"
+
+        value = self._value(knob, values, level, topk)
+        return SearchChoice(collection, index_type, level, LEVEL_NAMES[level], {knob: value}, reason)
+
+    def record(self, choice: SearchChoice, elapsed_s: float) -> None:
+        ladder = self._ladder(choice.index_type)
+        value = choice.params.get(ladder[0]) if ladder else None
+        if value is None or choice.name == "explicit":  # explicit settings (benchmarks) stay out of the curve
+            return
+        with self._lock:
+            curve = self._curves.setdefault((choice.collection, choice.index_type), _LatencyCurve())
+            prev = curve.ewma.get(value)
+            curve.ewma[value] = elapsed_s if prev is None else (1 - self.ewma_alpha) * prev + self.ewma_alpha * elapsed_s
+            curve.samples[value] = curve.samples.get(value, 0) + 1
+
+    @contextmanager
+    def track(self, choice: SearchChoice):
+        """Wrap the ANN call: counts in-flight calls and feeds the latency curve."""
+        with self._lock:
+            self._inflight += 1
+        t0 = time.perf_counter()
+        try:
+            yield choice
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self._inflight -= 1
+            choice.elapsed_ms = elapsed * 1000
+            self.record(choice, elapsed)
+            self._local.last_choice = choice
+
+    def reset_last_choice(self) -> None:
+        self._local.last_choice = None
+
+    def last_choice(self) -> Optional[SearchChoice]:
+        """Setting used by the most recent ANN call on the current thread."""
+        return getattr(self._local, "last_choice", None)
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "collection": collection,
+                    "index_type": index_type,
+                    "inflight": self._inflight,
+                    "values": {
+                        str(value): {"ewma_ms": round(lat * 1000, 2), "samples": curve.samples.get(value, 0)}
+                        for value, lat in sorted(curve.ewma.items())
+                    },
+                }
+                for (collection, index_type), curve in self._curves.items()
+            ]
+
+
+# Global instance for easy access
+search_param_controller = SearchParamController()
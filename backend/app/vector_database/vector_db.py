@@ -1,11 +1,22 @@
 import os
 import json
 import logging
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import faiss
 from pymilvus import MilvusClient, DataType
+from app.vector_database.partitions import DEFAULT_PARTITION, load_id_to_batch, normalize_partitions
+from app.vector_database.search_params import search_param_controller
+from app.vector_database.precision import encode_vectors, normalize_vector_dtype, query_data
+from app.vector_database.vector_fetch import fetch_vectors
+from app.vector_database.dedup import expand_hits
+
+VECTOR_FIELD_TYPES = {
+    "FLOAT": DataType.FLOAT_VECTOR,
+    "FLOAT16": DataType.FLOAT16_VECTOR,
+    "BFLOAT16": DataType.BFLOAT16_VECTOR,
+}
 
 
 class MilvusVectorDB:
@@ -20,6 +31,11 @@ class MilvusVectorDB:
         index_type: str = "HNSW",  # HNSW for better performance
         hnsw_m: int = 48,  # HNSW M parameter (4-64)
         hnsw_ef_construction: int = 200,  # HNSW efConstruction (8-512)
+        ivf_nlist: int = 1024,  # IVF_FLAT / IVF_SQ8 / IVF_PQ number of clusters
+        pq_m: int = 64,  # IVF_PQ sub-quantizers (must divide the dimension)
+        nprobe: int = 16,  # IVF search-time clusters to visit
+        vector_dtype: str = "FLOAT",  # FLOAT / FLOAT16 / BFLOAT16 storage for the vector field
+        sq_type: str = "SQ8",  # HNSW_SQ scalar quantizer (SQ8 / SQ6 / FP16 / BF16)
     ):
         self.logger = logging.getLogger(__name__)
         self.collection_name = collection_name
@@ -38,6 +54,11 @@ class MilvusVectorDB:
         self.index_type = index_type
         self.hnsw_m = hnsw_m
         self.hnsw_ef_construction = hnsw_ef_construction
+        self.ivf_nlist = ivf_nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+        self.vector_dtype = normalize_vector_dtype(vector_dtype)
+        self.sq_type = sq_type
 
     def _pick_milvus_uri(self) -> str:
         candidates = ("http://milvus:19530", "http://localhost:19530")
@@ -70,7 +91,7 @@ class MilvusVectorDB:
 
             schema = self.client.create_schema(auto_id=False, description=f"Vectors for {self.collection_name}")
             schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True)
-            schema.add_field(field_name="vector", datatype=DataType.FLOAT_VECTOR, dim=int(vector_dim))
+            schema.add_field(field_name="vector", datatype=VECTOR_FIELD_TYPES[self.vector_dtype], dim=int(vector_dim))
             schema.add_field(field_name="payload", datatype=DataType.JSON)
 
             index_params = self.client.prepare_index_params()
@@ -91,6 +112,28 @@ class MilvusVectorDB:
                     }
                 )
                 self.logger.info(f"Using HNSW index (M={self.hnsw_m}, ef={self.hnsw_ef_construction}) for {self.collection_name}")
+            elif self.index_type == "HNSW_SQ":
+                # HNSW graph over scalar-quantized vectors (Milvus 2.5+): ~1/4 of the float32 index memory
+                params = {"M": self.hnsw_m, "efConstruction": self.hnsw_ef_construction, "sq_type": self.sq_type}
+                index_params.add_index(
+                    field_name="vector",
+                    index_type="HNSW_SQ",
+                    metric_type=self.distance,
+                    params=params,
+                )
+                self.logger.info(f"Using HNSW_SQ index ({params}) for {self.collection_name}")
+            elif self.index_type in ("IVF_FLAT", "IVF_SQ8", "IVF_PQ"):
+                # CPU IVF family - parameters picked with app/vector_database/benchmark.py
+                params = {"nlist": self.ivf_nlist}
+                if self.index_type == "IVF_PQ":
+                    params.update({"m": self.pq_m, "nbits": 8})
+                index_params.add_index(
+                    field_name="vector",
+                    index_type=self.index_type,
+                    metric_type=self.distance,
+                    params=params,
+                )
+                self.logger.info(f"Using {self.index_type} index ({params}) for {self.collection_name}")
             elif self.use_gpu and self._check_gpu_available() and self.index_type == "GPU_IVF_FLAT":
                 # GPU_IVF_FLAT for GPU-accelerated search (user must explicitly set index_type="GPU_IVF_FLAT")
                 index_params.add_index(
@@ -115,6 +158,7 @@ class MilvusVectorDB:
                 index_params=index_params,
                 enable_dynamic_field=True,
             )
+            self.logger.info(f"Vector field of {self.collection_name} stored as {self.vector_dtype}")
             return True
         except Exception as e:
             self.logger.error(f"_ensure_collection error: {e}")
@@ -126,6 +170,9 @@ class MilvusVectorDB:
         metadata_file_path: Optional[str] = None,
         batch_size: int = 500,
         num_workers: int = 4,  # Number of parallel upload workers
+        partition_by_batch: bool = True,  # One partition per dataset batch (L21, L22, ...)
+        only_batches: Optional[List[str]] = None,  # Upload just these batches (e.g. a newly added one)
+        skip_ids: Optional[Set[int]] = None,  # Ids not to index, e.g. near-duplicate members (see dedup.py)
     ) -> bool:
         try:
             index = faiss.read_index(faiss_file_path)
@@ -136,13 +183,45 @@ class MilvusVectorDB:
                     metadata = json.load(f)
             if not self._ensure_collection(dim):
                 return False
-            return self._upload_from_faiss(index, metadata, batch_size=batch_size, num_workers=num_workers)
+            id_to_batch = load_id_to_batch() if partition_by_batch else {}
+            if id_to_batch and not self._ensure_partitions(sorted(set(id_to_batch.values()))):
+                return False
+            return self._upload_from_faiss(
+                index, metadata, batch_size=batch_size, num_workers=num_workers,
+                id_to_batch=id_to_batch, only_batches=normalize_partitions(only_batches),
+                skip_ids=skip_ids,
+            )
         except Exception as e:
             self.logger.error(f"create_collection_from_faiss error: {e}")
             return False
 
-    def _upload_from_faiss(self, index: faiss.Index, metadata: Dict, batch_size: int = 500, num_workers: int = 4) -> bool:
+    def _ensure_partitions(self, partition_names: List[str]) -> bool:
+        try:
+            existing = set(self.client.list_partitions(self.collection_name))
+            for name in partition_names:
+                if name and name not in existing:
+                    self.client.create_partition(collection_name=self.collection_name, partition_name=name)
+            self.logger.info(f"Partitions for {self.collection_name}: {len(partition_names)} batches")
+            return True
+        except Exception as e:
+            self.logger.error(f"_ensure_partitions error: {e}")
+            return False
+
+    def _upload_from_faiss(
+        self,
+        index: faiss.Index,
+        metadata: Dict,
+        batch_size: int = 500,
+        num_workers: int = 4,
+        id_to_batch: Optional[Dict[int, str]] = None,
+        only_batches: Optional[List[str]] = None,
+        skip_ids: Optional[Set[int]] = None,
+    ) -> bool:
         total = index.ntotal
+        skip_ids = skip_ids or set()
+        id_to_batch = id_to_batch or {}
+        batch_filter = load_id_to_batch() if only_batches else {}
+        allowed_batches = set(only_batches or [])
         self.logger.info(f"Uploading {total} vectors to '{self.collection_name}' with {num_workers} parallel workers")
 
         def reconstruct_range(i0: int, i1: int) -> np.ndarray:
@@ -170,18 +249,26 @@ class MilvusVectorDB:
                     thread_client = MilvusClient(uri=self.milvus_uri)
                 
                 vecs = reconstruct_range(i, j)
-                entities: List[Dict] = []
-                for off, v in enumerate(vecs):
+                rows = encode_vectors(vecs, self.vector_dtype)
+                # Group rows by batch partition so each insert targets one partition
+                entities_by_partition: Dict[str, List[Dict]] = {}
+                for off in range(len(rows)):
                     pid = i + off
+                    if allowed_batches and batch_filter.get(pid) not in allowed_batches:
+                        continue
+                    if pid in skip_ids:
+                        continue
                     ent: Dict = {
                         "id": int(pid), 
-                        "vector": v.astype(np.float32).tolist(), 
+                        "vector": rows[off], 
                         "payload": metadata.get(str(pid)) or {}
                     }
-                    entities.append(ent)
+                    partition = id_to_batch.get(pid, DEFAULT_PARTITION)
+                    entities_by_partition.setdefault(partition, []).append(ent)
                 
                 # Use thread-local client for insertion
-                thread_client.insert(self.collection_name, data=entities)
+                for partition, entities in entities_by_partition.items():
+                    thread_client.insert(self.collection_name, data=entities, partition_name=partition)
                 return True, i, j
             except Exception as e:
                 self.logger.error(f"Batch [{i}:{j}] error: {e}")
@@ -212,28 +299,37 @@ class MilvusVectorDB:
             self.logger.error(f"_upload_from_faiss error: {e}")
             return False
 
-    def search(self, query_vector: np.ndarray, limit: int = 10, with_payload: bool = True, ef: Optional[int] = None) -> List[Dict]:
+    def search(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 10,
+        with_payload: bool = True,
+        ef: Optional[int] = None,
+        partitions: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+    ) -> List[Dict]:
         try:
             self._ensure_collection(self.vector_size)
-            qv = query_vector.astype(np.float32).tolist()
+            # Query must match the stored field type, which may differ from self.vector_dtype for existing collections
+            qv = query_data(self.client, self.collection_name, query_vector)[0]
             
-            # Build search params based on index type
-            search_params = {"metric_type": self.distance}
-            if self.index_type == "HNSW":
-                # ef controls search quality/speed tradeoff (higher = better quality, slower)
-                # Default: max(limit * 2, 100) - can be overridden by passing ef parameter
-                search_params["ef"] = ef or max(limit * 2, 150)  # Increased default from 100 to 150
-            elif self.use_gpu and self._check_gpu_available():
-                search_params["nprobe"] = 128  # Number of clusters to search for GPU index
+            # ef / nprobe are picked per call from topk, measured latency and the deadline;
+            # an explicit ef still wins. The setting used is available via search_param_controller.last_choice()
+            choice = search_param_controller.choose(self.collection_name, limit, deadline=deadline, index_type=self.index_type)
+            if ef and "ef" in choice.params:
+                choice.params["ef"] = max(int(ef), int(limit))
+                choice.level, choice.name, choice.reason = -1, "explicit", "explicit ef"
             
-            res = self.client.search(
-                collection_name=self.collection_name,
-                data=[qv],
-                anns_field="vector",
-                limit=int(limit),
-                output_fields=["payload"] if with_payload else [],
-                search_params=search_params,
-            )
+            with search_param_controller.track(choice):
+                res = self.client.search(
+                    collection_name=self.collection_name,
+                    data=[qv],
+                    anns_field="vector",
+                    limit=int(limit),
+                    output_fields=["payload"] if with_payload else [],
+                    search_params=choice.to_search_params(self.distance),
+                    partition_names=normalize_partitions(partitions),
+                )
             # MilvusClient returns a list of hits per query → res[0]
             hits = res[0] if isinstance(res, list) else res
             out: List[Dict] = []
@@ -243,11 +339,46 @@ class MilvusVectorDB:
                     "score": float(h.get("distance") if isinstance(h, dict) else getattr(h, "distance", 0.0)),
                     "payload": (h.get("entity", {}) or {}).get("payload") if isinstance(h, dict) else getattr(getattr(h, "entity", {}), "payload", None),
                 })
-            return out
+            return expand_hits(self.collection_name, out, limit)
         except Exception as e:
             self.logger.error(f"search error: {e}")
             return []
 
+    def fetch_vectors(self, ids: List[int]) -> Dict[int, np.ndarray]:
+        """Stored vectors for many ids in one round trip (cached, see app/vector_database/vector_fetch.py)."""
+        return fetch_vectors(self.collection_name, ids, client=self.client)
+
+    def list_partitions(self) -> List[str]:
+        try:
+            return list(self.client.list_partitions(self.collection_name))
+        except Exception as e:
+            self.logger.error(f"list_partitions error: {e}")
+            return []
+
+    def load_partitions(self, partitions: List[str]) -> bool:
+        """Load only the given batches into query nodes (e.g. after uploading a new batch)."""
+        names = normalize_partitions(partitions)
+        if not names:
+            return False
+        try:
+            self.client.load_partitions(collection_name=self.collection_name, partition_names=names)
+            return True
+        except Exception as e:
+            self.logger.error(f"load_partitions error: {e}")
+            return False
+
+    def release_partitions(self, partitions: List[str]) -> bool:
+        """Release batches from memory without touching the rest of the collection."""
+        names = normalize_partitions(partitions)
+        if not names:
+            return False
+        try:
+            self.client.release_partitions(collection_name=self.collection_name, partition_names=names)
+            return True
+        except Exception as e:
+            self.logger.error(f"release_partitions error: {e}")
+            return False
+
     def close(self):
         try:
             # MilvusClient does not require explicit close, but keep for symmetry
@@ -1,5 +1,9 @@
-from typing import Dict, Optional
+import os
+from typing import Dict, List, Optional
 from app.vector_database.vector_db import MilvusVectorDB
+from app.vector_database.local_vector_db import LocalVectorDB
+
+DEFAULT_DENSE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "index", "dense")
 
 class DatabaseManager:
     
@@ -14,6 +18,10 @@ class DatabaseManager:
             self.milvus_uri = milvus_uri or "http://milvus:19530"
             self.milvus_token = milvus_token
         self._collections: Dict[str, MilvusVectorDB] = {}
+        self._local_collections: Dict[str, LocalVectorDB] = {}
+        self.dense_dir = os.path.abspath(os.getenv("DENSE_INDEX_DIR", DEFAULT_DENSE_DIR))
+        # float16 / int8 halve or quarter local RAM; results are reranked at full precision
+        self.local_storage_dtype = os.getenv("LOCAL_STORAGE_DTYPE", "float32")
         
         self.collection_configs = {
             "h14_quickgelu": {
@@ -106,6 +114,32 @@ class DatabaseManager:
         
         return self._collections[key]
     
+    def get_local_collection(self, collection_key: str, partitions: Optional[List[str]] = None) -> LocalVectorDB:
+        """
+        Get (and load on first use) the in-process engine for a collection,
+        backed by data/index/dense/<collection>.bin.
+
+        Args:
+            collection_key: Key for the collection (e.g., 'siglip2')
+            partitions: Only load these batches (e.g. ['L21', 'L22']); None loads everything
+        """
+        if collection_key not in self._local_collections:
+            if collection_key not in self.collection_configs:
+                raise ValueError(f"Unknown collection key: {collection_key}")
+            config = self.collection_configs[collection_key]
+            db = LocalVectorDB(
+                collection_name=config["collection_name"],
+                faiss_file_path=os.path.join(self.dense_dir, f"{config['collection_name']}.bin"),
+                distance=config["distance"],
+                storage_dtype=self.local_storage_dtype,
+            )
+            if not db.load(partitions=partitions):
+                raise RuntimeError(f"Failed to load local collection: {collection_key}")
+            self._local_collections[collection_key] = db
+        elif partitions:
+            self._local_collections[collection_key].load_partitions(partitions)
+        return self._local_collections[collection_key]
+
     def list_collections(self) -> list:
         """List all available collection keys"""
         return list(self.collection_configs.keys())
@@ -132,3 +166,6 @@ class DatabaseManager:
                 print(f"Warning: Error closing collection connection: {e}")
         
         self._collections.clear()
+        for local in self._local_collections.values():
+            local.close()
+        self._local_collections.clear()
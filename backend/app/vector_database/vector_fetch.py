@@ -0,0 +1,196 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.vector_database.precision import collection_vector_dtype, decode_vector
+from app.vector_database.dedup import dedup_index
+
+try:
+    import faiss
+except ImportError:  # the memory-mapped source is optional
+    faiss = None
+
+try:
+    from app.config.settings import VECTOR_CACHE_SIZE, VECTOR_FETCH_MMAP
+except ImportError:
+    VECTOR_CACHE_SIZE, VECTOR_FETCH_MMAP = 8192, True
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DENSE_DIR = os.path.abspath(os.getenv("DENSE_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "index", "dense")))
+
+
+def _row_vector(row):
+    """Vector field of one client.query / client.get row, whatever shape pymilvus returned it in."""
+    getter = row.get if hasattr(row, "get") else None
+    vec = getter("vector") if getter else None
+    if vec is None:
+        entity = getter("entity") if getter else getattr(row, "entity", None)
+        if hasattr(entity, "get"):
+            vec = entity.get("vector")
+        elif entity is not None:
+            vec = getattr(entity, "vector", None)
+    return vec
+
+
+def _row_id(row) -> Optional[int]:
+    rid = row.get("id") if hasattr(row, "get") else getattr(row, "id", None)
+    return int(rid) if rid is not None else None
+
+
+class VectorFetcher:
+    """
+    Vectors by id for "find similar" image searches.
+
+    Lookup order per id: LRU cache -> memory-mapped dense file (data/index/dense/<collection>.bin,
+    ids are FAISS positions as uploaded) -> one batched Milvus query for everything still missing.
+    """
+
+    def __init__(self, cache_size: int = VECTOR_CACHE_SIZE, use_mmap: bool = VECTOR_FETCH_MMAP, dense_dir: str = DENSE_DIR):
+        self.cache_size = max(0, int(cache_size))
+        self.use_mmap = bool(use_mmap) and faiss is not None
+        self.dense_dir = dense_dir
+        self._cache: "OrderedDict[Tuple[str, int], np.ndarray]" = OrderedDict()
+        self._mmaps: Dict[str, Optional[object]] = {}
+        self._lock = threading.Lock()
+        self.hits = {"cache": 0, "mmap": 0, "milvus": 0}
+
+    # ----- LRU cache ----- #
+    def _cache_get(self, collection_name: str, ids: List[int]) -> Dict[int, np.ndarray]:
+        found: Dict[int, np.ndarray] = {}
+        with self._lock:
+            for i in ids:
+                vec = self._cache.get((collection_name, i))
+                if vec is not None:
+                    self._cache.move_to_end((collection_name, i))
+                    found[i] = vec
+        return found
+
+    def _cache_put(self, collection_name: str, vectors: Dict[int, np.ndarray]) -> None:
+        if not self.cache_size:
+            return
+        with self._lock:
+            for i, vec in vectors.items():
+                self._cache[(collection_name, i)] = vec
+                self._cache.move_to_end((collection_name, i))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear(self, collection_name: Optional[str] = None) -> None:
+        with self._lock:
+            if collection_name is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == collection_name]:
+                    del self._cache[key]
+
+    # ----- Memory-mapped dense file ----- #
+    def _mmap(self, collection_name: str):
+        if not self.use_mmap:
+            return None
+        with self._lock:
+            if collection_name in self._mmaps:
+                return self._mmaps[collection_name]
+        index = None
+        path = os.path.join(self.dense_dir, f"{collection_name}.bin")
+        if os.path.exists(path):
+            try:
+                index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except Exception as e:
+                print(f"[VectorFetch] Cannot memory-map {path}: {e}")
+        with self._lock:
+            self._mmaps[collection_name] = index
+        return index
+
+    def _mmap_get(self, collection_name: str, ids: List[int]) -> Dict[int, np.ndarray]:
+        index = self._mmap(collection_name)
+        if index is None:
+            return {}
+        valid = [i for i in ids if 0 <= i < index.ntotal]
+        if not valid:
+            return {}
+        try:
+            rows = index.reconstruct_batch(np.asarray(valid, dtype=np.int64))
+        except Exception:
+            rows = [index.reconstruct(int(i)) for i in valid]
+        return {i: np.asarray(row, dtype=np.float32) for i, row in zip(valid, rows)}
+
+    # ----- Milvus ----- #
+    def _milvus_get(self, client, collection_name: str, ids: List[int], batch_size: int = 1000) -> Dict[int, np.ndarray]:
+        found: Dict[int, np.ndarray] = {}
+        dtype = collection_vector_dtype(client, collection_name)
+        for s in range(0, len(ids), batch_size):
+            chunk = ids[s:s + batch_size]
+            try:
+                rows = client.query(
+                    collection_name=collection_name,
+                    filter=f"id in [{', '.join(str(i) for i in chunk)}]",
+                    output_fields=["id", "vector"],
+                    limit=len(chunk),
+                )
+            except Exception as exc:
+                print(f"[VectorFetch] Failed to fetch {len(chunk)} vectors from {collection_name}: {exc}")
+                continue
+            for row in rows or []:
+                rid, vec = _row_id(row), decode_vector(_row_vector(row), dtype)
+                if rid is not None and vec is not None:
+                    found[rid] = vec
+        return found
+
+    def fetch(self, client, collection_name: str, ids: Iterable[int]) -> Dict[int, np.ndarray]:
+        """Vectors for `ids` as {id: float32 array}; ids that exist nowhere are left out."""
+        wanted = list(dict.fromkeys(int(i) for i in ids))
+        out = self._cache_get(collection_name, wanted)
+        self.hits["cache"] += len(out)
+
+        missing = [i for i in wanted if i not in out]
+        if missing:
+            from_mmap = self._mmap_get(collection_name, missing)
+            self.hits["mmap"] += len(from_mmap)
+            out.update(from_mmap)
+            self._cache_put(collection_name, from_mmap)
+            missing = [i for i in missing if i not in from_mmap]
+
+        if missing and client is not None:
+            from_milvus = self._milvus_get(client, collection_name, missing)
+            # Near-duplicate members are not indexed: use their representative's vector
+            reps = {i: dedup_index.representative(collection_name, i) for i in missing if i not in from_milvus}
+            reps = {i: r for i, r in reps.items() if r != i}
+            if reps:
+                rep_vecs = {r: out.get(r, from_milvus.get(r)) for r in set(reps.values())}
+                missing_reps = [r for r, vec in rep_vecs.items() if vec is None]
+                if missing_reps:
+                    rep_vecs.update(self._milvus_get(client, collection_name, missing_reps))
+                from_milvus.update({i: rep_vecs[r] for i, r in reps.items() if rep_vecs.get(r) is not None})
+            self.hits["milvus"] += len(from_milvus)
+            out.update(from_milvus)
+            self._cache_put(collection_name, from_milvus)
+        return out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"cached": len(self._cache), "capacity": self.cache_size, "hits": dict(self.hits)}
+
+
+# Global instance for easy access
+vector_fetcher = VectorFetcher()
+
+
+def fetch_vectors(collection_name: str, ids: Iterable[int], client=None) -> Dict[int, np.ndarray]:
+    """Batched vector lookup by id (cache, then memory-mapped file, then one Milvus query)."""
+    return vector_fetcher.fetch(client, collection_name, ids)
+
+
+def exact_topk(matrix: np.ndarray, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Rows of `matrix` with the k best cosine scores against q, best first, and those scores."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    q = np.asarray(q, dtype=np.float32).reshape(-1)
+    k = min(int(k), len(matrix))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    scores = (matrix @ (q / max(float(np.linalg.norm(q)), 1e-12))) / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
@@ -1,5 +1,10 @@
-from app.config.setup import manager
-from app.config.settings import TOPK_NORMAL, TOPK_NORMAL_SINGLE_METHOD, TOPK_TEMPORAL, TOPK_PREV, TOPK_IS
+from app.config.setup import manager, es
+from app.vector_database.search_params import search_param_controller
+from app.utils.upload_store import upload_store
+from app.rerank.rerank_stage import rerank_stage
+from app.utils.query_planner import query_planner
+from app.utils.result_sessions import result_sessions
+from app.config.settings import TOPK_NORMAL, TOPK_NORMAL_SINGLE_METHOD, TOPK_TEMPORAL, TOPK_PREV, TOPK_IS, RESULT_PAGE_SIZE
 from app.result.temporal_search import TemporalSearch
 from typing import List, Optional
 import json
@@ -13,13 +18,14 @@ from pathlib import Path
 import json
 import re
 import gc
-from typing import List, Dict, Optional
+from typing import List, Dict, Literal, Optional, Union
 from fastapi import Path as PathParam
 import asyncio
 import os
 import functools
 from fastapi import UploadFile, File
 import uuid
+import time
 
 app = FastAPI()
 
@@ -101,6 +107,31 @@ class SearchRequest(BaseModel):
     is_temporal: bool = False
     # Toggle translating the question
     use_trans: bool =True
+    # Restrict search to dataset batches, e.g. ["L21", "L22"] (None = all partitions)
+    partitions: Optional[List[str]] = None
+    # Latency budget for the whole request; ef / nprobe are picked to fit it (None = server default)
+    latency_budget_ms: Optional[int] = None
+    # Cascade mode: these models recall a candidate pool, every enabled model rescores it exactly
+    # from stored vectors, e.g. ["siglip2"] (None = one ANN search per model)
+    cascade: Optional[List[str]] = None
+    # Coarse-to-fine: "video" or "shot" scores only the keyframes of the best videos / shots (None = off)
+    coarse: Optional[Literal["video", "shot"]] = None
+    # Also match OCR text as a noisy substring via the trigram index (method "ocr_fuzzy")
+    ocr_fuzzy: Optional[bool] = None
+    # Map ASR hits onto the keyframes their speech segment covers and fuse them with the visual
+    # methods (usable in temporal queries) instead of returning scene results
+    asr_keyframes: Optional[bool] = None
+    # Rerank the fused top-N with the configured reranker (RERANK_BACKEND); falls back to the fused order
+    rerank: Optional[bool] = None
+    # Only keyframes containing these objects, e.g. "2 person, red car" or
+    # [{"name": "car", "color": "red", "count": 1}] (bitmap index, None = no filter)
+    object_filter: Optional[Union[str, List[Dict]]] = None
+    # "full" runs every method at topk_each; "auto" lets the query planner shrink or skip low-value
+    # methods (None = server default, QUERY_PLAN)
+    plan: Optional[Literal["auto", "full"]] = None
+    # Return only the first page_size results plus a result token; later pages and the per-query /
+    # per-method breakdowns come from /api/results/{token} (None = server default, 0 = whole result)
+    page_size: Optional[int] = None
 
 
 
@@ -110,8 +141,25 @@ class ImageSearchRequest(BaseModel):
     image_id: Optional[str] = None  # Single image (backward compatible)
     image_ids: Optional[List[str]] = None  # Multiple images for temporal search
     model_name: str = "siglip2"
+    model_names: Optional[List[str]] = None  # Several models, e.g. ["siglip2", "h14_quickgelu"]: results are fused
     topk: int = 100
     collection_name: Optional[str] = None
+    partitions: Optional[List[str]] = None  # Dataset batches to search, e.g. ["L21"]
+    latency_budget_ms: Optional[int] = None  # Request latency budget used to pick ef / nprobe
+
+class QueryComponent(BaseModel):
+    text: Optional[str] = None  # Text prompt, embedded with the same model as the images
+    image_id: Optional[str] = None  # Keyframe result id or upload id (UUID)
+    weight: float = 1.0
+
+class CompositeSearchRequest(BaseModel):
+    positives: List[QueryComponent]  # e.g. [{"image_id": "1234"}, {"text": "at night", "weight": 0.5}]
+    negatives: Optional[List[QueryComponent]] = None  # "...but not like this": subtracted from the query
+    model_name: str = "siglip2"
+    model_names: Optional[List[str]] = None
+    topk: int = 100
+    partitions: Optional[List[str]] = None
+    latency_budget_ms: Optional[int] = None
 
 _metadata_cache = {}
 
@@ -134,6 +182,9 @@ async def startup_event():
     keyframe_metadata = await load_metadata("keyframe")
     scene_metadata = await load_metadata("scene")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await es.aclose()
 
 
 MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "4"))
@@ -150,6 +201,26 @@ async def run_blocking(func, *args, **kwargs):
     return await _to_thread(func, *args, **kwargs)
 
 
+def upload_query_vector(upload_id: str, models: List[str]):
+    """
+    Embedding(s) of an upload computed at upload time: one vector for a single model, a
+    {model: vector} dict for fused search. Second value is False when a model still needs the file.
+    """
+    if len(models) == 1:
+        vec = upload_store.get_embedding(upload_id, models[0])
+        return vec, vec is not None
+    vectors = {m: upload_store.get_embedding(upload_id, m) for m in models}
+    vectors = {m: v for m, v in vectors.items() if v is not None}
+    return (vectors or None), len(vectors) == len(models)
+
+
+def request_deadline(latency_budget_ms: Optional[int]) -> Optional[float]:
+    """time.monotonic() deadline for a request budget, taken on arrival so queueing counts against it."""
+    if not latency_budget_ms or latency_budget_ms <= 0:
+        return None
+    return time.monotonic() + latency_budget_ms / 1000.0
+
+
 def extract_active_methods(request: SearchRequest):
     """Extract active methods from request"""
     active_methods = []
@@ -455,6 +526,7 @@ async def image_search_endpoint(request: ImageSearchRequest):
     - Single image: Returns normal search results
     - Multiple images (2-3): Returns temporal search results
     """
+    deadline = request_deadline(request.latency_budget_ms)
     try:
         # Normalize input: convert to list
         image_ids = []
@@ -474,61 +546,67 @@ async def image_search_endpoint(request: ImageSearchRequest):
             
             print(f"🔄 Using temporal search mode")
             
-            # Collect image paths
-            image_paths = []
+            # One entry per position: uploads go by path, result ids go straight to their stored vector
+            image_paths: List[Optional[str]] = []
+            keyframe_ids: List[Optional[int]] = []
+            upload_ids: List[Optional[str]] = []
             for image_id in image_ids:
                 # Check if UUID (uploaded image)
                 if len(image_id) == 36 and '-' in image_id:
-                    image_path = TEMP_UPLOADS_DIR / f"{image_id}.jpg"
-                    if not image_path.exists():
+                    if not upload_store.exists(image_id):
                         return {"error": f"Uploaded image not found: {image_id}"}
-                    print(f"📤 Using uploaded image: {image_path}")
-                    image_paths.append(str(image_path))
+                    image_paths.append(str(upload_store.path_for(image_id)))
+                    keyframe_ids.append(None)
+                    upload_ids.append(image_id)
+                elif str(image_id).isdigit():
+                    image_paths.append(None)
+                    keyframe_ids.append(int(image_id))
+                    upload_ids.append(None)
                 else:
-                    # Result ID from metadata
-                    meta_entry = keyframe_metadata.get(image_id)
-                    if not meta_entry:
-                        return {"error": f"Image not found in metadata: {image_id}"}
-                    
-                    image_path_str = meta_entry if isinstance(meta_entry, str) else meta_entry.get("path")
-                    if not image_path_str:
-                        return {"error": f"Image path not found for: {image_id}"}
-                    
-                    image_path_clean = image_path_str.replace("../../", "")
-                    image_path = Path(__file__).resolve().parent / image_path_clean
-                    
-                    if not image_path.exists():
-                        return {"error": f"Image file not found: {image_path}"}
-                    
-                    print(f"📁 Using metadata image: {image_path}")
-                    image_paths.append(str(image_path))
+                    return {"error": f"Invalid image id: {image_id}"}
             
             # Perform temporal search
-            def temporal_search_task(paths: List[str]):
+            models = request.model_names or [request.model_name]
+
+            def temporal_search_task(paths: List[Optional[str]], ids: List[Optional[int]], uploads: List[Optional[str]]):
+                # Uploads embedded at upload time go straight to ANN; the file is only a fallback
+                lookups = [upload_query_vector(uid, models) if uid else (None, False) for uid in uploads]
                 return manager.temporal_image_search(
-                    image_paths=paths,
-                    model_name=request.model_name,
-                    topk=request.topk or topk_is
+                    image_paths=[None if complete else p for p, (_, complete) in zip(paths, lookups)],
+                    image_ids=ids,
+                    image_vectors=[vec for vec, _ in lookups],
+                    model_name=models if len(models) > 1 else models[0],
+                    topk=request.topk or topk_is,
+                    partitions=request.partitions,
+                    deadline=deadline
                 )
             
             async with JOB_SEM:
-                result = await run_blocking(temporal_search_task, image_paths)
+                result = await run_blocking(temporal_search_task, image_paths, keyframe_ids, upload_ids)
             
             return result
         
         # ==== SINGLE IMAGE SEARCH ====
         image_id = image_ids[0]
         should_skip_encoding = False
+        keyframe_id: Optional[int] = None
+        upload_id: Optional[str] = None
+        image_path: Optional[Path] = None
+        method_norm = (request.model_name or "keyframe").lower().replace(" ", "_")
 
         # Check if UUID (uploaded image)
         if len(image_id) == 36 and '-' in image_id:
-            image_path = TEMP_UPLOADS_DIR / f"{image_id}.jpg"
-            if not image_path.exists():
+            if not upload_store.exists(image_id):
                 return {"error": f"Uploaded image not found: {image_id}"}
-            print(f"📤 Using uploaded image from: {image_path}")
+            image_path = upload_store.path_for(image_id)
+            upload_id = image_id
+            print(f"📤 Using uploaded image: {image_id}")
+        elif method_norm not in {'asr', 'scene'} and str(image_id).isdigit():
+            # Keyframe result id: search with its stored vector, no metadata / filesystem lookups
+            keyframe_id = int(image_id)
+            should_skip_encoding = True
         else:
             # Result ID from metadata
-            method_norm = (request.model_name or "keyframe").lower().replace(" ", "_")
             scene_methods = {'asr', 'scene'}
             metadata = scene_metadata if method_norm in scene_methods else keyframe_metadata
 
@@ -550,17 +628,26 @@ async def image_search_endpoint(request: ImageSearchRequest):
             should_skip_encoding = True
 
         # Load and search
-        def image_search_task(img_path: Path, skip_encode: bool):
+        def image_search_task(img_path: Optional[Path], skip_encode: bool, kf_id: Optional[int], up_id: Optional[str]):
             pil_image = None
-            if not skip_encode:
+            models = request.model_names or ["siglip2"]
+            query_vector, complete = upload_query_vector(up_id, models) if up_id else (None, False)
+            if complete:
+                skip_encode, img_path = True, None
+            if not skip_encode and len(models) == 1:
+                # Fused search decodes the file itself, once, only for models that need it
                 with Image.open(img_path) as raw_image:
                     pil_image = raw_image.convert("RGB")
 
             search_resp = manager.search_by_image(
                 image=pil_image,
-                model_name="siglip2",
+                model_name=models if len(models) > 1 else models[0],
                 topk=request.topk or topk_is,
-                image_path=str(img_path)
+                image_path=str(img_path) if img_path is not None else None,
+                partitions=request.partitions,
+                deadline=deadline,
+                image_id=kf_id,
+                image_vector=query_vector
             )
 
             if isinstance(search_resp, dict):
@@ -597,7 +684,7 @@ async def image_search_endpoint(request: ImageSearchRequest):
             }
         
         async with JOB_SEM:
-            result = await run_blocking(image_search_task, image_path, should_skip_encoding)
+            result = await run_blocking(image_search_task, image_path, should_skip_encoding, keyframe_id, upload_id)
         
         return result
         
@@ -607,8 +694,69 @@ async def image_search_endpoint(request: ImageSearchRequest):
         traceback.print_exc()
         return {"error": str(e)}
 
+@app.post("/api/composite-search")
+async def composite_search_endpoint(request: CompositeSearchRequest):
+    """
+    Composite query: weighted text / image components with negative examples subtracted,
+    sent as one ANN search. Components are cached, so refining a query does not re-encode.
+    """
+    deadline = request_deadline(request.latency_budget_ms)
+
+    def to_component(c: QueryComponent) -> Dict:
+        if c.text and c.text.strip():
+            return {"text": c.text.strip(), "weight": c.weight}
+        if c.image_id and len(c.image_id) == 36 and '-' in c.image_id:
+            if not upload_store.exists(c.image_id):
+                raise ValueError(f"Uploaded image not found: {c.image_id}")
+            return {"upload_id": c.image_id, "weight": c.weight}
+        if c.image_id and str(c.image_id).isdigit():
+            return {"image_id": int(c.image_id), "weight": c.weight}
+        raise ValueError(f"Invalid query component: {c}")
+
+    try:
+        positives = [to_component(c) for c in request.positives]
+        negatives = [to_component(c) for c in request.negatives or []]
+    except ValueError as e:
+        return {"error": str(e)}
+    if not positives:
+        return {"error": "At least one positive component is required"}
+
+    models = request.model_names or [request.model_name]
+    async with JOB_SEM:
+        search_resp = await run_blocking(
+            manager.composite_search,
+            positives=positives,
+            negatives=negatives,
+            model_name=models if len(models) > 1 else models[0],
+            topk=request.topk or topk_is,
+            partitions=request.partitions,
+            deadline=deadline
+        )
+    if search_resp.get("error"):
+        return {"error": search_resp["error"]}
+
+    formatted_results = []
+    for result in search_resp.get("image_search") or []:
+        result_id = str(result.get("id"))
+        if not result_id or result_id == "None":
+            continue
+        formatted_results.append({
+            "id": result_id,
+            "score": float(result.get("score", 0.0)),
+            "url": f"/api/image/{result_id}?method=keyframe",
+            "title": f"Composite match {result_id}",
+            "path": keyframe_metadata.get(result_id, "unknown")
+        })
+    return {
+        "success": True,
+        "models": search_resp.get("models", models),
+        "results": formatted_results,
+        "total": len(formatted_results)
+    }
+
 @app.post("/api/search-new")
 async def search_endpoint_new(request: SearchRequest):
+    deadline = request_deadline(request.latency_budget_ms)
     ts = TemporalSearch()
 
     print(f"Search request: Mode={'Temporal' if request.is_temporal else 'Single'}")
@@ -631,6 +779,11 @@ async def search_endpoint_new(request: SearchRequest):
             topk_final_override = topk_normal
 
     async with JOB_SEM:
+        # The OCR searches are awaited on the async Elasticsearch client; the search thread then reads them
+        # from the prefetch (same sizes as TemporalSearch's own prefetch_text) instead of blocking on ES
+        await manager.aprefetch_text(
+            ocr_texts=[t for t in input["OCR"] if t], topk_each=topk_each_override, partitions=request.partitions
+        )
         result = await run_blocking(
             ts.search,
             queries=input["queries"],
@@ -646,36 +799,79 @@ async def search_endpoint_new(request: SearchRequest):
             topk_each=topk_each_override,
             topk_final=topk_final_override,
             topk_prev=topk_prev,
+            partitions=request.partitions,
+            deadline=deadline,
+            cascade=request.cascade,
+            coarse=request.coarse,
+            ocr_fuzzy=request.ocr_fuzzy,
+            asr_keyframes=request.asr_keyframes,
+            rerank=request.rerank,
+            object_filter=request.object_filter,
+            plan=request.plan,
         )
 
+    page_size = RESULT_PAGE_SIZE if request.page_size is None else request.page_size
+    if page_size and page_size > 0:
+        return await run_blocking(result_sessions.first_page, result, int(page_size))
     return result
+
+
+@app.get("/api/results/{token}")
+async def result_page(token: str, section: Optional[str] = None, cursor: Optional[str] = None, limit: int = 100):
+    """
+    Next page of a stored search result (cursor from the previous page), or a breakdown such as
+    section=per_query/query_0/per_method/siglip2 (paths listed in the search response's "sections").
+    """
+    try:
+        return result_sessions.page(token, section=section, cursor=cursor, limit=limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]) if e.args else "Not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/api/results/{token}")
+async def delete_result(token: str):
+    result_sessions.delete(token)
+    return {"status": "success"}
+
+
+@app.get("/api/search-params/stats")
+async def search_params_stats():
+    """Measured ANN latency per collection and ef / nprobe level."""
+    return {"collections": search_param_controller.stats()}
+
+
+@app.get("/api/rerank/stats")
+async def rerank_stats():
+    """Second-stage rerank: requests, fallbacks to the fused order, cache hits."""
+    return rerank_stage.stats()
+
+
+@app.get("/api/planner/stats")
+async def planner_stats():
+    """Query planner: per method combination, each method's share of the fused top-N, depth and latency."""
+    return query_planner.stats()
     
 
 @app.post("/api/upload-query-image")
 async def upload_query_image(image: UploadFile = File(...)):
-    """Upload image from clipboard paste"""
+    """Upload image from clipboard paste; it is validated, downscaled and embedded right away"""
+    contents = await image.read()
     try:
-        # Generate unique ID
-        image_id = str(uuid.uuid4())
-        
-        # Save to temp directory
-        upload_dir = Path("temp_uploads")
-        upload_dir.mkdir(exist_ok=True)
-        
-        file_path = upload_dir / f"{image_id}.jpg"
-        
-        # Save file
-        contents = await image.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        
-        # TODO: Process image với CLIP/etc để extract features
-        # features = extract_image_features(file_path)
-        
-        return {
-            "image_id": image_id,
-            "image_url": f"/temp_uploads/{image_id}.jpg",
-            "status": "success"
-        }
+        image_id, pil_image = await run_blocking(upload_store.save, contents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Encode in the background with every configured image model; searches wait for it if needed
+    encoders = manager.image_search.encoders() if manager.image_search else {}
+    upload_store.encode_async(image_id, pil_image, encoders)
+
+    return {
+        "image_id": image_id,
+        "image_url": f"/temp_uploads/{image_id}.jpg",
+        "models": sorted(encoders.keys()),
+        "status": "success"
+    }
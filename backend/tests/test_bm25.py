@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import time
+
+from app.retrieve.bm25 import BM25Index, LocalTextSearcher, tokenize
+
+DOCS = {
+    "10": "a red car parked on the street",
+    "11": "a blue car and a red bus",
+    "12": "people walking in the park",
+    "13": "red red red sunset over the sea",
+}
+
+
+def test_tokenize_like_standard_analyzer():
+    assert tokenize("Xin CHÀO, thế-giới 2024!") == ["xin", "chào", "thế", "giới", "2024"]
+
+
+def test_build_and_search():
+    index = BM25Index.build(iter(DOCS.items()))
+    hits = index.search("red car", 10)
+    assert [h["id"] for h in hits][:2] == [10, 11]  # both terms beat a single repeated one
+    assert {h["id"] for h in hits} == {10, 11, 13}
+    assert hits[0]["score"] == 1.0 and hits[-1]["score"] == 0.0  # min-max normalized like ElasticSearcher
+    assert index.search("red", 1)[0]["id"] == 13
+    assert index.search("unknown words", 10) == []
+    assert index.search("red", 0) == []
+
+
+def test_save_load_roundtrip(tmp_path):
+    index = BM25Index.build(iter(DOCS.items()))
+    path = str(tmp_path / "ic.npz")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("red car", 10) == index.search("red car", 10)
+    assert loaded.terms.tolist() == sorted(loaded.terms.tolist())
+
+
+def test_local_text_searcher_caches_and_rebuilds(tmp_path):
+    source = tmp_path / "ocr.json"
+    source.write_text(json.dumps(DOCS), encoding="utf-8")
+    searcher = LocalTextSearcher(sparse_dir=str(tmp_path))
+    assert searcher.search_text("ocr", "park", 5)[0]["id"] == 12
+    assert os.path.exists(tmp_path / "bm25" / "ocr.npz")
+    assert searcher.msearch_text([("ocr", "sunset", 5), ("missing", "red", 5)]) == [[{"id": 13, "score": 1.0}], []]
+
+    # A newer source file replaces the cached index on the next load
+    source.write_text(json.dumps({"20": "a green tram"}), encoding="utf-8")
+    os.utime(source, (time.time() + 5, time.time() + 5))
+    fresh = LocalTextSearcher(sparse_dir=str(tmp_path))
+    assert fresh.search_text("ocr", "tram", 5) == [{"id": 20, "score": 1.0}]
+
+
+def test_local_text_searcher_async_api(tmp_path):
+    (tmp_path / "ocr.json").write_text(json.dumps(DOCS), encoding="utf-8")
+    searcher = LocalTextSearcher(sparse_dir=str(tmp_path))
+
+    async def run():
+        await searcher.aprefetch([("ocr", "park", 5)])
+        return await searcher.asearch_text("ocr", "park", 5), await searcher.amsearch_text([("ocr", "sunset", 5)])
+
+    park, (sunset,) = asyncio.run(run())
+    assert park[0]["id"] == 12 and sunset == [{"id": 13, "score": 1.0}]
+    assert searcher.search_text("ocr", "park", 5) == park
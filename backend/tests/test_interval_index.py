@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.vector_database.interval_index import ARRAYS, SceneIntervalIndex, build_interval_arrays
+
+KEYFRAMES = {
+    "0": "data/keyframe/L21_V001/100.webp",
+    "1": "data/keyframe/L21_V001/200.webp",
+    "2": "data/keyframe/L21_V001/300.webp",
+    "3": "data/keyframe/L21_V001/500.webp",
+    "4": "data/keyframe/L21_V002/0.webp",
+    "5": "data/keyframe/L21_V002/50.webp",
+}
+SCENES = {
+    "10": "data/scene/L21_V001/scene_000000_000250.webp",  # start and end from the file name
+    "11": {"path": "data/scene/L21_V001/400.webp"},  # start only: runs to the end of the video
+    "12": {"path": "data/scene/L21_V002/scene.webp", "start": 40, "end": 60},  # explicit fields
+}
+
+
+@pytest.fixture
+def intervals(tmp_path):
+    kf_path, scene_path = tmp_path / "path_keyframe.json", tmp_path / "path_scene.json"
+    kf_path.write_text(json.dumps(KEYFRAMES), encoding="utf-8")
+    scene_path.write_text(json.dumps(SCENES), encoding="utf-8")
+    arrays = build_interval_arrays(str(kf_path), str(scene_path))
+    assert set(arrays) == set(ARRAYS)
+    np.savez(tmp_path / "scenes.npz", **arrays)
+    return SceneIntervalIndex(interval_dir=str(tmp_path))
+
+
+def test_scene_spans(intervals):
+    owner, kf = intervals.keyframes_of_scenes([10, 11, 12, 99])
+    assert list(zip(owner.tolist(), kf.tolist())) == [(0, 0), (0, 1), (1, 3), (2, 5)]
+
+
+def test_scenes_of_keyframes(intervals):
+    # Keyframe 2 (frame 300) falls between scenes, keyframe 4 before the only scene of its video
+    assert intervals.scenes_of_keyframes([0, 1, 2, 3, 4, 5, 42]).tolist() == [10, 10, -1, 11, -1, 12, -1]
+
+
+def test_hit_mapping_keeps_best_score(intervals):
+    hits = intervals.scene_hits_to_keyframes([{"id": 11, "score": 0.9}, {"id": 10, "score": 0.5}, {"id": None}])
+    assert hits == [{"id": 3, "score": pytest.approx(0.9)}, {"id": 0, "score": 0.5}, {"id": 1, "score": 0.5}]
+    scenes = intervals.keyframe_hits_to_scenes([{"id": 0, "score": 0.2}, {"id": 1, "score": 0.7}, {"id": 2, "score": 1.0}])
+    assert scenes == [{"id": 10, "score": pytest.approx(0.7)}]
+
+
+def test_missing_index_is_unavailable(tmp_path, monkeypatch):
+    import app.vector_database.interval_index as interval_index
+
+    def no_metadata():
+        raise FileNotFoundError("path_keyframe.json")
+
+    monkeypatch.setattr(interval_index, "build_interval_arrays", no_metadata)
+    index = SceneIntervalIndex(interval_dir=str(tmp_path / "none"))
+    assert not index.available()
+    assert index.scenes_of_keyframes([1, 2]).tolist() == [-1, -1]
+    assert index.scene_hits_to_keyframes([{"id": 10, "score": 1.0}]) == []
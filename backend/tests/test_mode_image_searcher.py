@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+pytest.importorskip("torch")  # the searcher module imports every model backend
+mode_image_searcher = pytest.importorskip("app.result.mode_image_searcher")
+
+from app.retrieve.bm25 import LocalTextSearcher
+
+
+@pytest.fixture
+def searcher(tmp_path, monkeypatch):
+    (tmp_path / "ic.json").write_text(json.dumps({
+        "1": "a red car parked on the street",
+        "2": "a blue bus at night",
+        "3": "people walking in the park",
+    }), encoding="utf-8")
+    (tmp_path / "ocr.json").write_text(json.dumps({
+        "1": "bien so 51F 12345",
+        "3": "cong vien thong nhat",
+    }), encoding="utf-8")
+    monkeypatch.setattr(mode_image_searcher.query_planner, "record", lambda *args, **kwargs: None)
+    return mode_image_searcher.ModeImageSearcher(es=LocalTextSearcher(sparse_dir=str(tmp_path)), max_workers_methods=1)
+
+
+def test_text_methods_run_on_local_bm25(searcher):
+    response = searcher.search("red car", ocr_text="51F", use_image_cap=True, use_trans=False)
+    ensemble = response["ensemble_all_queries_all_methods"]
+    assert ensemble and ensemble[0]["id"] == 1  # matched by both captions and OCR
+    assert response["plan"] == {"ocr": searcher.topk_each, "img_cap": searcher.topk_each}
+    assert "object_filter" not in response
+
+
+def test_text_requests_match_the_prefetch(searcher):
+    requests = searcher.text_requests(["red car"], "51F", True)
+    assert requests == [("ic", "red car", searcher.topk_each), ("ocr", "51F", searcher.topk_each)]
+    assert searcher.es.msearch_text(requests)[1][0]["id"] == 1
+
+
+def test_partitions_apply_to_one_request_only(searcher, monkeypatch):
+    from app.vector_database import partitions
+    monkeypatch.setattr(partitions, "load_id_to_batch", lambda *args, **kwargs: {1: "L21", 2: "L22", 3: "L22"})
+    options = mode_image_searcher.SearchOptions(partitions=["L22"])
+    response = searcher.search("red car bus", use_image_cap=True, use_trans=False, options=options)
+    assert {r["id"] for r in response["ensemble_all_queries_all_methods"]} == {2}
+    response = searcher.search("red car bus", use_image_cap=True, use_trans=False)
+    assert {r["id"] for r in response["ensemble_all_queries_all_methods"]} == {1, 2}
+
+
+def test_object_filter_applies_to_one_request_only(searcher, monkeypatch):
+    monkeypatch.setattr(mode_image_searcher.object_index, "available", lambda: False)
+    options = mode_image_searcher.SearchOptions(object_filter="red car")
+    response = searcher.search("red car", use_image_cap=True, use_trans=False, options=options)
+    assert response["object_filter"] == "unavailable"
+    assert "object_filter" not in searcher.search("red car", use_image_cap=True, use_trans=False)
@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.vector_database.object_index import MAX_COUNT, ObjectIndex, build_object_index, filter_hits
+
+
+@pytest.fixture
+def objects(tmp_path):
+    (tmp_path / "object.json").write_text(json.dumps({
+        "1": [["person", "white"], ["person", "black"], ["car", "red"]],
+        "2": [["person", "white"], ["car", "blue"]],
+        "3": {"objects": [{"name": "car", "color": "red"}, {"name": "car", "color": "red"}]},
+        "not-an-id": [["person", "white"]],
+    }), encoding="utf-8")
+    (tmp_path / "object_extra.jsonl").write_text(
+        json.dumps({"id": 4, "objects": [{"name": "person"}] * (MAX_COUNT + 2)}) + "\n", encoding="utf-8"
+    )
+    build_object_index([str(tmp_path / "object.json"), str(tmp_path / "object_extra.jsonl")], out_dir=str(tmp_path))
+    return ObjectIndex(object_dir=str(tmp_path))
+
+
+def test_match_intersects_filters(objects):
+    assert objects.match([{"name": "person"}]).tolist() == [1, 2, 4]
+    assert objects.match([{"name": "car", "color": "red"}]).tolist() == [1, 3]
+    assert objects.match([{"name": "person", "count": 2}, {"name": "car", "color": "red"}]).tolist() == [1]
+    assert objects.match([{"name": "car", "color": "red", "count": 2}]).tolist() == [3]
+    assert objects.match([{"name": "person"}, {"name": "bicycle"}]).tolist() == []
+
+
+def test_counts_above_max_use_the_largest_bitmap(objects):
+    assert objects.match([{"name": "person", "count": MAX_COUNT + 5}]).tolist() == [4]
+
+
+def test_match_parses_text(objects):
+    assert objects.parse("2 person, red car") == [
+        {"name": "person", "color": None, "count": 2}, {"name": "car", "color": "red", "count": 1},
+    ]
+    assert objects.match("2 person and red car").tolist() == [1]
+    assert objects.match("").tolist() == []
+
+
+def test_missing_index(tmp_path):
+    index = ObjectIndex(object_dir=str(tmp_path))
+    assert not index.available()
+    assert index.match("person").tolist() == []
+
+
+def test_filter_hits():
+    hits = [{"id": 3, "score": 0.9}, {"id": None}, {"id": 7, "score": 0.5}, {"id": 1, "score": 0.1}]
+    assert filter_hits(hits, np.array([1, 3], dtype=np.uint32)) == [{"id": 3, "score": 0.9}, {"id": 1, "score": 0.1}]
+    assert filter_hits(hits, np.empty(0, dtype=np.uint32)) == []
+    assert filter_hits(hits, None) is hits
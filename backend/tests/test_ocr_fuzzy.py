@@ -0,0 +1,38 @@
+from app.retrieve.ocr_fuzzy import TrigramIndex, normalize
+
+
+def _index():
+    return TrigramIndex.build(iter([
+        ("1", "Liver pool 2-1"),
+        ("2", "biển số 51F-0000"),
+        ("3", "giá 10.000.000 đồng"),
+        ("4", "thời tiết hôm nay"),
+    ]))
+
+
+def test_normalize_strips_diacritics_and_separators():
+    assert normalize("LIVERPOOL 2 - 1") == normalize("Liver pool 2-1") == "liverpool21"
+    assert normalize("Đà Nẵng") == "danang"
+
+
+def test_exact_and_noisy_match():
+    index = _index()
+    assert index.search("liverpool 2-1", 5)[0] == {"id": 1, "score": 1.0}
+    hits = index.search("liverpol 21", 5)  # one letter lost by OCR
+    assert hits and hits[0]["id"] == 1 and hits[0]["score"] < 1.0
+
+
+def test_repeated_digits_are_candidates():
+    # "0000" has one distinct trigram and "10000000" two: the q-gram bound must count distinct ones
+    index = _index()
+    assert [h["id"] for h in index.search("0000", 5)] == [2, 3]
+    assert index.search("10000000", 5)[0] == {"id": 3, "score": 1.0}
+    assert index.search("10000001", 5)[0]["id"] == 3
+
+
+def test_save_load_roundtrip(tmp_path):
+    index = _index()
+    path = str(tmp_path / "ocr.npz")
+    index.save(path)
+    loaded = TrigramIndex.load(path)
+    assert loaded.search("thoi tiet", 5) == index.search("thoi tiet", 5)
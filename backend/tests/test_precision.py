@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from app.vector_database.precision import binary_codes, hamming_distances, train_itq
+
+
+def _naive_hamming(codes, query_code):
+    return np.unpackbits(np.bitwise_xor(codes, query_code), axis=1).sum(axis=1)
+
+
+def test_binary_codes_pack_sign_bits():
+    x = np.array([[1.0, -1.0, 0.5, -0.5, 2.0, 0.0, -3.0, 1.0, 1.0]], dtype=np.float32)
+    codes = binary_codes(x)
+    assert codes.dtype == np.uint8 and codes.shape == (1, 2)
+    assert codes[0].tolist() == [0b10101001, 0b10000000]  # zero counts as negative, tail bits padded
+    assert binary_codes(x[0]).tolist() == codes[0].tolist()
+
+
+@pytest.mark.parametrize("dim", [64, 256, 24])  # 64-bit word path and byte lookup table path
+def test_hamming_distances_match_naive_popcount(dim):
+    rng = np.random.default_rng(0)
+    codes = binary_codes(rng.standard_normal((1000, dim)))
+    query = binary_codes(rng.standard_normal(dim))
+    expected = _naive_hamming(codes, query)
+    assert np.array_equal(hamming_distances(codes, query), expected)
+    assert np.array_equal(hamming_distances(codes, query, block=97), expected)
+
+
+def test_hamming_distances_of_non_contiguous_codes():
+    rng = np.random.default_rng(1)
+    codes = binary_codes(rng.standard_normal((200, 128)))[::2]
+    query = codes[3]
+    distances = hamming_distances(codes, query)
+    assert distances[3] == 0
+    assert np.array_equal(distances, _naive_hamming(codes, query))
+
+
+def test_itq_codes_keep_neighbours_close():
+    rng = np.random.default_rng(2)
+    base = rng.standard_normal((500, 32)).astype(np.float32)
+    mean, projection = train_itq(base, nbits=16, n_iter=10)
+    assert mean.shape == (32,) and projection.shape == (32, 16)
+    codes = binary_codes(base, mean, projection)
+    assert codes.shape == (500, 2)
+    noisy = base[7] + 0.01 * rng.standard_normal(32).astype(np.float32)
+    distances = hamming_distances(codes, binary_codes(noisy, mean, projection))
+    assert distances[7] == distances.min()
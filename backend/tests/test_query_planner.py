@@ -0,0 +1,74 @@
+import pytest
+
+from app.utils.query_planner import QueryPlanner
+
+METHODS = ["a", "b", "c", "d"]
+FINAL = [{"id": i} for i in range(1, 11)]
+BUCKETS = {
+    "a": [{"id": i} for i in range(1, 9)],           # most of the top-10, deepest hit at rank 8
+    "b": [{"id": 99}],                                # never reaches the top-10
+    "c": [{"id": 9}, {"id": 10}, {"id": 1}],          # finds what nobody else does
+    "d": [{"id": 1}, {"id": 2}],                      # only hits others also find
+}
+LATENCIES = {"a": 10.0, "b": 10.0, "c": 500.0, "d": 500.0}
+
+
+def make_planner(tmp_path, **kwargs):
+    kwargs = {"min_samples": 3, "min_topk": 5, "skip_share": 0.05, "explore_every": 100, **kwargs}
+    return QueryPlanner(stats_path=str(tmp_path / "stats.json"), **kwargs)
+
+
+def train(planner, n=3):
+    for _ in range(n):
+        planner.record(BUCKETS, FINAL, 10, full_methods=METHODS, methods=METHODS, latencies=LATENCIES)
+
+
+def test_full_until_enough_samples(tmp_path):
+    planner = make_planner(tmp_path)
+    planner.plan(METHODS, 100)  # explore slot
+    assert planner.plan(METHODS, 100) == {m: 100 for m in METHODS}
+    train(planner, 2)
+    assert planner.plan(METHODS, 100) == {m: 100 for m in METHODS}
+    assert planner.plan(["a"], 100) == {"a": 100}  # nothing to plan for a single method
+
+
+def test_record_tracks_share_unique_and_depth(tmp_path):
+    planner = make_planner(tmp_path)
+    train(planner)
+    stats = planner.stats()["a+b+c+d"]
+    assert stats["a"]["share"] == pytest.approx(0.8) and stats["a"]["depth_p90"] == 8
+    assert stats["b"]["share"] == 0.0
+    assert stats["c"]["unique"] == pytest.approx(0.2)
+    assert stats["d"]["unique"] == 0.0 and stats["d"]["latency_ms"] == 500.0
+
+
+def test_record_skips_methods_not_run_in_full(tmp_path):
+    planner = make_planner(tmp_path)
+    planner.record(BUCKETS, FINAL, 10, full_methods=["a"], methods=METHODS)
+    assert set(planner.stats()["a+b+c+d"]) == {"a"}
+
+
+def test_plan_depths_and_skips(tmp_path):
+    planner = make_planner(tmp_path)
+    train(planner)
+    planner.plan(METHODS, 100)  # explore slot
+    # a: p90 depth 8 * 1.25; b: skipped (no share, nothing unique); c, d: shallow -> min_topk
+    assert planner.plan(METHODS, 100) == {"a": 10, "b": 0, "c": 5, "d": 5}
+    # Past the budget: d is slow and finds nothing unique, c is slow but finds unique hits
+    assert planner.plan(METHODS, 100, budget_ms=100.0) == {"a": 10, "b": 0, "c": 5, "d": 0}
+    assert planner.plan(METHODS, 3)["a"] == 3  # never above the request's topk
+
+
+def test_explore_cadence(tmp_path):
+    planner = make_planner(tmp_path, explore_every=3)
+    train(planner)
+    full = {m: 100 for m in METHODS}
+    plans = [planner.plan(METHODS, 100) for _ in range(6)]
+    assert [p == full for p in plans] == [True, False, False, True, False, False]
+
+
+def test_stats_survive_restart(tmp_path):
+    planner = make_planner(tmp_path)
+    train(planner)
+    planner.save()
+    assert make_planner(tmp_path).stats() == planner.stats()
@@ -0,0 +1,97 @@
+import json
+import time
+
+import pytest
+
+from app.rerank.rerank_stage import RerankStage, StubBackend
+
+DOCS = {
+    "1": "people walking in the park",
+    "2": "a blue bus at night",
+    "3": "a red car parked on the street",
+    "4": "a red bus",
+}
+HITS = [{"id": 1, "score": 0.9}, {"id": 2, "score": 0.8}, {"id": 3, "score": 0.7}, {"id": 4, "score": 0.6}]
+
+
+class CountingBackend(StubBackend):
+    def __init__(self):
+        self.calls = 0
+
+    def score(self, query, documents, timeout=None):
+        self.calls += 1
+        return super().score(query, documents, timeout)
+
+
+class SlowBackend(StubBackend):
+    def score(self, query, documents, timeout=None):
+        time.sleep(0.5)
+        return super().score(query, documents, timeout)
+
+
+class FailingBackend(StubBackend):
+    def score(self, query, documents, timeout=None):
+        raise RuntimeError("backend down")
+
+
+@pytest.fixture
+def docs_path(tmp_path):
+    path = tmp_path / "ic.json"
+    path.write_text(json.dumps(DOCS), encoding="utf-8")
+    return str(path)
+
+
+def test_reorders_head_by_backend_score(docs_path):
+    stage = RerankStage(StubBackend(), docs_path=docs_path, batch_size=2)
+    out = stage.rerank("red car", HITS)
+    assert [h["id"] for h in out] == [3, 4, 1, 2]  # unmatched 1 and 2 tie and keep their fused order
+    assert stage.stats()["reranked"] == 1 and stage.stats()["scored"] == 4
+
+
+def test_scores_are_mapped_onto_the_fused_range(docs_path):
+    out = RerankStage(StubBackend(), docs_path=docs_path).rerank("red car", HITS)
+    scores = [h["score"] for h in out]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == pytest.approx(0.9) and scores[-1] == pytest.approx(0.6)
+
+
+def test_tail_and_undocumented_hits_keep_their_fused_score(docs_path):
+    hits = HITS + [{"id": 99, "score": 0.65}, {"id": 5, "score": 0.1}]
+    out = RerankStage(StubBackend(), docs_path=docs_path, top_n=5).rerank("red car", hits)
+    assert {"id": 99, "score": pytest.approx(0.65)} in out[:5]  # no text to score: fused score kept
+    assert out[-1] == {"id": 5, "score": 0.1}  # beyond top_n: untouched
+
+
+def test_cache_hits_skip_the_backend(docs_path):
+    backend = CountingBackend()
+    stage = RerankStage(backend, docs_path=docs_path, batch_size=10)
+    first = stage.rerank("red car", HITS)
+    assert stage.rerank("red car", HITS) == first
+    assert backend.calls == 1
+    assert stage.stats()["cache_hits"] == 4 and stage.stats()["scored"] == 4
+    stage.rerank("blue bus", HITS)  # another query is scored afresh
+    assert backend.calls == 2
+
+
+def test_falls_back_on_backend_error(docs_path):
+    stage = RerankStage(FailingBackend(), docs_path=docs_path)
+    assert stage.rerank("red car", HITS) is HITS
+    assert stage.stats()["fallbacks"] == 1 and stage.stats()["reranked"] == 0
+
+
+def test_falls_back_on_timeout(docs_path):
+    stage = RerankStage(SlowBackend(), docs_path=docs_path, timeout_ms=50)
+    assert stage.rerank("red car", HITS) is HITS
+    assert stage.stats()["fallbacks"] == 1
+
+
+def test_falls_back_past_the_request_deadline(docs_path):
+    stage = RerankStage(StubBackend(), docs_path=docs_path)
+    assert stage.rerank("red car", HITS, deadline=time.monotonic() - 1.0) is HITS
+    assert stage.stats()["fallbacks"] == 1 and stage.stats()["scored"] == 0
+
+
+def test_disabled_without_backend(docs_path):
+    stage = RerankStage(None, docs_path=docs_path)
+    assert not stage.enabled
+    assert stage.rerank("red car", HITS) is HITS
@@ -0,0 +1,67 @@
+import pytest
+
+import app.utils.result_sessions as result_sessions
+from app.utils.result_sessions import ResultSessionStore
+
+
+def _result(n=25):
+    return {
+        "mode": "Image",
+        "ensemble_all_queries_all_methods": [{"id": i, "score": 1.0 - i / 100} for i in range(n)],
+        "per_query": {"query_0": {"ensemble_all_methods": [{"id": i} for i in range(7)],
+                                  "per_method": {"siglip2": [{"id": i} for i in range(3)]}}},
+        "search_params": {"query_0": {}},
+    }
+
+
+def test_first_page_slims_the_response():
+    store = ResultSessionStore()
+    slim = store.first_page(_result(), page_size=10)
+    assert [h["id"] for h in slim["ensemble_all_queries_all_methods"]] == list(range(10))
+    assert slim["mode"] == "Image" and "per_query" not in slim
+    assert slim["sections"] == {"per_query/query_0/ensemble_all_methods": 7, "per_query/query_0/per_method/siglip2": 3}
+    page = slim["page"]
+    assert page["primary"] == "ensemble_all_queries_all_methods" and page["totals"] == {"ensemble_all_queries_all_methods": 25}
+    assert page["next_cursor"] == "10"
+
+
+def test_cursor_walks_every_item_once():
+    store = ResultSessionStore()
+    token = store.first_page(_result(), page_size=10)["page"]["result_token"]
+    seen, cursor = [], None
+    while True:
+        page = store.page(token, cursor=cursor, limit=10)
+        seen += [h["id"] for h in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == list(range(25))
+    nested = store.page(token, section="per_query/query_0/per_method/siglip2", limit=2)
+    assert nested["total"] == 3 and nested["next_cursor"] == "2"
+
+
+def test_unknown_token_section_and_cursor():
+    store = ResultSessionStore()
+    token = store.create(_result())
+    with pytest.raises(KeyError):
+        store.page("nope")
+    with pytest.raises(KeyError):
+        store.page(token, section="per_query/query_9")
+    with pytest.raises(ValueError):
+        store.page(token, cursor="ten")
+
+
+def test_sessions_expire_and_evict(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_sessions.time, "time", lambda: now[0])
+    store = ResultSessionStore(ttl_s=60, max_sessions=2)
+    first, second = store.create(_result()), store.create(_result())
+    store.page(first)  # most recently used: the next insert evicts `second`
+    third = store.create(_result())
+    with pytest.raises(KeyError):
+        store.page(second)
+    assert store.page(first)["total"] == 25 and store.page(third)["total"] == 25
+
+    now[0] += 61
+    assert store.purge_expired() == 2
+    assert store.stats()["sessions"] == 0
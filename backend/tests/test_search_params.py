@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from app.vector_database.search_params import BASELINE_EF, SearchChoice, SearchParamController
+
+
+def measured(controller, latencies_s, collection="c", index_type="HNSW"):
+    for ef, seconds in latencies_s.items():
+        controller.record(SearchChoice(collection, index_type, 0, "fast", {"ef": ef}, "test"), seconds)
+
+
+@pytest.fixture
+def controller():
+    return SearchParamController(index_type="HNSW", overload_inflight=4, probe_every=1000)
+
+
+def test_no_deadline_keeps_the_baseline(controller):
+    choice = controller.choose("c", 10)
+    assert (choice.name, choice.level, choice.params) == ("baseline", -1, {"ef": BASELINE_EF})
+    assert controller.choose("c", 100).params == {"ef": 200}  # ef >= 2 * topk
+    assert controller.choose("c", 10, index_type="IVF_FLAT").params == {}
+    assert controller.choose("c", 10, index_type="FLAT").reason == "index has no search-time parameter"
+
+
+def test_tight_deadline_moves_down_the_ladder(controller):
+    measured(controller, {64: 0.010, 128: 0.020, 256: 0.040, 512: 0.080})
+    assert controller.choose("c", 10, deadline=time.monotonic() + 1.0).params == {"ef": 512}
+    assert controller.choose("c", 10, deadline=time.monotonic() + 0.03).params == {"ef": 128}
+    choice = controller.choose("c", 10, deadline=time.monotonic() + 0.005)
+    assert choice.level == 0 and choice.reason.startswith("no setting fits")
+    assert controller.choose("c", 10, deadline=time.monotonic() - 1.0).reason == "deadline exceeded"
+
+
+def test_default_level_before_any_measurement(controller):
+    choice = controller.choose("fresh", 10, deadline=time.monotonic() + 1.0)
+    assert choice.level == controller.default_level and choice.reason == "no latency measured yet"
+
+
+def test_fit_is_used_once_there_are_enough_samples(controller):
+    deadline_s = 0.1  # budget 80 ms
+    # One point: latency assumed proportional to ef, so only the measured ef fits
+    measured(controller, {64: 0.050})
+    assert controller.choose("c", 10, deadline=time.monotonic() + deadline_s).params == {"ef": 64}
+    # Two points: the fit finds a fixed 48 ms overhead and a small cost per ef, so ef 512 (~64 ms) fits
+    measured(controller, {128: 0.052})
+    assert controller.choose("c", 10, deadline=time.monotonic() + deadline_s).params == {"ef": 512}
+
+
+def test_overload_drops_to_the_cheapest_setting():
+    controller = SearchParamController(index_type="HNSW", overload_inflight=1, probe_every=1000)
+    measured(controller, {64: 0.001, 512: 0.002})
+    with controller.track(controller.choose("c", 10)):
+        choice = controller.choose("c", 10, deadline=time.monotonic() + 1.0)
+    assert choice.level == 0 and choice.reason.startswith("overload")
+    assert controller.last_choice().name == "baseline"
+
+
+def test_explicit_choices_stay_out_of_the_curve(controller):
+    controller.record(SearchChoice("c", "HNSW", 3, "explicit", {"ef": 512}, "benchmark"), 5.0)
+    assert controller.stats() == []